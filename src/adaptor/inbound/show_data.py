@@ -21,6 +21,8 @@ from db.entity import (
     TransactionType,
 )
 from service.calculate import calculate_each_day_ticker_price
+from service.fx import convert, get_exchange_rate_matrix
+from service.holdings import get_holdings_as_of
 
 TRANSACTION_TYPE_DICT = {
     TransactionType.BUY: ":green[买入]",
@@ -90,27 +92,22 @@ def get_current_currencies() -> list[tuple[str, float]]:
             - 账面总值(以美元计价)
     """
     current_date = date.today() - timedelta(1)
-    res = []
     with Session(db.engine) as session:
-        currency_assets = (
-            session.query(CurrencyAsset)
-            .filter(CurrencyAsset.date == current_date)
-            .all()
-        )
-        for asset in currency_assets:
-            rate = Decimal(1)
-            if not asset.currency_type == CurrencyType.USD:
-                rate = (
-                    session.query(ExchangedRate)
-                    .filter(ExchangedRate.currency_type == asset.currency_type)
-                    .first()
-                    .rate
-                )
-            res.append(
-                (asset.currency_type.value, round(float(asset.currency / rate), 2))
-            )
-
-        return res
+        currency_assets = get_holdings_as_of(session, current_date, CurrencyAsset)
+        rates = get_exchange_rate_matrix(current_date, current_date, session)
+
+    # 按昨天的汇率一次换算所有货币
+    values = convert(
+        [asset.currency for asset in currency_assets],
+        [asset.currency_type for asset in currency_assets],
+        CurrencyType.USD,
+        current_date,
+        rates,
+    )
+    return [
+        (asset.currency_type.value, round(float(value), 2))
+        for asset, value in zip(currency_assets, values)
+    ]
 
 
 @streamlit.cache_data
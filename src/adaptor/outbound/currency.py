@@ -1,29 +1,181 @@
+import asyncio
+import logging
+import random
+import time as timer
+from collections.abc import Sequence
 from datetime import date
 from decimal import Decimal
 
-from curl_cffi import requests
+from curl_cffi.requests import AsyncSession
 
+from adaptor.outbound.exchange_rate_cache import ExchangeRateCache, exchange_rate_cache
 from db.entity import CurrencyType
 
+# 汇率数据的地址模板，{date} 会被替换为 YYYY-MM-DD 格式的日期
+CURRENCY_API_URL = "https://cdn.jsdelivr.net/npm/@fawazahmed0/currency-api@{date}/v1/currencies/usd.json"
 
-def get_exchange_rate(time: date) -> tuple[date, dict[str, Decimal]]:
-    """获取 USD 兑其他货币的汇率数据
+# 单个请求的超时时间（秒）
+REQUEST_TIMEOUT = 15
+# 单个日期的最大重试次数
+MAX_RETRIES = 4
+# 重试退避的基础时间（秒），第 n 次重试等待 BACKOFF_BASE * 2^n 秒并加上随机抖动
+BACKOFF_BASE = 0.5
+
+
+class AdaptiveConcurrencyLimiter:
+    """基于 AIMD（加性增、乘性减）的自适应并发限制器。
+
+    请求成功且延迟不超过目标值时，并发上限每次增加 1 / 当前上限，
+    相当于每完成一轮请求增加 1；请求失败或延迟超过目标值时，并发上限减半。
+    同一批在途请求同时失败时，在 target_latency 时间内只会减半一次。
+    """
+
+    def __init__(
+        self,
+        initial: int = 8,
+        minimum: int = 1,
+        maximum: int = 64,
+        target_latency: float = 1.0,
+    ) -> None:
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_latency = target_latency
+        self.in_flight = 0
+        self._last_decrease = float("-inf")
+        self._condition = asyncio.Condition()
+
+    async def acquire(self) -> None:
+        """等待直到在途请求数低于当前并发上限。"""
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def release(self, latency: float | None) -> None:
+        """释放一个在途请求，并根据其延迟调整并发上限。
+
+        Args:
+            latency (float | None): 请求耗时（秒），请求失败时为 None
+        """
+        async with self._condition:
+            self.in_flight -= 1
+            if latency is None or latency > self.target_latency:
+                now = timer.monotonic()
+                if now - self._last_decrease >= self.target_latency:
+                    self.limit = max(float(self.minimum), self.limit / 2)
+                    self._last_decrease = now
+            else:
+                self.limit = min(float(self.maximum), self.limit + 1 / self.limit)
+            self._condition.notify_all()
+
+
+def get_exchange_rates(
+    dates: Sequence[date],
+    url_template: str = CURRENCY_API_URL,
+    cache: ExchangeRateCache | None = exchange_rate_cache,
+) -> list[tuple[date, dict[str, Decimal]]]:
+    """批量获取多个日期的 USD 汇率数据，是 fetch_exchange_rates 的同步包装。
 
     Args:
-        time (date): 获取汇率的时间
+        dates (Sequence[date]): 需要获取汇率的日期
+        url_template (str): 汇率数据的地址模板
+        cache (ExchangeRateCache | None): 响应缓存，为 None 时总是请求接口
 
     Returns:
-        Dict[str, Decimal]: {货币类型, 汇率}
+        List[Tuple[date, Dict[str, Decimal]]]: 与 dates 顺序一致的 (日期, {货币类型, 汇率})，
+            多次重试后仍然失败的日期对应空字典
     """
-    url = f"https://cdn.jsdelivr.net/npm/@fawazahmed0/currency-api@{time.strftime('%Y-%m-%d')}/v1/currencies/usd.json"
-    response = requests.get(url, impersonate="chrome")
-    exchanged_rate: dict[str, float] = response.json()["usd"]
-
-    return (
-        time,
-        {
-            currency.upper(): Decimal(rate)
-            for currency, rate in exchanged_rate.items()
-            if currency.upper() in CurrencyType
-        },
-    )
+    return asyncio.run(fetch_exchange_rates(dates, url_template, cache))
+
+
+async def fetch_exchange_rates(
+    dates: Sequence[date],
+    url_template: str = CURRENCY_API_URL,
+    cache: ExchangeRateCache | None = exchange_rate_cache,
+) -> list[tuple[date, dict[str, Decimal]]]:
+    """使用共享的 AsyncSession 并发获取多个日期的 USD 汇率数据。
+
+    已经缓存的历史日期直接从本地读取，其余日期的请求复用同一个会话的
+    keep-alive 连接，并由 AdaptiveConcurrencyLimiter 根据观察到的延迟和错误
+    动态调整同时在途的请求数量。
+
+    Args:
+        dates (Sequence[date]): 需要获取汇率的日期
+        url_template (str): 汇率数据的地址模板
+        cache (ExchangeRateCache | None): 响应缓存，为 None 时总是请求接口
+
+    Returns:
+        List[Tuple[date, Dict[str, Decimal]]]: 与 dates 顺序一致的 (日期, {货币类型, 汇率})
+    """
+    results: dict[date, dict[str, Decimal]] = {}
+    if cache is not None:
+        for d in dates:
+            if (payload := cache.get(d)) is not None:
+                results[d] = _parse_exchange_rate(payload)
+
+    missing = [d for d in dates if d not in results]
+    if missing:
+        logging.info(
+            f"汇率缓存命中 {len(dates) - len(missing)} 个日期，需要请求 {len(missing)} 个日期"
+        )
+        limiter = AdaptiveConcurrencyLimiter()
+        async with AsyncSession(
+            impersonate="chrome", timeout=REQUEST_TIMEOUT, max_clients=limiter.maximum
+        ) as session:
+            fetched = await asyncio.gather(
+                *(
+                    _fetch_with_retry(session, limiter, d, url_template, cache)
+                    for d in missing
+                )
+            )
+        results.update(fetched)
+    return [(d, results[d]) for d in dates]
+
+
+async def _fetch_with_retry(
+    session: AsyncSession,
+    limiter: AdaptiveConcurrencyLimiter,
+    time: date,
+    url_template: str,
+    cache: ExchangeRateCache | None = None,
+) -> tuple[date, dict[str, Decimal]]:
+    """获取单个日期的汇率，失败时按指数退避重试。"""
+    url = url_template.format(date=time.strftime("%Y-%m-%d"))
+    attempt = 0
+    while True:
+        await limiter.acquire()
+        start_time = timer.perf_counter()
+        try:
+            response = await session.get(url)
+            if response.status_code == 404:
+                # 该日期没有发布数据，重试也不会成功
+                await limiter.release(timer.perf_counter() - start_time)
+                logging.warning(f"警告: {time} 没有可用的汇率数据。")
+                return time, {}
+            response.raise_for_status()
+            payload = response.json()
+            rates = _parse_exchange_rate(payload)
+        except Exception as e:
+            await limiter.release(None)
+            if attempt == MAX_RETRIES:
+                logging.error(f"错误: 获取 {time} 的汇率数据失败: {e}")
+                return time, {}
+            await asyncio.sleep(
+                BACKOFF_BASE * 2**attempt + random.uniform(0, BACKOFF_BASE)
+            )
+            attempt += 1
+        else:
+            await limiter.release(timer.perf_counter() - start_time)
+            if cache is not None:
+                cache.put(time, payload)
+            return time, rates
+
+
+def _parse_exchange_rate(payload: dict) -> dict[str, Decimal]:
+    """从 usd.json 中提取 CurrencyType 支持的货币汇率。"""
+    exchanged_rate: dict[str, float] = payload["usd"]
+    return {
+        currency.upper(): Decimal(rate)
+        for currency, rate in exchanged_rate.items()
+        if currency.upper() in CurrencyType
+    }
@@ -0,0 +1,119 @@
+"""
+汇率接口响应的本地磁盘缓存。
+
+currency-api 某一天的 usd.json 在这一天过去之后就不会再变化，
+因此可以按日期缓存到 data 目录下，数据库重置后的全量重建也不需要再联网。
+文档以去掉空白的 JSON 经 gzip 压缩后保存，每个日期一个文件，
+缓存总大小超过上限时按最近访问时间淘汰最旧的文件。
+"""
+
+import gzip
+import json
+import logging
+import os
+import threading
+from datetime import date, timedelta
+from pathlib import Path
+
+# 缓存目录，与数据库文件同样位于 data 目录下
+EXCHANGE_RATE_CACHE_DIR = Path("data") / "cache" / "exchange_rate"
+# 缓存总大小上限（字节）
+EXCHANGE_RATE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+# 最近多少天的文档仍可能被更新，需要重新获取
+REVALIDATE_DAYS = 1
+
+_SUFFIX = ".json.gz"
+
+
+class ExchangeRateCache:
+    """以日期为键的 usd.json 文档缓存。"""
+
+    def __init__(
+        self,
+        directory: Path = EXCHANGE_RATE_CACHE_DIR,
+        max_bytes: int = EXCHANGE_RATE_CACHE_MAX_BYTES,
+    ) -> None:
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # 缓存目录当前的总大小，第一次写入时统计
+        self._total_bytes: int | None = None
+
+    def is_cacheable(self, time: date, today: date | None = None) -> bool:
+        """今天和昨天的文档可能仍在更新，只有更早的日期才从缓存中读取。"""
+        today = today or date.today()
+        return time < today - timedelta(days=REVALIDATE_DAYS)
+
+    def get(self, time: date) -> dict | None:
+        """读取某个日期的文档，未命中或者需要重新获取时返回 None。"""
+        if not self.is_cacheable(time):
+            return None
+        path = self._path(time)
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                payload = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            # 文件损坏时丢弃，下次重新获取
+            logging.warning(f"警告: 汇率缓存文件 {path} 无法读取，已删除: {e}")
+            path.unlink(missing_ok=True)
+            return None
+        # 更新访问时间，供淘汰策略使用
+        os.utime(path)
+        return payload
+
+    def put(self, time: date, payload: dict) -> None:
+        """写入某个日期的文档。今天和昨天的文档同样会写入，但读取时不会命中。"""
+        data = gzip.compress(
+            json.dumps(payload, separators=(",", ":")).encode("utf-8"), mtime=0
+        )
+        path = self._path(time)
+        # 先写临时文件再替换，避免并发读取到半个文件
+        tmp_path = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            tmp_path.write_bytes(data)
+            with self._lock:
+                if self._total_bytes is None:
+                    self._total_bytes = self._scan_total_bytes()
+                old_size = path.stat().st_size if path.exists() else 0
+                os.replace(tmp_path, path)
+                self._total_bytes += len(data) - old_size
+                if self._total_bytes > self.max_bytes:
+                    self._evict()
+        except OSError as e:
+            # 缓存只是优化，写入失败不影响汇率的获取
+            logging.warning(f"警告: 写入 {time} 的汇率缓存失败: {e}")
+            tmp_path.unlink(missing_ok=True)
+
+    def _path(self, time: date) -> Path:
+        return self.directory / f"{time.isoformat()}{_SUFFIX}"
+
+    def _entries(self) -> list[tuple[float, int, Path]]:
+        entries = []
+        for path in self.directory.glob(f"*{_SUFFIX}"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _scan_total_bytes(self) -> int:
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self) -> None:
+        """缓存总大小超过上限时，按最近访问时间从旧到新删除文件，调用方需持有锁。"""
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+        self._total_bytes = total
+        logging.info(f"汇率缓存超过 {self.max_bytes} 字节，已淘汰最久未访问的文件")
+
+
+exchange_rate_cache = ExchangeRateCache()
@@ -0,0 +1,177 @@
+import asyncio
+import json
+import os
+import re
+import threading
+from datetime import date, timedelta
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from adaptor.outbound import currency
+from adaptor.outbound.currency import AdaptiveConcurrencyLimiter, get_exchange_rates
+from adaptor.outbound.exchange_rate_cache import ExchangeRateCache
+
+PATH_PATTERN = re.compile(r"/currency-api@(\d{4}-\d{2}-\d{2})/v1/currencies/usd.json")
+
+
+class _CurrencyApiStandIn(BaseHTTPRequestHandler):
+    """本地模拟的汇率接口，返回与 usd.json 相同结构的数据。"""
+
+    # 每个日期在返回正常数据之前需要先失败的次数
+    failures: dict[str, int] = {}
+    # 没有发布数据的日期
+    missing: set[str] = set()
+    requests: list[str] = []
+    lock = threading.Lock()
+
+    def do_GET(self):
+        match = PATH_PATTERN.search(self.path)
+        day = match.group(1)
+        with self.lock:
+            self.requests.append(day)
+            remaining_failures = self.failures.get(day, 0)
+            self.failures[day] = remaining_failures - 1
+
+        if day in self.missing:
+            self.send_response(404)
+            self.end_headers()
+            return
+        if remaining_failures > 0:
+            self.send_response(503)
+            self.end_headers()
+            return
+
+        body = json.dumps(
+            {
+                "date": day,
+                "usd": {
+                    "usd": 1,
+                    "cny": 7.1 + int(day[-2:]) / 100,
+                    "hkd": 7.8,
+                    "eur": 0.9,
+                },
+            }
+        ).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def currency_api(monkeypatch):
+    monkeypatch.setattr(currency, "BACKOFF_BASE", 0.01)
+    _CurrencyApiStandIn.failures = {}
+    _CurrencyApiStandIn.missing = set()
+    _CurrencyApiStandIn.requests = []
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _CurrencyApiStandIn)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield (
+        f"http://127.0.0.1:{server.server_port}"
+        "/npm/@fawazahmed0/currency-api@{date}/v1/currencies/usd.json"
+    )
+    server.shutdown()
+    server.server_close()
+
+
+def test_get_exchange_rates_from_local_stand_in(currency_api):
+    dates = [date(2024, 1, 1) + timedelta(i) for i in range(60)]
+
+    results = get_exchange_rates(dates, currency_api, cache=None)
+
+    assert [d for d, _ in results] == dates
+    first_date, first_rates = results[0]
+    assert first_rates == {
+        "USD": Decimal(1),
+        "CNY": Decimal(7.1 + 1 / 100),
+        "HKD": Decimal(7.8),
+    }
+    assert len(_CurrencyApiStandIn.requests) == len(dates)
+
+
+def test_get_exchange_rates_retries_and_skips_missing(currency_api):
+    dates = [date(2024, 3, 1), date(2024, 3, 2), date(2024, 3, 3)]
+    _CurrencyApiStandIn.failures = {"2024-03-01": 2, "2024-03-03": 100}
+    _CurrencyApiStandIn.missing = {"2024-03-02"}
+
+    results = dict(get_exchange_rates(dates, currency_api, cache=None))
+
+    # 暂时失败的日期在重试后成功
+    assert results[date(2024, 3, 1)]["HKD"] == Decimal(7.8)
+    assert _CurrencyApiStandIn.requests.count("2024-03-01") == 3
+    # 没有发布数据的日期不会重试
+    assert results[date(2024, 3, 2)] == {}
+    assert _CurrencyApiStandIn.requests.count("2024-03-02") == 1
+    # 持续失败的日期在达到最大重试次数后放弃
+    assert results[date(2024, 3, 3)] == {}
+    assert _CurrencyApiStandIn.requests.count("2024-03-03") == currency.MAX_RETRIES + 1
+
+
+def test_get_exchange_rates_reads_history_from_cache(currency_api, tmp_path):
+    cache = ExchangeRateCache(tmp_path)
+    today = date.today()
+    history = [date(2024, 5, 1), date(2024, 5, 2)]
+    recent = [today - timedelta(1), today]
+    dates = history + recent
+
+    first = get_exchange_rates(dates, currency_api, cache=cache)
+    assert len(_CurrencyApiStandIn.requests) == 4
+
+    # 历史日期不再请求接口，今天和昨天的数据重新获取
+    second = get_exchange_rates(dates, currency_api, cache=cache)
+    assert first == second
+    assert sorted(_CurrencyApiStandIn.requests[4:]) == [d.isoformat() for d in recent]
+
+    # 重建数据库时，历史日期完全不需要联网
+    _CurrencyApiStandIn.missing = {d.isoformat() for d in history}
+    assert get_exchange_rates(history, currency_api, cache=cache) == first[:2]
+
+
+def test_exchange_rate_cache_evicts_least_recently_used(tmp_path):
+    payload = {"date": "x", "usd": {c: i for i, c in enumerate("abcdefghij")}}
+    cache = ExchangeRateCache(tmp_path)
+    for day in range(1, 5):
+        cache.put(date(2024, 1, day), payload)
+        # 保证修改时间有先后顺序
+        os.utime(tmp_path / f"2024-01-0{day}.json.gz", (day, day))
+    # 读取会刷新访问时间，使 1 月 1 日成为最近访问的文件
+    assert cache.get(date(2024, 1, 1)) == payload
+
+    entry_size = (tmp_path / "2024-01-01.json.gz").stat().st_size
+    cache = ExchangeRateCache(tmp_path, max_bytes=entry_size * 3)
+    cache.put(date(2024, 1, 5), payload)
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        "2024-01-01.json.gz",
+        "2024-01-04.json.gz",
+        "2024-01-05.json.gz",
+    ]
+
+
+def test_adaptive_concurrency_limiter():
+    async def scenario():
+        limiter = AdaptiveConcurrencyLimiter(initial=4, maximum=6, target_latency=1.0)
+
+        # 成功的请求会逐步提高并发上限，但不会超过最大值
+        for _ in range(100):
+            await limiter.acquire()
+            await limiter.release(0.01)
+        assert limiter.limit == 6
+
+        # 同一批请求同时失败时，并发上限只减半一次
+        for _ in range(3):
+            await limiter.acquire()
+        for _ in range(3):
+            await limiter.release(None)
+        assert limiter.limit == 3
+        assert limiter.in_flight == 0
+
+    asyncio.run(scenario())
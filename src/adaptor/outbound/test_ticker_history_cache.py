@@ -0,0 +1,104 @@
+from datetime import date
+
+import pandas as pd
+
+from adaptor.outbound.ticker import get_us_ticker_history
+from adaptor.outbound.ticker_history_cache import TickerHistoryCache
+
+
+class _FakeAkshare:
+    """按请求的区间返回工作日日线数据，并记录每次请求。"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, symbol: str, start_date: date, end_date: date) -> pd.DataFrame:
+        self.calls.append((start_date, end_date))
+        days = pd.bdate_range(start_date, end_date)
+        return pd.DataFrame(
+            {
+                "日期": days.strftime("%Y-%m-%d"),
+                "开盘": [float(d.day) for d in days],
+                "收盘": [float(d.day) + 0.5 for d in days],
+                "成交量": [d.day * 100 for d in days],
+            }
+        )
+
+
+def test_get_history_appends_only_new_tail(tmp_path):
+    cache = TickerHistoryCache(tmp_path)
+    fetcher = _FakeAkshare()
+
+    first = cache.get_history("105.AAPL", date(2024, 1, 1), date(2024, 1, 31), fetcher)
+    assert fetcher.calls == [(date(2024, 1, 1), date(2024, 1, 31))]
+    assert len(first) == 23
+
+    # 已经覆盖的区间不会再请求
+    inner = cache.get_history("105.AAPL", date(2024, 1, 10), date(2024, 1, 20), fetcher)
+    assert len(fetcher.calls) == 1
+    assert inner["日期"].iloc[0] == pd.Timestamp("2024-01-10")
+    assert inner["日期"].iloc[-1] == pd.Timestamp("2024-01-19")
+
+    # 只请求新的尾部
+    longer = cache.get_history("105.AAPL", date(2024, 1, 1), date(2024, 2, 29), fetcher)
+    assert fetcher.calls[1] == (date(2024, 2, 1), date(2024, 2, 29))
+    assert longer["日期"].is_monotonic_increasing
+    assert longer["日期"].is_unique
+    expected = _FakeAkshare()(None, date(2024, 1, 1), date(2024, 2, 29))
+    assert longer["收盘"].tolist() == expected["收盘"].tolist()
+
+    # 需要更早的数据时重新获取整个区间，且不会缩短已覆盖的结束日期
+    cache.get_history("105.AAPL", date(2023, 12, 1), date(2024, 1, 5), fetcher)
+    assert fetcher.calls[2] == (date(2023, 12, 1), date(2024, 2, 29))
+    _, coverage_start, coverage_end = cache.load("105.AAPL")
+    assert (coverage_start, coverage_end) == (date(2023, 12, 1), date(2024, 2, 29))
+
+
+def test_get_history_covers_only_returned_bars(tmp_path):
+    cache = TickerHistoryCache(tmp_path)
+    fetcher = _FakeAkshare()
+
+    def unfinished(symbol, start_date, end_date):
+        # 1 月 31 日的交易还没有收盘，接口只返回到前一天
+        return fetcher(symbol, start_date, end_date).iloc[:-1]
+
+    first = cache.get_history(
+        "105.AAPL", date(2024, 1, 1), date(2024, 1, 31), unfinished
+    )
+    assert first["日期"].iloc[-1] == pd.Timestamp("2024-01-30")
+    assert cache.load("105.AAPL")[2] == date(2024, 1, 30)
+
+    # 下次获取时重新请求缺少的那一天
+    again = cache.get_history("105.AAPL", date(2024, 1, 1), date(2024, 1, 31), fetcher)
+    assert fetcher.calls[-1] == (date(2024, 1, 31), date(2024, 1, 31))
+    assert again["日期"].iloc[-1] == pd.Timestamp("2024-01-31")
+    assert cache.load("105.AAPL")[2] == date(2024, 1, 31)
+
+
+def test_get_history_keeps_all_raw_columns(tmp_path):
+    cache = TickerHistoryCache(tmp_path)
+    cache.get_history("00700", date(2024, 3, 1), date(2024, 3, 8), _FakeAkshare())
+
+    table, _, _ = cache.load("00700")
+
+    assert table.column_names == ["日期", "开盘", "收盘", "成交量"]
+    assert table.num_rows == 6
+
+
+def test_get_us_ticker_history_reads_from_cache(tmp_path, monkeypatch):
+    import adaptor.outbound.ticker as ticker
+
+    fetcher = _FakeAkshare()
+    monkeypatch.setattr(ticker, "_fetch_us_bars", fetcher)
+    cache = TickerHistoryCache(tmp_path)
+
+    prices = get_us_ticker_history(
+        "105.AAPL", date(2024, 1, 1), date(2024, 1, 5), cache=cache
+    )
+    again = get_us_ticker_history(
+        "105.AAPL", date(2024, 1, 1), date(2024, 1, 5), cache=cache
+    )
+
+    assert prices == again
+    assert prices[0] == (date(2024, 1, 1), 1.5)
+    assert len(fetcher.calls) == 1
@@ -1,7 +1,23 @@
-from datetime import date
+from collections.abc import Callable
+from datetime import date, timedelta
 
+import pandas as pd
 from akshare import stock_hk_hist, stock_hk_spot_em, stock_us_hist, stock_us_spot_em
 
+from adaptor.outbound.ticker_history_cache import (
+    DATE_COLUMN,
+    TickerHistoryCache,
+    ticker_history_cache,
+)
+
+# akshare 日线数据中的收盘价列
+CLOSE_COLUMN = "收盘"
+
+# 美股代码的交易所前缀：105 纳斯达克，106 纽交所，107 美交所
+US_EXCHANGE_PREFIXES = ("105", "106", "107")
+# 定向查询代码时检查最近多少天内是否有日线数据
+SYMBOL_LOOKUP_DAYS = 30
+
 
 def get_all_us_symbols() -> list[tuple[str, str]]:
     df = stock_us_spot_em()
@@ -9,15 +25,22 @@ def get_all_us_symbols() -> list[tuple[str, str]]:
 
 
 def get_us_ticker_history(
-    symbol: str, start_date: date, end_date: date
+    symbol: str,
+    start_date: date,
+    end_date: date,
+    cache: TickerHistoryCache = ticker_history_cache,
 ) -> list[tuple[date, float]]:
-    df = stock_us_hist(
+    df = cache.get_history(symbol, start_date, end_date, _fetch_us_bars)
+    return _to_close_prices(df)
+
+
+def _fetch_us_bars(symbol: str, start_date: date, end_date: date) -> pd.DataFrame:
+    return stock_us_hist(
         symbol=symbol,
         period="daily",
         start_date=start_date.strftime("%Y%m%d"),
         end_date=end_date.strftime("%Y%m%d"),
     )
-    return [(date.fromisoformat(row["日期"]), row["收盘"]) for _, row in df.iterrows()]
 
 
 def get_all_hk_symbols() -> list[tuple[str, str]]:
@@ -26,12 +49,76 @@ def get_all_hk_symbols() -> list[tuple[str, str]]:
 
 
 def get_hk_ticker_history(
-    symbol: str, start_date: date, end_date: date
+    symbol: str,
+    start_date: date,
+    end_date: date,
+    cache: TickerHistoryCache = ticker_history_cache,
 ) -> list[tuple[date, float]]:
-    df = stock_hk_hist(
+    df = cache.get_history(symbol, start_date, end_date, _fetch_hk_bars)
+    return _to_close_prices(df)
+
+
+def _fetch_hk_bars(symbol: str, start_date: date, end_date: date) -> pd.DataFrame:
+    return stock_hk_hist(
         symbol=symbol,
         period="daily",
         start_date=start_date.strftime("%Y%m%d"),
         end_date=end_date.strftime("%Y%m%d"),
     )
-    return [(row["日期"], row["收盘"]) for _, row in df.iterrows()]
+
+
+def _to_close_prices(df: pd.DataFrame) -> list[tuple[date, float]]:
+    """从日线数据中取出 (日期, 收盘价)。"""
+    if df.empty:
+        return []
+    dates = df[DATE_COLUMN].dt.date.tolist()
+    return list(zip(dates, df[CLOSE_COLUMN].tolist()))
+
+
+def find_us_symbol(code: str) -> str | None:
+    """
+    不下载完整的股票列表，定向查询一个美股代码。
+
+    没有交易所前缀的代码依次尝试各个交易所，最近有日线数据的即为有效代码。
+
+    Returns:
+        str | None: 带交易所前缀的代码，例如 105.AAPL，找不到时返回 None。
+    """
+    code = code.strip().upper()
+    _, dot, short_code = code.rpartition(".")
+    if not short_code:
+        return None
+    candidates = (
+        [code] if dot else [f"{prefix}.{short_code}" for prefix in US_EXCHANGE_PREFIXES]
+    )
+    for symbol in candidates:
+        if _has_recent_bars(_fetch_us_bars, symbol):
+            return symbol
+    return None
+
+
+def find_hk_symbol(code: str) -> str | None:
+    """
+    不下载完整的股票列表，定向查询一个港股代码。
+
+    Returns:
+        str | None: 补齐前导零的五位代码，例如 00700，找不到时返回 None。
+    """
+    code = code.strip()
+    if not code.isdigit() or len(code) > 5:
+        return None
+    symbol = code.zfill(5)
+    return symbol if _has_recent_bars(_fetch_hk_bars, symbol) else None
+
+
+def _has_recent_bars(
+    fetcher: Callable[[str, date, date], pd.DataFrame], symbol: str
+) -> bool:
+    end_date = date.today()
+    start_date = end_date - timedelta(SYMBOL_LOOKUP_DAYS)
+    try:
+        df = fetcher(symbol, start_date, end_date)
+    except Exception:
+        # akshare 对不存在的代码可能直接抛出异常
+        return False
+    return df is not None and not df.empty
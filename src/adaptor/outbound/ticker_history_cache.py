@@ -0,0 +1,165 @@
+"""
+akshare 原始日线数据的本地列式缓存。
+
+每只股票一个未压缩的 Feather（Arrow IPC）文件，保存 akshare 返回的全部列，
+读取时通过内存映射构造 Arrow 表，不需要先把整个文件读入内存再解析。转换为
+DataFrame 时 to_pandas 仍会复制数据，日期和字符串列还要转换为 Python 对象。
+文件的元数据记录了已经覆盖的日期区间，已经过去的日期不会再向 akshare 请求，
+只追加新的尾部数据。
+"""
+
+import logging
+import os
+import threading
+from collections.abc import Callable
+from datetime import date, timedelta
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+# 缓存目录，与数据库文件同样位于 data 目录下
+TICKER_HISTORY_CACHE_DIR = Path("data") / "cache" / "ticker_history"
+
+# akshare 日线数据中的日期列
+DATE_COLUMN = "日期"
+
+_COVERAGE_START = b"coverage_start"
+_COVERAGE_END = b"coverage_end"
+
+# (symbol, start_date, end_date) -> akshare 返回的 DataFrame
+HistoryFetcher = Callable[[str, date, date], pd.DataFrame]
+
+
+class TickerHistoryCache:
+    """按股票代码保存 akshare 日线数据的缓存。"""
+
+    def __init__(self, directory: Path = TICKER_HISTORY_CACHE_DIR) -> None:
+        self.directory = Path(directory)
+        self._lock = threading.Lock()
+        # 每只股票一把锁，不同股票可以并发获取
+        self._symbol_locks: dict[str, threading.Lock] = {}
+
+    def load(
+        self, symbol: str, memory_map: bool = True
+    ) -> tuple[pa.Table, date, date] | None:
+        """读取某只股票的缓存。
+
+        Returns:
+            tuple | None: (日线数据, 覆盖的起始日期, 覆盖的结束日期)，没有缓存时返回 None
+        """
+        path = self._path(symbol)
+        try:
+            table = feather.read_table(path, memory_map=memory_map)
+        except FileNotFoundError:
+            return None
+        except (OSError, pa.ArrowInvalid) as e:
+            logging.warning(f"警告: 行情缓存文件 {path} 无法读取，已删除: {e}")
+            path.unlink(missing_ok=True)
+            return None
+
+        metadata = table.schema.metadata or {}
+        if _COVERAGE_START not in metadata or _COVERAGE_END not in metadata:
+            return None
+        return (
+            table,
+            date.fromisoformat(metadata[_COVERAGE_START].decode()),
+            date.fromisoformat(metadata[_COVERAGE_END].decode()),
+        )
+
+    def get_history(
+        self,
+        symbol: str,
+        start_date: date,
+        end_date: date,
+        fetcher: HistoryFetcher,
+    ) -> pd.DataFrame:
+        """获取 [start_date, end_date] 区间的日线数据，缓存未覆盖的部分才调用 fetcher。
+
+        今天的数据可能仍在变化，不会写入缓存，区间的结束日期最晚为昨天。覆盖的结束日期
+        记录为实际返回的最后一条日线的日期：美股昨天的交易可能还没有收盘，
+        akshare 还没有这一天的数据，下次获取时需要重新请求。
+        """
+        end_date = min(end_date, date.today() - timedelta(1))
+        if start_date > end_date:
+            return pd.DataFrame()
+
+        with self._symbol_lock(symbol):
+            cached = self.load(symbol)
+            if cached is None or start_date < cached[1]:
+                # 没有缓存，或者需要更早的数据，重新获取整个区间
+                fetch_end = end_date if cached is None else max(end_date, cached[2])
+                cached = None
+                bars = _normalize(fetcher(symbol, start_date, fetch_end))
+                if bars.empty:
+                    return bars
+                self._write(symbol, bars, start_date, _last_bar_date(bars))
+            elif end_date > cached[2]:
+                table, coverage_start, coverage_end = cached
+                # 只请求缺失的尾部，追加到已有数据之后
+                tail = _normalize(
+                    fetcher(symbol, coverage_end + timedelta(1), end_date)
+                )
+                if tail.empty:
+                    # 还没有新的日线数据，缓存保持不变，下次重新请求
+                    bars = table.to_pandas()
+                else:
+                    # 改为普通读取，释放内存映射之后才能替换文件
+                    del table, cached
+                    bars = feather.read_table(self._path(symbol)).to_pandas()
+                    bars = pd.concat([bars, tail], ignore_index=True)
+                    self._write(symbol, bars, coverage_start, _last_bar_date(tail))
+            else:
+                bars = cached[0].to_pandas()
+
+        dates = bars[DATE_COLUMN]
+        mask = (dates >= pd.Timestamp(start_date)) & (dates <= pd.Timestamp(end_date))
+        return bars[mask].reset_index(drop=True)
+
+    def _symbol_lock(self, symbol: str) -> threading.Lock:
+        with self._lock:
+            return self._symbol_locks.setdefault(symbol, threading.Lock())
+
+    def _path(self, symbol: str) -> Path:
+        return self.directory / f"{symbol.replace('/', '_')}.feather"
+
+    def _write(
+        self, symbol: str, bars: pd.DataFrame, coverage_start: date, coverage_end: date
+    ) -> None:
+        """写入整只股票的缓存，写入失败只记录警告。"""
+        path = self._path(symbol)
+        tmp_path = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+        table = pa.Table.from_pandas(bars, preserve_index=False)
+        table = table.replace_schema_metadata(
+            {
+                **(table.schema.metadata or {}),
+                _COVERAGE_START: coverage_start.isoformat().encode(),
+                _COVERAGE_END: coverage_end.isoformat().encode(),
+            }
+        )
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            # 不压缩，读取时才能内存映射而不需要先解压
+            feather.write_feather(table, tmp_path, compression="uncompressed")
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logging.warning(f"警告: 写入 {symbol} 的行情缓存失败: {e}")
+            tmp_path.unlink(missing_ok=True)
+
+
+def _last_bar_date(bars: pd.DataFrame) -> date:
+    """按日期排序的日线数据中最后一条的日期。"""
+    return bars[DATE_COLUMN].iloc[-1].date()
+
+
+def _normalize(df: pd.DataFrame) -> pd.DataFrame:
+    """统一日期列的类型，并按日期排序。"""
+    if df is None or df.empty or DATE_COLUMN not in df.columns:
+        return pd.DataFrame()
+    df = df.copy()
+    df[DATE_COLUMN] = pd.to_datetime(df[DATE_COLUMN])
+    return df.sort_values(DATE_COLUMN, ignore_index=True)
+
+
+ticker_history_cache = TickerHistoryCache()
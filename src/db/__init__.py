@@ -1,3 +1,5 @@
-from sqlalchemy import Engine, create_engine
+from sqlalchemy import Engine
 
-engine: Engine = create_engine("sqlite:///data/finance.db")
+from db.engine import create_sqlite_engine
+
+engine: Engine = create_sqlite_engine()
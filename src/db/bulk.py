@@ -0,0 +1,53 @@
+"""
+批量写入工具。
+
+同步任务会产生大量的行数据，逐个构造 ORM 对象再通过 session.add_all 写入，
+会带来工作单元的簿记开销和较高的峰值内存。这里把行数据以普通元组的形式
+分块交给 Core insert 的 executemany 执行，每一块占用的内存都是有界的，
+并且所有块都在调用方 Session 的同一个事务中完成。
+"""
+
+import logging
+import time
+from collections.abc import Iterable, Sequence
+from itertools import islice
+
+from sqlalchemy import Table, insert
+from sqlalchemy.orm import Session
+
+# 每次 executemany 写入的行数
+BULK_INSERT_CHUNK_SIZE = 5000
+
+
+def bulk_insert(
+    session: Session,
+    table: Table,
+    columns: Sequence[str],
+    rows: Iterable[tuple],
+    chunk_size: int = BULK_INSERT_CHUNK_SIZE,
+) -> int:
+    """
+    把元组形式的行数据分块写入指定的表。
+
+    Args:
+        session: 当前事务所在的 Session，由调用方负责提交。
+        table: 目标表，例如 TickerInfo.__table__。
+        columns: 与每个元组一一对应的列名。
+        rows: 行数据，可以是生成器，会被逐块消费。
+        chunk_size: 每块的行数。
+
+    Returns:
+        int: 写入的总行数。
+    """
+    statement = insert(table)
+    start_time = time.perf_counter()
+    total = 0
+
+    iterator = iter(rows)
+    while chunk := list(islice(iterator, chunk_size)):
+        session.execute(statement, [dict(zip(columns, row)) for row in chunk])
+        total += len(chunk)
+
+    elapsed_time = time.perf_counter() - start_time
+    logging.info(f"表 '{table.name}' 批量写入 {total} 行，耗时: {elapsed_time:.4f} 秒")
+    return total
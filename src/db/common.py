@@ -1,27 +1,61 @@
 from datetime import datetime
-from decimal import Decimal
+from decimal import ROUND_HALF_EVEN, Decimal, InvalidOperation
 from typing import Any
 
-from sqlalchemy import TEXT, DateTime, TypeDecorator, func
+from sqlalchemy import BigInteger, DateTime, TypeDecorator, func
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 
 
-class DecimalAsString(TypeDecorator):
-    impl = TEXT()  # 底层数据库类型
+# SQLite 的 INTEGER 是 64 位有符号整数
+_MAX_FIXED_POINT = 2**63 - 1
 
-    def process_bind_param(self, value: Any, dialect: Any) -> str | None:
+
+def quantize_fixed_point(value: Decimal, scale: int) -> Decimal:
+    """按照 FixedPointDecimal(scale) 写入时的规则舍入，得到读回时的值。"""
+    return value.quantize(Decimal(1).scaleb(-scale), rounding=ROUND_HALF_EVEN)
+
+
+class FixedPointDecimal(TypeDecorator):
+    """
+    以定点整数存储 Decimal，scale 为小数位数，数据库中保存的是 value * 10**scale。
+
+    scale 位以内的小数可以精确地存取，超出的部分按银行家舍入法舍入。整数存储让
+    SUM、窗口函数等可以直接在数据库中计算，pandas/numpy 读取时也是整数列，
+    除以 10**scale 即可得到原值。func.sum 等聚合函数会沿用列的类型，
+    通过 ORM 查询得到的仍然是 Decimal。
+    """
+
+    impl = BigInteger
+    cache_ok = True
+
+    def __init__(self, scale: int) -> None:
+        super().__init__()
+        self.scale = scale
+        self._max_value = Decimal(_MAX_FIXED_POINT).scaleb(-scale)
+
+    def process_bind_param(self, value: Any, dialect: Any) -> int | None:
         if value is None:
             return None
         if not isinstance(value, Decimal):
             value = Decimal(value)
-        # 转成字符串存储
-        return str(value)
+        try:
+            rounded = quantize_fixed_point(value, self.scale)
+        except InvalidOperation:
+            # 有效数字超过了 Decimal 上下文的精度
+            rounded = None
+        if rounded is None or abs(rounded) > self._max_value:
+            raise ValueError(f"数值 {value} 超出 {self.scale} 位小数定点整数的范围")
+        return int(rounded.scaleb(self.scale))
 
     def process_result_value(self, value: Any, dialect: Any) -> Decimal | None:
         if value is None:
             return None
-        # 读取时转回Decimal
-        return Decimal(value)
+        # 去掉末尾的 0，存入的 Decimal("1.5") 读出来仍然是 Decimal("1.5")
+        result = Decimal(value).scaleb(-self.scale).normalize()
+        if result.as_tuple().exponent > 0:
+            # normalize 会把 100 变成 1E+2，恢复为整数形式
+            result = result.quantize(Decimal(1))
+        return result
 
 
 class Base(DeclarativeBase):
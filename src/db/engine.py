@@ -0,0 +1,82 @@
+"""
+SQLite 引擎工厂。
+
+每个新建的连接都会执行一组 PRAGMA：WAL 日志模式让页面读取时不会被同步任务的
+写事务阻塞，synchronous=NORMAL 在 WAL 模式下仍然保证数据库不会损坏，同时减少
+fsync 次数；mmap_size、cache_size 和 temp_store 用内存换取读取和排序的速度。
+Streamlit 在多个线程中执行页面脚本，连接由 QueuePool 管理并允许跨线程使用。
+
+所有参数都可以通过环境变量调整，例如 FINANCE_SQLITE_MMAP_SIZE=0 关闭内存映射。
+"""
+
+import os
+from typing import NamedTuple
+
+from sqlalchemy import Engine, create_engine, event
+from sqlalchemy.pool import QueuePool
+
+DATABASE_URL = "sqlite:///data/finance.db"
+
+_ENV_PREFIX = "FINANCE_"
+
+
+class SQLiteSettings(NamedTuple):
+    """SQLite 连接参数，字段名加上 FINANCE_ 前缀并大写即为对应的环境变量。"""
+
+    database_url: str = DATABASE_URL
+    # 日志模式，WAL 允许读写并发
+    sqlite_journal_mode: str = "WAL"
+    # WAL 模式下 NORMAL 只在检查点时 fsync
+    sqlite_synchronous: str = "NORMAL"
+    # 内存映射读取的最大字节数
+    sqlite_mmap_size: int = 256 * 1024 * 1024
+    # 页缓存大小，负数表示 KiB
+    sqlite_cache_size: int = -64 * 1024
+    # 临时表和排序使用内存
+    sqlite_temp_store: str = "MEMORY"
+    # 数据库被锁时等待的毫秒数
+    sqlite_busy_timeout: int = 30_000
+    # 连接池常驻的连接数和允许额外创建的连接数
+    pool_size: int = 8
+    max_overflow: int = 16
+
+    @classmethod
+    def from_env(cls) -> "SQLiteSettings":
+        """读取环境变量中的设置，未设置的字段使用默认值。"""
+        values = {}
+        for field, default in cls._field_defaults.items():
+            raw = os.environ.get(f"{_ENV_PREFIX}{field.upper()}")
+            if raw is not None:
+                values[field] = type(default)(raw)
+        return cls(**values)
+
+
+def create_sqlite_engine(settings: SQLiteSettings | None = None) -> Engine:
+    """按照设置创建 SQLite 引擎，每个新连接都会应用设置中的 PRAGMA。"""
+    settings = settings or SQLiteSettings.from_env()
+    engine = create_engine(
+        settings.database_url,
+        poolclass=QueuePool,
+        pool_size=settings.pool_size,
+        max_overflow=settings.max_overflow,
+        connect_args={
+            # 连接由连接池在线程之间复用
+            "check_same_thread": False,
+            "timeout": settings.sqlite_busy_timeout / 1000,
+        },
+    )
+
+    @event.listens_for(engine, "connect")
+    def _apply_pragmas(dbapi_connection, connection_record) -> None:
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute(f"PRAGMA journal_mode = {settings.sqlite_journal_mode}")
+            cursor.execute(f"PRAGMA synchronous = {settings.sqlite_synchronous}")
+            cursor.execute(f"PRAGMA mmap_size = {int(settings.sqlite_mmap_size)}")
+            cursor.execute(f"PRAGMA cache_size = {int(settings.sqlite_cache_size)}")
+            cursor.execute(f"PRAGMA temp_store = {settings.sqlite_temp_store}")
+            cursor.execute(f"PRAGMA busy_timeout = {int(settings.sqlite_busy_timeout)}")
+        finally:
+            cursor.close()
+
+    return engine
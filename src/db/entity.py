@@ -3,10 +3,20 @@ import enum
 from decimal import Decimal
 from typing import NamedTuple
 
-from sqlalchemy import Date, Enum, String
+from sqlalchemy import DDL, Date, Enum, Index, String, event
 from sqlalchemy.orm import Mapped, mapped_column
 
-from db.common import Base, DecimalAsString
+from db.common import Base, FixedPointDecimal
+
+# 定点整数列的小数位数
+# 货币金额和股票收盘价
+AMOUNT_SCALE = 8
+# 股票份额，支持碎股
+SHARES_SCALE = 8
+# 交易价格和平均成本，平均成本由除法得到，多保留两位
+PRICE_SCALE = 10
+# 汇率
+RATE_SCALE = 10
 
 
 class CurrencyType(enum.Enum):
@@ -32,6 +42,7 @@ class TickerData(NamedTuple):
 
 class Config(Base):
     __tablename__ = "config"
+    __table_args__ = (Index("ix_config_key", "key"),)
 
     key: Mapped[str] = mapped_column(String, nullable=True)
     value: Mapped[str] = mapped_column(String, nullable=True)
@@ -39,12 +50,13 @@ class Config(Base):
 
 class Account(Base):
     __tablename__ = "account"
+    __table_args__ = (Index("ix_account_date", "date"),)
 
     date: Mapped[datetime.date] = mapped_column(
         Date, nullable=False, comment="当前日期对应的账户资产"
     )
     currency: Mapped[Decimal] = mapped_column(
-        DecimalAsString, nullable=False, comment="货币金额"
+        FixedPointDecimal(AMOUNT_SCALE), nullable=False, comment="货币金额"
     )
     currency_type: Mapped[CurrencyType] = mapped_column(
         Enum(CurrencyType), nullable=False, comment="货币单位"
@@ -56,11 +68,35 @@ class AssetType(enum.Enum):
     CURRENCY = "currency"
 
 
+# 仍然有效的持仓区间的结束日期
+OPEN_END_DATE = datetime.date.max
+
+
 class Asset(Base):
+    """
+    持仓区间：只在持仓发生变化的日期写入一条记录，在 [date, end_date) 内有效。
+
+    持仓归零后不再保存记录，存储量只和交易次数有关，与持有的天数无关。
+    """
+
     __tablename__ = "asset"
+    __table_args__ = (
+        # 按开始日期查询区间，子类查询会额外带上 type 条件
+        Index("ix_asset_date_type", "date", "type"),
+        # 查询某一天有效的所有区间
+        Index("ix_asset_end_date_date", "end_date", "date"),
+        Index("ix_asset_update_time", "update_time"),
+    )
 
     date: Mapped[datetime.date] = mapped_column(
-        Date, nullable=False, comment="资产记录时间"
+        Date, nullable=False, comment="持仓生效日期"
+    )
+    end_date: Mapped[datetime.date] = mapped_column(
+        Date,
+        nullable=False,
+        default=OPEN_END_DATE,
+        server_default=OPEN_END_DATE.isoformat(),
+        comment="持仓失效日期（不含），仍然有效时为 9999-12-31",
     )
     type: Mapped[AssetType] = mapped_column(Enum(AssetType), nullable=False)
     comment: Mapped[str] = mapped_column(String, nullable=True, comment="持有资产评论")
@@ -77,10 +113,10 @@ class StockAsset(Asset):
 
     ticker: Mapped[str] = mapped_column(String(20), nullable=True, comment="股票代码")
     shares: Mapped[Decimal] = mapped_column(
-        DecimalAsString, nullable=True, comment="股票份额"
+        FixedPointDecimal(SHARES_SCALE), nullable=True, comment="股票份额"
     )
     price: Mapped[Decimal] = mapped_column(
-        DecimalAsString, nullable=True, comment="平均价格"
+        FixedPointDecimal(PRICE_SCALE), nullable=True, comment="平均价格"
     )
 
 
@@ -90,13 +126,19 @@ class CurrencyAsset(Asset):
     }
 
     currency: Mapped[Decimal] = mapped_column(
-        DecimalAsString, nullable=True, comment="货币金额"
+        FixedPointDecimal(AMOUNT_SCALE), nullable=True, comment="货币金额"
     )
     currency_type: Mapped[CurrencyType] = mapped_column(
         Enum(CurrencyType), nullable=True, comment="货币单位"
     )
 
 
+# 按股票或货币查询某一天有效的区间，每个键的区间互不重叠，
+# 结束日期大于这一天的第一个区间就是候选区间
+Index("ix_asset_ticker_end_date", StockAsset.ticker, Asset.end_date)
+Index("ix_asset_currency_type_end_date", CurrencyAsset.currency_type, Asset.end_date)
+
+
 class TransactionType(enum.Enum):
     SELL = "sell"
     BUY = "buy"
@@ -104,6 +146,10 @@ class TransactionType(enum.Enum):
 
 class Transaction(Base):
     __tablename__ = "transaction"
+    __table_args__ = (
+        Index("ix_transaction_trade_type_date", "trade_type", "date"),
+        Index("ix_transaction_update_time", "update_time"),
+    )
 
     date: Mapped[datetime.date] = mapped_column(
         Date, nullable=False, comment="交易发生时间"
@@ -124,20 +170,24 @@ class StockTransaction(Transaction):
 
     ticker: Mapped[str] = mapped_column(String(20), nullable=True, comment="股票代码")
     shares: Mapped[Decimal] = mapped_column(
-        DecimalAsString, nullable=True, comment="股票份额"
+        FixedPointDecimal(SHARES_SCALE), nullable=True, comment="股票份额"
     )
     price: Mapped[Decimal] = mapped_column(
-        DecimalAsString, nullable=True, comment="交易价格"
+        FixedPointDecimal(PRICE_SCALE), nullable=True, comment="交易价格"
     )
 
 
+# 单表继承的子类列只能在子类定义之后建立索引
+Index("ix_transaction_ticker_date", StockTransaction.ticker, Transaction.date)
+
+
 class CurrencyTransaction(Transaction):
     __mapper_args__ = {
         "polymorphic_identity": AssetType.CURRENCY,
     }
 
     currency: Mapped[Decimal] = mapped_column(
-        DecimalAsString, nullable=True, comment="货币金额"
+        FixedPointDecimal(AMOUNT_SCALE), nullable=True, comment="货币金额"
     )
     currency_type: Mapped[CurrencyType] = mapped_column(
         Enum(CurrencyType), nullable=True, comment="货币单位"
@@ -146,12 +196,17 @@ class CurrencyTransaction(Transaction):
 
 class ExchangedRate(Base):
     __tablename__ = "exchanged_rate"
+    __table_args__ = (
+        Index("ix_exchanged_rate_currency_type_date", "currency_type", "date"),
+        Index("ix_exchanged_rate_date", "date"),
+        Index("ix_exchanged_rate_update_time", "update_time"),
+    )
 
     currency_type: Mapped[CurrencyType] = mapped_column(
         Enum(CurrencyType), nullable=False, comment="美元兑换的货币单位"
     )
     rate: Mapped[Decimal] = mapped_column(
-        DecimalAsString, nullable=False, comment="货币汇率"
+        FixedPointDecimal(RATE_SCALE), nullable=False, comment="货币汇率"
     )
     date: Mapped[datetime.date] = mapped_column(
         Date, nullable=False, comment="对应日期"
@@ -160,13 +215,18 @@ class ExchangedRate(Base):
 
 class TickerInfo(Base):
     __tablename__ = "ticker_info"
+    __table_args__ = (
+        Index("ix_ticker_info_ticker_date", "ticker", "date"),
+        Index("ix_ticker_info_date", "date"),
+        Index("ix_ticker_info_update_time", "update_time"),
+    )
 
     date: Mapped[datetime.date] = mapped_column(
         Date, nullable=False, comment="对应日期"
     )
     ticker: Mapped[str] = mapped_column(String(20), nullable=True, comment="股票代码")
     currency: Mapped[Decimal] = mapped_column(
-        DecimalAsString, nullable=True, comment="货币金额"
+        FixedPointDecimal(AMOUNT_SCALE), nullable=True, comment="货币金额"
     )
     currency_type: Mapped[CurrencyType] = mapped_column(
         Enum(CurrencyType), nullable=False, comment="美元兑换的货币单位"
@@ -182,6 +242,7 @@ class TickerType(enum.Enum):
 
 class TickerSymbol(Base):
     __tablename__ = "ticker_symbol"
+    __table_args__ = (Index("ix_ticker_symbol_symbol", "symbol"),)
 
     symbol: Mapped[str] = mapped_column(String, nullable=False, comment="股票代码")
     name: Mapped[str] = mapped_column(String, nullable=True, comment="股票名称")
@@ -193,3 +254,54 @@ class TickerSymbol(Base):
         return (
             f"(symbol={self.symbol}, name={self.name}, ticker_type={self.ticker_type})"
         )
+
+
+class DirtyDate(Base):
+    """
+    源数据被删除或者改到其他日期时，由触发器记录原来的日期。
+
+    删除的行不会留下 update_time，增量重建的水位线通过这张表找到受影响的最早日期。
+    """
+
+    __tablename__ = "dirty_date"
+    __table_args__ = (
+        Index("ix_dirty_date_table_name_update_time", "table_name", "update_time"),
+    )
+
+    table_name: Mapped[str] = mapped_column(
+        String, nullable=False, comment="源数据表名"
+    )
+    date: Mapped[datetime.date] = mapped_column(
+        Date, nullable=False, comment="受影响的日期"
+    )
+
+
+# 写入与 DateTime 列相同格式的本地时间，才能和 Python 中的 datetime 比较，
+# DDL 会对语句做 % 格式化，百分号需要写两次
+_TRIGGER_NOW = "strftime('%%Y-%%m-%%d %%H:%%M:%%f000', 'now', 'localtime')"
+
+
+def dirty_date_triggers(table_name: str) -> list[DDL]:
+    """返回在删除行或修改行的日期时向 dirty_date 写入原日期的触发器。"""
+    insert = (
+        "INSERT INTO dirty_date (table_name, date, update_time)"
+        f" VALUES ('{table_name}', OLD.date, {_TRIGGER_NOW});"
+    )
+    return [
+        DDL(
+            f"CREATE TRIGGER IF NOT EXISTS trg_{table_name}_delete_dirty_date"
+            f' AFTER DELETE ON "{table_name}" BEGIN {insert} END'
+        ),
+        DDL(
+            f"CREATE TRIGGER IF NOT EXISTS trg_{table_name}_update_dirty_date"
+            f' AFTER UPDATE OF date ON "{table_name}"'
+            f" WHEN OLD.date <> NEW.date BEGIN {insert} END"
+        ),
+    ]
+
+
+# 增量重建资产和账户时作为水位线来源的表
+DIRTY_DATE_SOURCES = (Transaction, TickerInfo, ExchangedRate)
+for _model in DIRTY_DATE_SOURCES:
+    for _trigger in dirty_date_triggers(_model.__tablename__):
+        event.listen(_model.__table__, "after_create", _trigger)
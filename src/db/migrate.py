@@ -0,0 +1,201 @@
+"""
+启动时执行的数据库迁移。
+
+create_all 只会创建不存在的表，不会修改已有的表。已有的 data/finance.db 需要的
+结构变更按顺序登记在 MIGRATIONS 中，数据库当前所在的版本记录在 SQLite 的
+PRAGMA user_version 里，启动时只执行版本号之后的迁移，每一步都在同一个事务中
+完成并更新版本号。
+"""
+
+import logging
+import threading
+from collections.abc import Callable
+from decimal import Decimal
+
+from sqlalchemy import Connection, Engine
+
+import db
+from db.bulk import BULK_INSERT_CHUNK_SIZE
+from db.common import Base, FixedPointDecimal
+from db.entity import (
+    DIRTY_DATE_SOURCES,
+    OPEN_END_DATE,
+    DirtyDate,
+    dirty_date_triggers,
+)
+
+
+def _create_indexes(conn: Connection) -> None:
+    """
+    为已有的表补建模型中声明的索引，并更新查询规划器使用的统计信息。
+
+    模型中的索引可能用到之后的迁移才会添加的列（例如持仓区间的 end_date），
+    这些索引先跳过，由添加列的迁移在加列之后再次调用本函数补建。
+    """
+    for table in Base.metadata.sorted_tables:
+        existing = {
+            row[1] for row in conn.exec_driver_sql(f'PRAGMA table_info("{table.name}")')
+        }
+        for index in table.indexes:
+            if all(column.name in existing for column in index.columns):
+                index.create(conn, checkfirst=True)
+    conn.exec_driver_sql("ANALYZE")
+
+
+def _store_decimals_as_fixed_point(conn: Connection) -> None:
+    """
+    把以 TEXT 字符串保存的 Decimal 列改为定点整数。
+
+    SQLite 不支持修改列的类型，按照官方推荐的方式重建表：旧表改名，按模型建立新表
+    和索引，把数据逐块转换后复制过去，最后删除旧表。新建的数据库中这些列已经是
+    整数类型，直接跳过。
+    """
+    dialect = conn.dialect
+    for table in Base.metadata.sorted_tables:
+        fixed_columns = {
+            column.name: column.type
+            for column in table.columns
+            if isinstance(column.type, FixedPointDecimal)
+        }
+        if not fixed_columns:
+            continue
+        declared_types = {
+            row[1]: row[2].upper()
+            for row in conn.exec_driver_sql(f'PRAGMA table_info("{table.name}")')
+        }
+        if all(declared_types.get(name) != "TEXT" for name in fixed_columns):
+            continue
+
+        old_name = f"{table.name}_before_fixed_point"
+        conn.exec_driver_sql(f'ALTER TABLE "{table.name}" RENAME TO "{old_name}"')
+        # 改名后旧表的索引仍然占用原来的名字
+        for index in table.indexes:
+            conn.exec_driver_sql(f'DROP INDEX IF EXISTS "{index.name}"')
+        table.create(conn)
+
+        names = [
+            column.name for column in table.columns if column.name in declared_types
+        ]
+        converters = [fixed_columns.get(name) for name in names]
+        column_list = ", ".join(f'"{name}"' for name in names)
+        placeholders = ", ".join("?" for _ in names)
+        rows = conn.exec_driver_sql(f'SELECT {column_list} FROM "{old_name}"')
+        insert = f'INSERT INTO "{table.name}" ({column_list}) VALUES ({placeholders})'
+        while chunk := rows.fetchmany(BULK_INSERT_CHUNK_SIZE):
+            conn.exec_driver_sql(
+                insert,
+                [
+                    tuple(
+                        value
+                        if converter is None or value is None
+                        else converter.process_bind_param(Decimal(value), dialect)
+                        for converter, value in zip(converters, row)
+                    )
+                    for row in chunk
+                ],
+            )
+        conn.exec_driver_sql(f'DROP TABLE "{old_name}"')
+    conn.exec_driver_sql("ANALYZE")
+
+
+def _store_positions_as_intervals(conn: Connection) -> None:
+    """
+    资产表从每天一条快照改为持仓区间，增加 end_date 列。
+
+    持仓区间完全由交易记录计算得到，这里直接清空旧的每日快照，下一次同步时
+    从第一笔交易开始重建。上一步重建表时可能已经按模型建好了 end_date 列。
+    第一步迁移跳过了用到 end_date 的索引，加列之后在这里补建。
+    """
+    columns = {row[1] for row in conn.exec_driver_sql('PRAGMA table_info("asset")')}
+    if "end_date" not in columns:
+        conn.exec_driver_sql(
+            "ALTER TABLE asset ADD COLUMN end_date DATE NOT NULL"
+            f" DEFAULT '{OPEN_END_DATE.isoformat()}'"
+        )
+    conn.exec_driver_sql("DELETE FROM asset")
+    _create_indexes(conn)
+
+
+def _drop_filled_ticker_prices(conn: Connection) -> None:
+    """
+    删除以前为周末和节假日向前填充的股票价格。
+
+    填充的行与前一天的价格相同，读取时会按最近一个交易日的收盘价补齐，
+    删除与同一只股票上一条记录价格相同的行不会改变任何一天读到的价格。
+    """
+    conn.exec_driver_sql(
+        """
+        DELETE FROM ticker_info WHERE id IN (
+            SELECT id FROM (
+                SELECT id, currency, LAG(currency) OVER (
+                    PARTITION BY ticker ORDER BY date
+                ) AS previous_currency
+                FROM ticker_info
+            )
+            WHERE currency = previous_currency
+        )
+        """
+    )
+    conn.exec_driver_sql("ANALYZE")
+
+
+def _track_dirty_dates(conn: Connection) -> None:
+    """
+    为增量重建的源数据表添加记录删除和改日期的触发器。
+
+    新建的表由 create_all 建表时一起创建触发器，这里为已有的表补建。
+    """
+    DirtyDate.__table__.create(conn, checkfirst=True)
+    for model in DIRTY_DATE_SOURCES:
+        for trigger in dirty_date_triggers(model.__tablename__):
+            conn.execute(trigger)
+
+
+# 按顺序执行的迁移，第 n 个迁移执行完后数据库版本为 n
+MIGRATIONS: list[Callable[[Connection], None]] = [
+    _create_indexes,
+    _store_decimals_as_fixed_point,
+    _store_positions_as_intervals,
+    _drop_filled_ticker_prices,
+    _track_dirty_dates,
+]
+
+
+def get_schema_version(conn: Connection) -> int:
+    return conn.exec_driver_sql("PRAGMA user_version").scalar_one()
+
+
+def migrate(engine: Engine) -> int:
+    """
+    把数据库迁移到最新版本，应在 create_all 之后调用。
+
+    Returns:
+        int: 迁移后的版本号。
+    """
+    with engine.begin() as conn:
+        version = get_schema_version(conn)
+        for number, step in enumerate(MIGRATIONS[version:], start=version + 1):
+            logging.info(f"执行数据库迁移 {number}: {step.__name__}")
+            step(conn)
+            conn.exec_driver_sql(f"PRAGMA user_version = {number}")
+        return max(version, len(MIGRATIONS))
+
+
+_schema_lock = threading.Lock()
+_schema_ready = False
+
+
+def ensure_schema() -> None:
+    """
+    创建缺少的表并把 db.engine 迁移到最新版本，每个进程只执行一次。
+
+    每个页面都要在读写数据库之前调用：旧数据库的 Decimal 列还是 TEXT 时写入的
+    定点整数，会在迁移时被再次放大。
+    """
+    global _schema_ready
+    with _schema_lock:
+        if _schema_ready:
+            return
+        Base.metadata.create_all(db.engine)
+        migrate(db.engine)
+        _schema_ready = True
@@ -0,0 +1,56 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
+from sqlalchemy import create_engine, event, func, select
+from sqlalchemy.orm import Session
+
+from db.bulk import BULK_INSERT_CHUNK_SIZE, bulk_insert
+from db.common import Base
+from db.entity import CurrencyType, TickerInfo
+
+
+def test_bulk_insert_writes_rows_in_chunks():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    batches = []
+    event.listen(
+        engine,
+        "before_cursor_execute",
+        lambda conn, cursor, statement, parameters, context, executemany: (
+            batches.append(len(parameters) if executemany else 1)
+        ),
+    )
+    total = BULK_INSERT_CHUNK_SIZE + 123
+    first_day = date(2000, 1, 1)
+    rows = (
+        (
+            first_day + timedelta(i),
+            "AAPL",
+            Decimal(i) / 100,
+            CurrencyType.USD,
+        )
+        for i in range(total)
+    )
+
+    with Session(engine) as session:
+        count = bulk_insert(
+            session,
+            TickerInfo.__table__,
+            ["date", "ticker", "currency", "currency_type"],
+            rows,
+        )
+        session.commit()
+
+        assert count == total
+        # 每块一次 executemany
+        assert batches == [BULK_INSERT_CHUNK_SIZE, 123]
+        assert session.scalar(select(func.count(TickerInfo.id))) == total
+        last = session.scalars(
+            select(TickerInfo).order_by(TickerInfo.date.desc()).limit(1)
+        ).one()
+        assert last.date == first_day + timedelta(total - 1)
+        assert last.currency == Decimal(total - 1) / 100
+        assert last.currency_type == CurrencyType.USD
+        # Core insert 同样会填充 Python 端的默认值
+        assert last.update_time is not None
+    engine.dispose()
@@ -0,0 +1,60 @@
+from datetime import date
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import Session
+
+from db.common import Base, FixedPointDecimal
+from db.entity import Account, CurrencyType
+
+
+@pytest.fixture
+def session():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        yield session
+    engine.dispose()
+
+
+@pytest.mark.parametrize(
+    "value", ["0", "1.5", "100", "-42.12345678", "12345678901.00000001"]
+)
+def test_fixed_point_round_trip(value):
+    column_type = FixedPointDecimal(8)
+    stored = column_type.process_bind_param(Decimal(value), None)
+    assert isinstance(stored, int)
+    assert str(column_type.process_result_value(stored, None)) == value
+
+
+def test_fixed_point_rounds_extra_digits_and_rejects_overflow():
+    column_type = FixedPointDecimal(2)
+    assert column_type.process_bind_param(Decimal("0.125"), None) == 12
+    assert column_type.process_bind_param(Decimal("0.135"), None) == 14
+    with pytest.raises(ValueError):
+        column_type.process_bind_param(Decimal(2**63), None)
+    with pytest.raises(ValueError):
+        column_type.process_bind_param(Decimal("1e40"), None)
+
+
+def test_fixed_point_aggregates_in_database(session):
+    session.add_all(
+        Account(
+            date=date(2024, 1, day), currency=amount, currency_type=CurrencyType.USD
+        )
+        for day, amount in [(1, Decimal("0.1")), (2, Decimal("0.2")), (3, Decimal("3"))]
+    )
+    session.commit()
+
+    assert session.scalar(select(func.sum(Account.currency))) == Decimal("3.3")
+    running = session.scalars(
+        select(func.sum(Account.currency).over(order_by=Account.date))
+    ).all()
+    assert running == [Decimal("0.1"), Decimal("0.3"), Decimal("3.3")]
+    assert (
+        session.connection()
+        .exec_driver_sql("SELECT sum(currency) FROM account")
+        .scalar_one()
+        == 330_000_000
+    )
@@ -0,0 +1,71 @@
+import threading
+
+from sqlalchemy import text
+
+from db.engine import SQLiteSettings, create_sqlite_engine
+
+
+def _settings(tmp_path, **overrides) -> SQLiteSettings:
+    return SQLiteSettings(database_url=f"sqlite:///{tmp_path / 'finance.db'}")._replace(
+        **overrides
+    )
+
+
+def test_pragmas_are_applied_on_connect(tmp_path):
+    engine = create_sqlite_engine(_settings(tmp_path, sqlite_cache_size=-1024))
+
+    with engine.connect() as conn:
+        pragma = lambda name: conn.exec_driver_sql(f"PRAGMA {name}").scalar()  # noqa: E731
+        assert pragma("journal_mode") == "wal"
+        # NORMAL = 1，MEMORY = 2
+        assert pragma("synchronous") == 1
+        assert pragma("temp_store") == 2
+        assert pragma("cache_size") == -1024
+        assert pragma("mmap_size") == 256 * 1024 * 1024
+        assert pragma("busy_timeout") == 30_000
+    engine.dispose()
+
+
+def test_settings_from_env(monkeypatch):
+    monkeypatch.setenv("FINANCE_SQLITE_MMAP_SIZE", "0")
+    monkeypatch.setenv("FINANCE_SQLITE_SYNCHRONOUS", "FULL")
+    monkeypatch.setenv("FINANCE_POOL_SIZE", "2")
+
+    settings = SQLiteSettings.from_env()
+
+    assert settings.sqlite_mmap_size == 0
+    assert settings.sqlite_synchronous == "FULL"
+    assert settings.pool_size == 2
+    assert settings.sqlite_journal_mode == "WAL"
+
+
+def test_reads_and_writes_do_not_block_each_other(tmp_path):
+    engine = create_sqlite_engine(_settings(tmp_path, sqlite_busy_timeout=100))
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE t (v INTEGER)"))
+        conn.execute(text("INSERT INTO t VALUES (1)"))
+
+    errors = []
+
+    def writer():
+        try:
+            with engine.begin() as conn:
+                conn.execute(text("INSERT INTO t VALUES (2)"))
+        except Exception as e:
+            errors.append(e)
+
+    with engine.connect() as reader:
+        # 页面的读事务进行中时，同步任务的写事务仍然可以提交
+        reader.exec_driver_sql("BEGIN")
+        assert reader.execute(text("SELECT count(*) FROM t")).scalar() == 1
+        thread = threading.Thread(target=writer)
+        thread.start()
+        thread.join()
+        # 读事务看到的仍然是开始时的快照
+        assert reader.execute(text("SELECT count(*) FROM t")).scalar() == 1
+        reader.exec_driver_sql("COMMIT")
+
+    assert errors == []
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT count(*) FROM t")).scalar() == 2
+    engine.dispose()
@@ -0,0 +1,415 @@
+import re
+from datetime import date, datetime
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import TEXT, MetaData, create_engine, func, inspect, select
+from sqlalchemy.orm import Session
+
+from db.common import Base, FixedPointDecimal
+from db.entity import (
+    DIRTY_DATE_SOURCES,
+    Account,
+    Asset,
+    Config,
+    CurrencyAsset,
+    CurrencyType,
+    DirtyDate,
+    ExchangedRate,
+    StockAsset,
+    StockTransaction,
+    TickerInfo,
+    TickerSymbol,
+    Transaction,
+    TransactionType,
+)
+import db
+from db import migrate as migrate_module
+from db.migrate import (
+    MIGRATIONS,
+    _drop_filled_ticker_prices,
+    ensure_schema,
+    get_schema_version,
+    migrate,
+)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'finance.db'}")
+    yield engine
+    engine.dispose()
+
+
+def _index_names(engine) -> set[str]:
+    inspector = inspect(engine)
+    return {
+        index["name"]
+        for table in inspector.get_table_names()
+        for index in inspector.get_indexes(table)
+    }
+
+
+def test_ensure_schema_migrates_once(engine, monkeypatch):
+    monkeypatch.setattr(db, "engine", engine)
+    monkeypatch.setattr(migrate_module, "_schema_ready", False)
+    calls = []
+    monkeypatch.setattr(
+        migrate_module, "migrate", lambda engine: calls.append(migrate(engine))
+    )
+
+    ensure_schema()
+    ensure_schema()
+
+    assert calls == [len(MIGRATIONS)]
+    assert "transaction" in inspect(engine).get_table_names()
+
+
+def test_migrate_adds_indexes_to_existing_database(engine):
+    # 模拟没有索引的旧数据库
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        for name in _index_names(engine):
+            conn.exec_driver_sql(f"DROP INDEX {name}")
+    assert _index_names(engine) == set()
+
+    assert migrate(engine) == len(MIGRATIONS)
+
+    expected = {
+        index.name for table in Base.metadata.sorted_tables for index in table.indexes
+    }
+    assert _index_names(engine) == expected
+    with engine.connect() as conn:
+        assert get_schema_version(conn) == len(MIGRATIONS)
+
+    # 已经是最新版本时不会重复执行
+    assert migrate(engine) == len(MIGRATIONS)
+
+
+def test_migrate_converts_decimal_text_to_fixed_point(engine):
+    # 模拟用字符串保存 Decimal 的旧数据库
+    legacy = MetaData()
+    for table in Base.metadata.sorted_tables:
+        legacy_table = table.to_metadata(legacy)
+        for column in legacy_table.columns:
+            if isinstance(column.type, FixedPointDecimal):
+                column.type = TEXT()
+    legacy.create_all(engine)
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            'INSERT INTO "transaction" (date, type, trade_type, ticker, shares, price,'
+            " update_time) VALUES"
+            " ('2024-01-02', 'BUY', 'TICKER', 'AAPL', '1.5', '185.640000000001',"
+            " '2024-01-02 10:00:00'),"
+            " ('2024-01-03', 'BUY', 'TICKER', 'AAPL', '2', '100',"
+            " '2024-01-03 10:00:00')"
+        )
+        conn.exec_driver_sql(
+            "INSERT INTO exchanged_rate (currency_type, rate, date, update_time)"
+            " VALUES ('CNY', '7.1234', '2024-01-02', '2024-01-02 10:00:00')"
+        )
+
+    migrate(engine)
+
+    with engine.connect() as conn:
+        assert {
+            row[0]
+            for row in conn.exec_driver_sql(
+                'SELECT typeof(shares) FROM "transaction"'
+                ' UNION SELECT typeof(price) FROM "transaction"'
+            )
+        } == {"integer"}
+        # 索引和其他列保持不变
+        assert _index_names(engine) >= {"ix_transaction_ticker_date"}
+    with Session(engine) as session:
+        first, second = session.scalars(
+            select(StockTransaction).order_by(Transaction.date)
+        )
+        assert (first.shares, first.price) == (Decimal("1.5"), Decimal("185.64"))
+        assert str(second.price) == "100"
+        assert first.type == TransactionType.BUY
+        assert first.update_time == datetime(2024, 1, 2, 10)
+        assert session.scalar(select(func.sum(StockTransaction.shares))) == Decimal(
+            "3.5"
+        )
+        assert session.scalar(select(ExchangedRate.rate)) == Decimal("7.1234")
+
+
+def test_migrate_drops_forward_filled_ticker_prices(engine):
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        version = MIGRATIONS.index(_drop_filled_ticker_prices)
+        conn.exec_driver_sql(f"PRAGMA user_version = {version}")
+    prices = {
+        "AAPL": ["10", "11", "11", "11", "12", "10"],
+        "MSFT": ["20", "20", "21"],
+    }
+    with Session(engine) as session:
+        session.add_all(
+            TickerInfo(
+                date=date(2024, 1, day),
+                ticker=ticker,
+                currency=Decimal(price),
+                currency_type=CurrencyType.USD,
+            )
+            for ticker, series in prices.items()
+            for day, price in enumerate(series, start=1)
+        )
+        session.commit()
+
+    migrate(engine)
+
+    with Session(engine) as session:
+        remaining = session.execute(
+            select(TickerInfo.ticker, TickerInfo.date, TickerInfo.currency).order_by(
+                TickerInfo.ticker, TickerInfo.date
+            )
+        ).all()
+    assert [(ticker, d.day, str(price)) for ticker, d, price in remaining] == [
+        ("AAPL", 1, "10"),
+        ("AAPL", 2, "11"),
+        ("AAPL", 5, "12"),
+        ("AAPL", 6, "10"),
+        ("MSFT", 1, "20"),
+        ("MSFT", 3, "21"),
+    ]
+
+
+# 引入迁移之前（user_version = 0）的建表语句：Decimal 以 TEXT 保存，没有索引，
+# 资产表每天一条快照且没有 end_date 列
+BASELINE_SCHEMA = [
+    """
+    CREATE TABLE account (
+        date DATE NOT NULL,
+        currency TEXT NOT NULL,
+        currency_type VARCHAR(3) NOT NULL,
+        id INTEGER NOT NULL,
+        create_time DATETIME DEFAULT CURRENT_TIMESTAMP NOT NULL,
+        update_time DATETIME NOT NULL,
+        PRIMARY KEY (id)
+    )
+    """,
+    """
+    CREATE TABLE asset (
+        date DATE NOT NULL,
+        type VARCHAR(8) NOT NULL,
+        comment VARCHAR,
+        id INTEGER NOT NULL,
+        create_time DATETIME DEFAULT CURRENT_TIMESTAMP NOT NULL,
+        update_time DATETIME NOT NULL,
+        ticker VARCHAR(20),
+        shares TEXT,
+        price TEXT,
+        currency TEXT,
+        currency_type VARCHAR(3),
+        PRIMARY KEY (id)
+    )
+    """,
+    """
+    CREATE TABLE config (
+        "key" VARCHAR,
+        value VARCHAR,
+        id INTEGER NOT NULL,
+        create_time DATETIME DEFAULT CURRENT_TIMESTAMP NOT NULL,
+        update_time DATETIME NOT NULL,
+        PRIMARY KEY (id)
+    )
+    """,
+    """
+    CREATE TABLE exchanged_rate (
+        currency_type VARCHAR(3) NOT NULL,
+        rate TEXT NOT NULL,
+        date DATE NOT NULL,
+        id INTEGER NOT NULL,
+        create_time DATETIME DEFAULT CURRENT_TIMESTAMP NOT NULL,
+        update_time DATETIME NOT NULL,
+        PRIMARY KEY (id)
+    )
+    """,
+    """
+    CREATE TABLE ticker_info (
+        date DATE NOT NULL,
+        ticker VARCHAR(20),
+        currency TEXT,
+        currency_type VARCHAR(3) NOT NULL,
+        id INTEGER NOT NULL,
+        create_time DATETIME DEFAULT CURRENT_TIMESTAMP NOT NULL,
+        update_time DATETIME NOT NULL,
+        PRIMARY KEY (id)
+    )
+    """,
+    """
+    CREATE TABLE ticker_symbol (
+        symbol VARCHAR NOT NULL,
+        name VARCHAR,
+        ticker_type VARCHAR(3) NOT NULL,
+        id INTEGER NOT NULL,
+        create_time DATETIME DEFAULT CURRENT_TIMESTAMP NOT NULL,
+        update_time DATETIME NOT NULL,
+        PRIMARY KEY (id)
+    )
+    """,
+    """
+    CREATE TABLE "transaction" (
+        date DATE NOT NULL,
+        type VARCHAR(4) NOT NULL,
+        trade_type VARCHAR(8) NOT NULL,
+        comment VARCHAR,
+        id INTEGER NOT NULL,
+        create_time DATETIME DEFAULT CURRENT_TIMESTAMP NOT NULL,
+        update_time DATETIME NOT NULL,
+        ticker VARCHAR(20),
+        shares TEXT,
+        price TEXT,
+        currency TEXT,
+        currency_type VARCHAR(3),
+        PRIMARY KEY (id)
+    )
+    """,
+]
+
+
+def test_migrate_upgrades_baseline_database(engine):
+    with engine.begin() as conn:
+        for ddl in BASELINE_SCHEMA:
+            conn.exec_driver_sql(ddl)
+        conn.exec_driver_sql(
+            'INSERT INTO "transaction" (date, type, trade_type, ticker, shares, price,'
+            " update_time) VALUES ('2024-01-05', 'BUY', 'TICKER', 'AAPL', '2',"
+            " '185.5', '2024-01-05 10:00:00')"
+        )
+        for day in range(5, 9):
+            update_time = f"2024-01-0{day} 10:00:00"
+            # 旧版本每天写一条持仓快照，周末的收盘价和汇率沿用周五的值
+            conn.exec_driver_sql(
+                "INSERT INTO asset (date, type, ticker, shares, price, update_time)"
+                f" VALUES ('2024-01-0{day}', 'TICKER', 'AAPL', '2', '185.5',"
+                f" '{update_time}')"
+            )
+            conn.exec_driver_sql(
+                "INSERT INTO ticker_info (date, ticker, currency, currency_type,"
+                f" update_time) VALUES ('2024-01-0{day}', 'AAPL',"
+                f" '{'185.92' if day < 8 else '183.73'}', 'USD', '{update_time}')"
+            )
+            conn.exec_driver_sql(
+                "INSERT INTO exchanged_rate (currency_type, rate, date, update_time)"
+                f" VALUES ('CNY', '7.1234', '2024-01-0{day}', '{update_time}')"
+            )
+            conn.exec_driver_sql(
+                "INSERT INTO account (date, currency, currency_type, update_time)"
+                f" VALUES ('2024-01-0{day}', '371.84', 'USD', '{update_time}')"
+            )
+        assert get_schema_version(conn) == 0
+
+    # 与启动时的顺序一致：create_all 不会修改已有的表，再执行全部迁移
+    Base.metadata.create_all(engine)
+    assert migrate(engine) == len(MIGRATIONS)
+
+    inspector = inspect(engine)
+    assert "end_date" in {column["name"] for column in inspector.get_columns("asset")}
+    expected = {
+        index.name for table in Base.metadata.sorted_tables for index in table.indexes
+    }
+    assert _index_names(engine) == expected
+    with engine.connect() as conn:
+        assert get_schema_version(conn) == len(MIGRATIONS)
+        for table, column in [
+            ("transaction", "price"),
+            ("ticker_info", "currency"),
+            ("exchanged_rate", "rate"),
+            ("account", "currency"),
+        ]:
+            types = conn.exec_driver_sql(
+                f'SELECT DISTINCT typeof({column}) FROM "{table}"'
+            ).all()
+            assert types == [("integer",)], table
+        triggers = conn.exec_driver_sql(
+            "SELECT count(*) FROM sqlite_master WHERE type = 'trigger'"
+        ).scalar_one()
+        assert triggers == 2 * len(DIRTY_DATE_SOURCES)
+        # 每日快照在下一次同步时按持仓区间重建
+        assert conn.exec_driver_sql("SELECT count(*) FROM asset").scalar_one() == 0
+
+    with Session(engine) as session:
+        transaction = session.scalars(select(StockTransaction)).one()
+        assert (transaction.shares, transaction.price) == (Decimal(2), Decimal("185.5"))
+        prices = session.execute(
+            select(TickerInfo.date, TickerInfo.currency).order_by(TickerInfo.date)
+        ).all()
+        # 周末向前填充的收盘价被删除
+        assert prices == [
+            (date(2024, 1, 5), Decimal("185.92")),
+            (date(2024, 1, 8), Decimal("183.73")),
+        ]
+        assert set(session.scalars(select(ExchangedRate.rate))) == {Decimal("7.1234")}
+        assert session.scalar(select(func.count(Account.id))) == 4
+
+
+HOT_QUERIES = {
+    "ticker_price_as_of": select(TickerInfo.currency)
+    .where(TickerInfo.ticker == "105.AAPL", TickerInfo.date <= date(2024, 1, 1))
+    .order_by(TickerInfo.date.desc())
+    .limit(1),
+    "ticker_price_marks": select(TickerInfo.ticker, func.max(TickerInfo.date)).group_by(
+        TickerInfo.ticker
+    ),
+    "latest_ticker_prices_before": select(TickerInfo.ticker, func.max(TickerInfo.date))
+    .where(TickerInfo.date < date(2024, 1, 1))
+    .group_by(TickerInfo.ticker),
+    "ticker_prices_since": select(TickerInfo).where(
+        TickerInfo.date >= date(2024, 1, 1)
+    ),
+    "exchange_rate_on": select(ExchangedRate).where(
+        ExchangedRate.currency_type == CurrencyType.CNY,
+        ExchangedRate.date == date(2024, 1, 1),
+    ),
+    "exchange_rates_since": select(ExchangedRate).where(
+        ExchangedRate.date >= date(2024, 1, 1)
+    ),
+    "stock_holding_as_of": select(StockAsset)
+    .where(StockAsset.ticker == "AAPL", StockAsset.end_date > date(2024, 1, 1))
+    .order_by(StockAsset.end_date)
+    .limit(1),
+    "currency_holding_as_of": select(CurrencyAsset)
+    .where(
+        CurrencyAsset.currency_type == CurrencyType.CNY,
+        CurrencyAsset.end_date > date(2024, 1, 1),
+    )
+    .order_by(CurrencyAsset.end_date)
+    .limit(1),
+    "holdings_as_of": select(Asset).where(
+        Asset.end_date > date(2024, 1, 1), Asset.date <= date(2024, 1, 1)
+    ),
+    "assets_since": select(Asset).where(Asset.date >= date(2024, 1, 1)),
+    "first_asset": select(Asset).order_by(Asset.date).limit(1),
+    "latest_accounts": select(Account).order_by(Account.date.desc()).limit(2),
+    "accounts_since": select(Account).where(Account.date >= date(2024, 1, 1)),
+    "stock_transactions_since": select(StockTransaction).where(
+        StockTransaction.date >= date(2024, 1, 1)
+    ),
+    "config_value": select(Config).where(Config.key == "last_sync_date"),
+    "ticker_symbol": select(TickerSymbol).where(TickerSymbol.symbol == "105.AAPL"),
+    "asset_watermark": select(func.min(Asset.date)).where(
+        Asset.update_time > datetime(2024, 1, 1)
+    ),
+    "dirty_date_watermark": select(func.min(DirtyDate.date)).where(
+        DirtyDate.table_name == "transaction",
+        DirtyDate.update_time > datetime(2024, 1, 1),
+    ),
+}
+
+
+@pytest.mark.parametrize("name", HOT_QUERIES)
+def test_hot_queries_use_indexes(engine, name):
+    Base.metadata.create_all(engine)
+    migrate(engine)
+    sql = str(HOT_QUERIES[name].compile(engine, compile_kwargs={"literal_binds": True}))
+
+    with engine.connect() as conn:
+        plan = [row[-1] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}")]
+
+    # 每一次访问表都必须经过索引，不能出现全表扫描
+    assert plan
+    for step in plan:
+        assert not re.fullmatch(r"SCAN \w+", step), plan
+        assert "USING" in step or step.startswith("USE TEMP B-TREE"), plan
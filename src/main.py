@@ -1,8 +1,6 @@
 import streamlit
 
-import db
-from db.common import Base
-from service.sync import sync
+from pages.components.sync_status import render_sync_status
 from utils.logger import setup_logging
 
 if __name__ == "__main__":
@@ -16,9 +14,8 @@ if __name__ == "__main__":
     )
     streamlit.balloons()
 
-    with streamlit.spinner("数据同步中...", show_time=True):
-        Base.metadata.create_all(db.engine)
-        sync()
+    # 在后台同步数据，页面先展示上一次同步的结果
+    render_sync_status()
 
     streamlit.header("Lucky Curve 的财富管理系统")
 
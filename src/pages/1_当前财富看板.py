@@ -17,15 +17,19 @@ from pages.components.charts import (
     create_total_assets_line_chart,
 )
 from pages.components.metrics import display_finance_metrics
+from pages.components.sync_status import render_sync_status
 from service.calculate import (
     calculate_account_change,
-    calculate_ticker_daily_change,
-    calculate_ticker_daily_total_earn_rate,
+    calculate_portfolio_timeseries,
+    portfolio_series,
 )
 from service.dashboard_data import (
+    convert_current_currencies,
+    convert_history,
     fetch_initial_dashboard_data,
     get_converted_financial_data,
 )
+from service.fx import CrossRates
 
 
 def _render_title() -> None:
@@ -99,15 +103,17 @@ def current_finance_summary() -> None:
     current_account: AccountData
     current_ticker: TickerData
     ticker_daily_price_df: pd.DataFrame
-    exchange_rates_df: pd.DataFrame
-    current_account, current_ticker, ticker_daily_price_df, exchange_rates_df = (
+    cross_rates: CrossRates
+    current_account, current_ticker, ticker_daily_price_df, cross_rates = (
         fetch_initial_dashboard_data()
     )
 
     # 获取所有图表所需的数据
     account_change_df = calculate_account_change()
-    earn_rate_df = calculate_ticker_daily_total_earn_rate()
-    daily_change_df = calculate_ticker_daily_change()
+    # 股票相关的图表都从同一份组合时间序列中切片
+    portfolio_df = calculate_portfolio_timeseries()
+    earn_rate_df = portfolio_series(portfolio_df, "TotalEarnRate")
+    daily_change_df = portfolio_series(portfolio_df, "Earn")
     current_currencies = get_current_currencies()
 
     # 2. 货币选择与数据转换阶段
@@ -117,8 +123,24 @@ def current_finance_summary() -> None:
     selected_currency_type = _get_currency_selection(all_currencies)
 
     # 根据用户选择的货币，转换账户和股票的财务数据
-    converted_account, converted_ticker = get_converted_financial_data(
-        current_account, current_ticker, selected_currency_type, exchange_rates_df
+    try:
+        converted_account, converted_ticker = get_converted_financial_data(
+            current_account, current_ticker, selected_currency_type, cross_rates
+        )
+    except ValueError as e:
+        streamlit.error(str(e))
+        streamlit.stop()
+
+    # 以美元计价的时间序列按每一天的汇率换算为选定的货币，收益率不需要换算
+    account_change_df = convert_history(
+        account_change_df, "Currency", selected_currency_type
+    )
+    ticker_daily_price_df = convert_history(
+        ticker_daily_price_df, "Price", selected_currency_type
+    )
+    daily_change_df = convert_history(daily_change_df, "Earn", selected_currency_type)
+    current_currencies = convert_current_currencies(
+        current_currencies, selected_currency_type
     )
 
     # 3. UI展示阶段
@@ -147,5 +169,6 @@ if __name__ == "__main__":
         layout="wide",  # 页面布局为宽屏
         initial_sidebar_state="collapsed",  # 初始侧边栏状态为折叠
     )
+    render_sync_status()
     # 运行主仪表盘函数
     current_finance_summary()
@@ -7,6 +7,7 @@ import pandas as pd
 import streamlit
 
 from db.entity import CurrencyType
+from pages.components.sync_status import render_sync_status
 from service.future_wealth_data import (
     calculate_initial_investment,
     fetch_and_filter_ticker_data,
@@ -120,5 +121,6 @@ if __name__ == "__main__":
         layout="wide",  # 页面布局为宽屏
         initial_sidebar_state="collapsed",  # 初始侧边栏状态为折叠
     )
+    render_sync_status()
     # 运行主预测函数
     future_wealth_prediction()
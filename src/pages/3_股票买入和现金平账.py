@@ -9,7 +9,9 @@ import streamlit as st
 from sqlalchemy.orm import Session
 
 import db
-from db.entity import Config, CurrencyType
+from db.entity import Config, CurrencyType, TickerSymbol
+from pages.components.sync_status import render_sync_status
+from service.symbol_search import suggest_ticker_symbols
 from service.transaction_management import (
     process_currency_adjustment,
     process_stock_purchase,
@@ -31,11 +33,34 @@ def _clear_cache_and_config() -> None:
     st.success("缓存和数据库配置已清空")
 
 
+def _format_ticker_symbol(symbol: TickerSymbol) -> str:
+    return f"{symbol.symbol}  {symbol.name or ''}"
+
+
+def _render_symbol_search() -> str:
+    """渲染股票搜索框，根据输入的代码或名称联想匹配的股票，返回选中的股票代码。"""
+    query = st.text_input(
+        "股票代码", placeholder="输入代码或名称搜索，例如 AAPL、00700、腾讯"
+    )
+    if not query.strip():
+        return ""
+
+    suggestions = suggest_ticker_symbols(query)
+    if not suggestions:
+        st.caption("没有找到匹配的股票，提交时会按输入的代码查询")
+        return query
+    selected = st.selectbox(
+        "匹配的股票", options=suggestions, format_func=_format_ticker_symbol
+    )
+    return selected.symbol
+
+
 def _render_stock_purchase_form() -> None:
     """渲染股票买入表单并处理提交。"""
+    st.subheader("买入股票")
+    # 搜索框放在表单之外，输入变化时才能立即刷新联想结果
+    symbol = _render_symbol_search()
     with st.form("买入股票"):
-        st.subheader("买入股票")
-        symbol = st.text_input("股票代码")
         trans_date = st.date_input("交易日期", datetime.date.today())
         shares = st.number_input("买入数量", min_value=0.0, step=1.0)
         price = st.number_input("买入价格", min_value=0.0)
@@ -87,5 +112,6 @@ if __name__ == "__main__":
         layout="centered",  # 页面布局为居中
         initial_sidebar_state="collapsed",  # 初始侧边栏状态为折叠
     )
+    render_sync_status()
     # 运行主函数
     main()
@@ -8,6 +8,7 @@ from datetime import date
 
 
 from pages.components.charts import create_historical_exchange_rate_chart
+from pages.components.sync_status import render_sync_status
 from service.exchange_rate_service import (
     convert_currency,
     fetch_historical_exchange_rates,
@@ -93,5 +94,6 @@ if __name__ == "__main__":
         layout="wide",  # 页面布局为宽屏
         initial_sidebar_state="collapsed",  # 初始侧边栏状态为折叠
     )
+    render_sync_status()
     # 运行主仪表盘函数
     exchange_rate_dashboard()
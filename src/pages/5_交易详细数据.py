@@ -7,6 +7,7 @@ import streamlit
 
 import pandas as pd
 
+from pages.components.sync_status import render_sync_status
 from service.transaction_details_service import (
     fetch_currency_transaction_details,
     fetch_ticker_transaction_details,
@@ -68,5 +69,6 @@ if __name__ == "__main__":
         layout="wide",  # 页面布局为宽屏
         initial_sidebar_state="collapsed",  # 初始侧边栏状态为折叠
     )
+    render_sync_status()
     # 运行主函数
     transaction_details()
@@ -3,8 +3,10 @@ from sqlalchemy.orm import Session
 
 from db import engine
 from db.entity import Config
+from pages.components.sync_status import render_sync_status
 
 st.set_page_config(page_title="设置", page_icon="⚙️")
+render_sync_status()
 
 st.title("⚙️ 设置")
 
@@ -3,8 +3,10 @@ from sqlalchemy.orm import Session
 import db
 from service.transaction_io_service import TransactionIOService
 from db.entity import Transaction
+from pages.components.sync_status import render_sync_status
 
 st.set_page_config(page_title="数据导入导出", layout="wide")
+render_sync_status()
 
 st.title("数据导入导出")
 
@@ -0,0 +1,75 @@
+"""
+This module contains the sync status badge shown at the top of each page.
+
+Pages keep rendering the last successfully synced data while the background sync
+is running, and rerun with fresh caches once the run finishes.
+"""
+
+import streamlit
+
+from db.migrate import ensure_schema
+from service.background_sync import (
+    SyncStatus,
+    get_sync_progress,
+    start_background_sync,
+)
+from service.sync import WAITING_FOR_LEASE
+
+# Seconds between two progress polls while a sync is running
+SYNC_STATUS_POLL_SECONDS = 2
+
+_GENERATION_KEY = "sync_generation"
+
+_STAGE_LABELS = {WAITING_FOR_LEASE: "等待其他会话的同步完成"}
+
+
+def render_sync_status() -> None:
+    """
+    Migrates the database, starts the background sync if needed and displays its
+    status. Every page calls this before touching the database.
+
+    While the sync is running, a "syncing…" badge with the current stages and
+    percentage is refreshed periodically. When the run finishes, the data caches
+    are cleared and the whole page reruns to pick up the new data.
+    """
+    ensure_schema()
+    start_background_sync()
+    progress = get_sync_progress()
+    streamlit.session_state.setdefault(_GENERATION_KEY, progress.generation)
+
+    if progress.status == SyncStatus.RUNNING:
+        _poll_sync_status()
+    else:
+        _display_sync_status()
+
+
+@streamlit.fragment(run_every=SYNC_STATUS_POLL_SECONDS)
+def _poll_sync_status() -> None:
+    _display_sync_status()
+
+
+def _display_sync_status() -> None:
+    progress = get_sync_progress()
+
+    if progress.generation != streamlit.session_state[_GENERATION_KEY]:
+        # A sync finished since this page was rendered, reload with the new data
+        streamlit.session_state[_GENERATION_KEY] = progress.generation
+        streamlit.cache_data.clear()
+        streamlit.rerun(scope="app")
+
+    if progress.status == SyncStatus.RUNNING:
+        stages = (
+            "、".join(_STAGE_LABELS.get(stage, stage) for stage in progress.stages)
+            or "准备中"
+        )
+        streamlit.badge(
+            f"数据同步中… {stages} {progress.percent}%",
+            icon=":material/sync:",
+            color="orange",
+        )
+    elif progress.status == SyncStatus.FAILED:
+        streamlit.badge(
+            f"数据同步失败，当前展示的是上一次同步的数据：{progress.error}",
+            icon=":material/error:",
+            color="red",
+        )
@@ -1,23 +1,20 @@
 import logging
+from datetime import date, timedelta
 from decimal import Decimal
 
-from sqlalchemy import desc
 from sqlalchemy.orm import Session
 
 import db
 from db.entity import CurrencyAsset, CurrencyType
+from service.holdings import get_currency_holding_as_of
 from service.transaction import buy_currency, sell_currency
 
 
 def adjust_currency(currency: float | str, currency_type: CurrencyType) -> None:
     """进行现金金额调整,完成平账操作"""
     with Session(db.engine) as session:
-        currency_asset = (
-            session.query(CurrencyAsset)
-            .filter(CurrencyAsset.currency_type == currency_type)
-            .order_by(desc(CurrencyAsset.date))
-            .limit(1)
-            .first()
+        currency_asset = get_currency_holding_as_of(
+            session, currency_type, date.today() - timedelta(1)
         )
 
         if currency_asset is None:
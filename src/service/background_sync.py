@@ -0,0 +1,127 @@
+"""
+在后台线程中执行数据同步。
+
+页面不再等待同步完成才渲染：启动同步后立即返回，页面继续展示数据库中
+上一次同步成功的数据，并通过 get_sync_progress 查询当前的阶段和进度。
+同一进程内同时只会有一个同步线程。同步完成后，同一个线程会继续刷新
+完整的股票列表（见 refresh_ticker_symbol_universe）。
+"""
+
+import logging
+import threading
+from datetime import datetime, timedelta
+from enum import Enum
+from typing import NamedTuple
+
+from service.sync import is_synced_today, refresh_ticker_symbol_universe, sync
+
+
+class SyncStatus(Enum):
+    IDLE = "idle"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+class SyncProgress(NamedTuple):
+    """同步进度的快照。"""
+
+    status: SyncStatus = SyncStatus.IDLE
+    # 正在执行的同步阶段
+    stages: tuple[str, ...] = ()
+    # 已完成阶段的百分比，0 ~ 100
+    percent: int = 0
+    started_at: datetime | None = None
+    finished_at: datetime | None = None
+    error: str | None = None
+    # 每次同步结束后加一，页面据此判断数据是否需要刷新
+    generation: int = 0
+
+
+# 同步失败后，至少间隔这么久才会再次启动
+RETRY_INTERVAL = timedelta(minutes=5)
+
+_lock = threading.Lock()
+_progress = SyncProgress()
+_thread: threading.Thread | None = None
+
+
+def start_background_sync() -> bool:
+    """
+    启动后台同步，如果同步正在执行、今天已经同步成功，或者刚刚失败过则什么也不做。
+
+    调用之前数据库应该已经由 db.migrate.ensure_schema 迁移到最新版本。
+
+    Returns:
+        bool: 是否启动了新的同步线程。
+    """
+    global _thread, _progress
+    with _lock:
+        if _thread is not None and _thread.is_alive():
+            return False
+        if (
+            _progress.status == SyncStatus.FAILED
+            and datetime.now() - _progress.finished_at < RETRY_INTERVAL
+        ):
+            return False
+        if is_synced_today():
+            return False
+
+        _progress = _progress._replace(
+            status=SyncStatus.RUNNING,
+            stages=(),
+            percent=0,
+            started_at=datetime.now(),
+            finished_at=None,
+            error=None,
+        )
+        _thread = threading.Thread(
+            target=_run_sync, name="background-sync", daemon=True
+        )
+        _thread.start()
+        return True
+
+
+def get_sync_progress() -> SyncProgress:
+    """返回当前同步进度的快照。"""
+    return _progress
+
+
+def _run_sync() -> None:
+    global _progress
+    try:
+        sync(on_progress=_update_progress)
+    except Exception as e:
+        logging.exception("错误: 后台同步失败")
+        with _lock:
+            _progress = _progress._replace(
+                status=SyncStatus.FAILED,
+                stages=(),
+                finished_at=datetime.now(),
+                error=str(e),
+                generation=_progress.generation + 1,
+            )
+        return
+
+    with _lock:
+        _progress = _progress._replace(
+            status=SyncStatus.SUCCEEDED,
+            stages=(),
+            percent=100,
+            finished_at=datetime.now(),
+            generation=_progress.generation + 1,
+        )
+
+    # 完整的股票列表只用于输入联想，放在同步完成之后刷新，不阻塞页面数据
+    try:
+        refresh_ticker_symbol_universe()
+    except Exception:
+        logging.exception("错误: 后台刷新股票列表失败")
+
+
+def _update_progress(running: list[str], finished: int, total: int) -> None:
+    global _progress
+    with _lock:
+        _progress = _progress._replace(
+            stages=tuple(running), percent=finished * 100 // max(total, 1)
+        )
@@ -1,15 +1,29 @@
 from datetime import date, timedelta
-from decimal import Decimal
 import streamlit
 
+import numpy as np
 import pandas as pd
 from pandas import DataFrame
 from sqlalchemy import asc
 from sqlalchemy.orm import Session
 
 import db
-from db.entity import Account, CurrencyType, ExchangedRate, StockAsset
-from service.ticker import get_ticker_close_price
+from db.entity import Account, CurrencyType, StockAsset
+from service.fx import convert, get_exchange_rate_matrix
+from service.holdings import get_holdings_between
+from service.ticker import get_ticker_close_prices
+
+# calculate_portfolio_timeseries 返回的列
+PORTFOLIO_COLUMNS = [
+    "Date",
+    "Ticker",
+    "Shares",
+    "Cost",
+    "CostBasis",
+    "Price",
+    "Earn",
+    "TotalEarnRate",
+]
 
 
 @streamlit.cache_data
@@ -25,151 +39,112 @@ def calculate_account_change() -> DataFrame:
 
 
 @streamlit.cache_data
-def calculate_ticker_daily_change() -> DataFrame:
+def calculate_portfolio_timeseries() -> DataFrame:
+    """
+    计算从第一次持有股票到昨天，每天每只持仓股票的时间序列。
+
+    持仓区间、收盘价矩阵和汇率矩阵各查询一次，对齐成 (日期 × 股票) 的数组后，
+    一次向量化计算出所有指标。看板上的图表按需要的列切片使用，见 portfolio_series。
+
+    Returns:
+        DataFrame: 按日期和股票代码排序的长表，列为:
+            - Date: 日期
+            - Ticker: 股票代码
+            - Shares: 持股数量
+            - Cost: 平均成本（股票计价货币）
+            - CostBasis: 持仓成本（美元）
+            - Price: 持仓市值（美元）
+            - Earn: 相对前一天的市值变化（美元），第一天为空
+            - TotalEarnRate: 相对平均成本的累计收益率（%），成本为 0 时为空
+    """
     with Session(db.engine) as session:
-        res = []
-
-        stocck_asset = session.query(StockAsset).order_by(asc(StockAsset.date)).first()
-        for each_date in pd.date_range(
-            start=stocck_asset.date + timedelta(1), end=date.today() - timedelta(1)
-        ):
-            res += [
-                (each_date, round(float(earn), 2), ticker)
-                for earn, ticker in calculate_each_day_ticker_change(each_date)
-            ]
-        df = pd.DataFrame(res, columns=["Date", "Earn", "Ticker"])
-        return df
+        first = session.query(StockAsset).order_by(asc(StockAsset.date)).first()
+        if first is None:
+            return pd.DataFrame(columns=PORTFOLIO_COLUMNS)
+        start, end = first.date, date.today() - timedelta(1)
+        holdings = [
+            holding
+            for holding in get_holdings_between(session, start, end)
+            if isinstance(holding, StockAsset)
+        ]
+        tickers = sorted({holding.ticker for holding in holdings})
+        prices, currency_types = get_ticker_close_prices(tickers, start, end, session)
+        rates = get_exchange_rate_matrix(start, end, session)
+
+    # 1. 对齐成 (日期 × 股票) 的数组，没有持仓或没有价格的位置为 NaN
+    dates = prices.index
+    columns = {ticker: i for i, ticker in enumerate(tickers)}
+    shares = np.full((len(dates), len(tickers)), np.nan)
+    cost = np.full_like(shares, np.nan)
+    for holding in holdings:
+        first_row = (max(holding.date, start) - start).days
+        end_row = (min(holding.end_date, end + timedelta(1)) - start).days
+        shares[first_row:end_row, columns[holding.ticker]] = float(holding.shares)
+        cost[first_row:end_row, columns[holding.ticker]] = float(holding.price)
+
+    price = prices.to_numpy(dtype=float)
+    currencies = [currency_types.get(ticker, CurrencyType.USD) for ticker in tickers]
+    day_column = dates.to_numpy()[:, np.newaxis]
+
+    # 2. 向量化计算所有指标
+    usd_price = convert(price, currencies, CurrencyType.USD, day_column, rates)
+    value = usd_price * shares
+    earn = np.full_like(value, np.nan)
+    earn[1:] = (usd_price[1:] - usd_price[:-1]) * shares[1:]
+    cost_basis = convert(cost, currencies, CurrencyType.USD, day_column, rates) * shares
+    with np.errstate(divide="ignore", invalid="ignore"):
+        earn_rate = np.where(cost != 0, (price - cost) * 100 / cost, np.nan)
+
+    # 3. 只保留有持仓且有市值的位置，展开为长表
+    rows, cols = np.nonzero(~np.isnan(value))
+    return pd.DataFrame(
+        {
+            "Date": dates[rows],
+            "Ticker": np.asarray(tickers, dtype=object)[cols],
+            "Shares": shares[rows, cols],
+            "Cost": cost[rows, cols],
+            "CostBasis": cost_basis[rows, cols],
+            "Price": value[rows, cols],
+            "Earn": earn[rows, cols],
+            "TotalEarnRate": earn_rate[rows, cols],
+        },
+        columns=PORTFOLIO_COLUMNS,
+    )
+
+
+def portfolio_series(portfolio: DataFrame, column: str) -> DataFrame:
+    """从组合时间序列中取出某一列，返回图表使用的 Date、<column>、Ticker 三列。"""
+    series = portfolio.dropna(subset=[column])
+    return pd.DataFrame(
+        {
+            "Date": series["Date"],
+            column: series[column].round(2),
+            "Ticker": series["Ticker"],
+        }
+    ).reset_index(drop=True)
 
 
-@streamlit.cache_data
 def calculate_ticker_daily_price() -> DataFrame:
-    with Session(db.engine) as session:
-        res = []
-
-        stocck_asset = session.query(StockAsset).order_by(asc(StockAsset.date)).first()
-        for each_date in pd.date_range(
-            start=stocck_asset.date, end=date.today() - timedelta(1)
-        ):
-            res += [
-                (each_date, round(float(price), 2), ticker)
-                for price, ticker in calculate_each_day_ticker_price(each_date)
-            ]
-        df = pd.DataFrame(res, columns=["Date", "Price", "Ticker"])
-        return df
-
-
-@streamlit.cache_data
-def calculate_ticker_daily_total_earn_rate() -> DataFrame:
-    with Session(db.engine) as session:
-        res = []
-
-        stocck_asset = session.query(StockAsset).order_by(asc(StockAsset.date)).first()
-        for each_date in pd.date_range(
-            start=stocck_asset.date, end=date.today() - timedelta(1)
-        ):
-            res += [
-                (each_date, round(float(price), 2), ticker)
-                for price, ticker in calculate_each_day_ticker_total_earn_rate(
-                    each_date
-                )
-            ]
-        df = pd.DataFrame(res, columns=["Date", "TotalEarnRate", "Ticker"])
-        return df
+    return portfolio_series(calculate_portfolio_timeseries(), "Price")
 
 
-@streamlit.cache_data
 def calculate_each_day_ticker_total_earn_rate(
     each_date: date,
-) -> list[tuple[Decimal, str]]:
-    with Session(db.engine) as session:
-        stock_assets = (
-            session.query(StockAsset).filter(StockAsset.date == each_date).all()
-        )
-        res = []
-
-        for stock in stock_assets:
-            current_date = get_ticker_close_price(each_date, stock.ticker)
+) -> list[tuple[float, str]]:
+    return _on_date(each_date, "TotalEarnRate")
 
-            res.append(
-                (
-                    (current_date.currency - stock.price) * 100 / stock.price,
-                    stock.ticker,
-                )
-            )
 
-        return res
+def calculate_each_day_ticker_price(each_date: date) -> list[tuple[float, str]]:
+    return _on_date(each_date, "Price")
 
 
-@streamlit.cache_data
-def calculate_each_day_ticker_price(each_date: date) -> list[tuple[Decimal, str]]:
-    with Session(db.engine) as session:
-        stock_assets = (
-            session.query(StockAsset).filter(StockAsset.date == each_date).all()
-        )
-        res = []
-
-        for stock in stock_assets:
-            current_date = get_ticker_close_price(each_date, stock.ticker)
+def calculate_each_day_ticker_change(each_date: date) -> list[tuple[float, str]]:
+    return _on_date(each_date, "Earn")
 
-            today_exchange_rate = Decimal(1)
-            if current_date.currency_type != CurrencyType.USD:
-                today_exchange_rate = (
-                    session.query(ExchangedRate)
-                    .filter(ExchangedRate.currency_type == current_date.currency_type)
-                    .filter(ExchangedRate.date == each_date)
-                    .first()
-                    .rate
-                )
-
-            res.append(
-                (
-                    (current_date.currency / today_exchange_rate) * stock.shares,
-                    stock.ticker,
-                )
-            )
-
-        return res
-
-
-@streamlit.cache_data
-def calculate_each_day_ticker_change(each_date: date) -> list[tuple[Decimal, str]]:
-    with Session(db.engine) as session:
-        stock_assets = (
-            session.query(StockAsset).filter(StockAsset.date == each_date).all()
-        )
-        res = []
 
-        for stock in stock_assets:
-            yesterday = get_ticker_close_price(each_date - timedelta(1), stock.ticker)
-            current_date = get_ticker_close_price(each_date, stock.ticker)
-
-            yesterday_exchange_rate = Decimal(1)
-            today_exchange_rate = Decimal(1)
-            if current_date.currency_type != CurrencyType.USD:
-                yesterday_exchange_rate = (
-                    session.query(ExchangedRate)
-                    .filter(ExchangedRate.currency_type == current_date.currency_type)
-                    .filter(ExchangedRate.date == each_date - timedelta(1))
-                    .first()
-                    .rate
-                )
-                today_exchange_rate = (
-                    session.query(ExchangedRate)
-                    .filter(ExchangedRate.currency_type == current_date.currency_type)
-                    .filter(ExchangedRate.date == each_date)
-                    .first()
-                    .rate
-                )
-
-            res.append(
-                (
-                    (
-                        current_date.currency / today_exchange_rate
-                        - yesterday.currency / yesterday_exchange_rate
-                    )
-                    * stock.shares,
-                    stock.ticker,
-                )
-            )
-
-        return res
+def _on_date(each_date: date, column: str) -> list[tuple[float, str]]:
+    portfolio = calculate_portfolio_timeseries()
+    rows = portfolio[portfolio["Date"] == pd.Timestamp(each_date)].dropna(
+        subset=[column]
+    )
+    return list(zip(rows[column], rows["Ticker"]))
@@ -0,0 +1,18 @@
+import pytest
+from sqlalchemy import create_engine
+
+import db
+from db.common import Base
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    """建好所有表的临时 SQLite 数据库，并替换 db.engine。
+
+    需要预置数据的测试模块可以定义同名的 fixture，接收这个 engine 写入数据后再返回。
+    """
+    engine = create_engine(f"sqlite:///{tmp_path / 'finance.db'}")
+    Base.metadata.create_all(engine)
+    monkeypatch.setattr(db, "engine", engine)
+    yield engine
+    engine.dispose()
@@ -4,33 +4,37 @@
 确保展示层与数据层分离。
 """
 
+from datetime import date, timedelta
 from typing import Tuple
 
 import pandas as pd
+import streamlit
 
 from adaptor.inbound.show_data import (
     get_current_account,
     get_current_ticker,
-    get_exchange_rate_details,
 )
 from db.entity import AccountData, CurrencyType, TickerData
 from pages.utils.common import convert_value
+from service.background_sync import get_sync_progress
 from service.calculate import calculate_ticker_daily_price
+from service.exchange_rate_service import get_cross_rates
+from service.fx import CrossRates, convert, get_exchange_rate_matrix
 
 
 def fetch_initial_dashboard_data() -> (
-    Tuple[AccountData, TickerData, pd.DataFrame, pd.DataFrame]
+    Tuple[AccountData, TickerData, pd.DataFrame, CrossRates]
 ):
     """
     获取当前财富看板所需的初始数据。
-    包括当前账户信息、当前股票信息、股票每日价格数据以及汇率详情。
+    包括当前账户信息、当前股票信息、股票每日价格数据以及最新的交叉汇率表。
 
     Returns:
-        Tuple[AccountData, TickerData, pd.DataFrame, pd.DataFrame]:
+        Tuple[AccountData, TickerData, pd.DataFrame, CrossRates]:
             - current_account: 当前账户的NamedTuple数据
             - current_ticker: 当前股票的NamedTuple数据
             - ticker_daily_price_df: 包含股票每日价格的DataFrame
-            - exchange_rates_df: 包含汇率详情的DataFrame
+            - cross_rates: 最新的交叉汇率表
     """
     # 获取当前账户的财务数据
     current_account_tuple = get_current_account()
@@ -38,8 +42,8 @@ def fetch_initial_dashboard_data() -> (
     current_ticker_tuple = get_current_ticker()
     # 计算并获取股票每日价格数据
     ticker_daily_price_df = calculate_ticker_daily_price()
-    # 获取所有货币的汇率详情
-    exchange_rates_df = get_exchange_rate_details()
+    # 获取最新的交叉汇率表，每个同步批次只构造一次
+    cross_rates = get_cross_rates(get_sync_progress().generation)
 
     # 将元组转换为NamedTuple
     current_account = AccountData(
@@ -55,13 +59,13 @@ def fetch_initial_dashboard_data() -> (
         update_time=current_ticker_tuple[3],
     )
 
-    return current_account, current_ticker, ticker_daily_price_df, exchange_rates_df
+    return current_account, current_ticker, ticker_daily_price_df, cross_rates
 
 
 def _convert_financial_data_tuple(
     data_tuple: AccountData | TickerData,
     selected_currency_type: CurrencyType,
-    exchange_rates_df: pd.DataFrame,
+    cross_rates: CrossRates,
     data_type: type[AccountData] | type[TickerData],
 ) -> AccountData | TickerData:
     """
@@ -71,13 +75,13 @@ def _convert_financial_data_tuple(
         float(data_tuple.total_value),  # Access by attribute
         data_tuple.currency_type,  # Access by attribute
         selected_currency_type,
-        exchange_rates_df,
+        cross_rates,
     )
     converted_yesterday_value = convert_value(
         float(data_tuple.yesterday_value),  # Access by attribute
         data_tuple.currency_type,  # Access by attribute
         selected_currency_type,
-        exchange_rates_df,
+        cross_rates,
     )
     return data_type(
         total_value=converted_value,
@@ -91,7 +95,7 @@ def get_converted_financial_data(
     current_account: AccountData,
     current_ticker: TickerData,
     selected_currency_type: CurrencyType,
-    exchange_rates_df: pd.DataFrame,
+    cross_rates: CrossRates,
 ) -> Tuple[AccountData, TickerData]:
     """
     根据选定的货币类型，转换账户和股票的财务数据。
@@ -100,21 +104,78 @@ def get_converted_financial_data(
         current_account (AccountData): 原始当前账户数据。
         current_ticker (TickerData): 原始当前股票数据。
         selected_currency_type (CurrencyType): 用户选择的目标货币类型。
-        exchange_rates_df (pd.DataFrame): 包含汇率详情的DataFrame。
+        cross_rates (CrossRates): 最新的交叉汇率表。
 
     Returns:
         Tuple[AccountData, TickerData]:
             - converted_account: 转换后的账户数据。
             - converted_ticker: 转换后的股票数据。
+
+    Raises:
+        ValueError: 缺少选定货币的汇率时抛出。
     """
     # 转换账户数据
     converted_account = _convert_financial_data_tuple(
-        current_account, selected_currency_type, exchange_rates_df, AccountData
+        current_account, selected_currency_type, cross_rates, AccountData
     )
 
     # 转换股票数据
     converted_ticker = _convert_financial_data_tuple(
-        current_ticker, selected_currency_type, exchange_rates_df, TickerData
+        current_ticker, selected_currency_type, cross_rates, TickerData
     )
 
     return converted_account, converted_ticker
+
+
+@streamlit.cache_data
+def _get_history_exchange_rates(start: date, end: date) -> pd.DataFrame:
+    """缓存 [start, end] 内的汇率矩阵，同步完成后随 cache_data 一起清空。"""
+    return get_exchange_rate_matrix(start, end)
+
+
+def convert_history(
+    df: pd.DataFrame, column: str, selected_currency_type: CurrencyType
+) -> pd.DataFrame:
+    """
+    把以美元计价的时间序列换算为选定的货币。
+
+    每一行按自己所在日期的汇率换算，整列一次完成，原来的 DataFrame 不会被修改。
+
+    Args:
+        df (pd.DataFrame): 包含 Date 列和金额列的时间序列。
+        column (str): 需要换算的金额列。
+        selected_currency_type (CurrencyType): 用户选择的目标货币类型。
+
+    Returns:
+        pd.DataFrame: 金额列换算后的副本，保留两位小数。
+    """
+    if selected_currency_type == CurrencyType.USD or df.empty:
+        return df
+    dates = pd.to_datetime(df["Date"])
+    rates = _get_history_exchange_rates(dates.min().date(), dates.max().date())
+    converted = df.copy()
+    converted[column] = convert(
+        df[column], CurrencyType.USD, selected_currency_type, dates, rates
+    ).round(2)
+    return converted
+
+
+def convert_current_currencies(
+    current_currencies: list[tuple[str, float]],
+    selected_currency_type: CurrencyType,
+) -> list[tuple[str, float]]:
+    """按昨天的汇率把以美元计价的现金资产换算为选定的货币。"""
+    if selected_currency_type == CurrencyType.USD or not current_currencies:
+        return current_currencies
+    yesterday = date.today() - timedelta(1)
+    values = convert(
+        [value for _, value in current_currencies],
+        CurrencyType.USD,
+        selected_currency_type,
+        yesterday,
+        _get_history_exchange_rates(yesterday, yesterday),
+    )
+    return [
+        (name, round(float(value), 2))
+        for (name, _), value in zip(current_currencies, values)
+    ]
@@ -7,6 +7,7 @@
 from datetime import date
 
 import pandas as pd
+import streamlit
 
 from sqlalchemy import desc
 from sqlalchemy.orm import Session
@@ -14,6 +15,7 @@ from sqlalchemy.orm import Session
 import db
 from adaptor.inbound.show_data import get_exchange_rate_details
 from db.entity import ExchangedRate
+from service.fx import CrossRates, get_latest_cross_rates
 
 
 def fetch_latest_exchange_rates() -> tuple[date, dict[str, float]]:
@@ -45,6 +47,20 @@ def fetch_latest_exchange_rates() -> tuple[date, dict[str, float]]:
         return current_date, exchange_rates
 
 
+@streamlit.cache_resource(max_entries=1)
+def get_cross_rates(sync_generation: int) -> CrossRates:
+    """
+    获取最新汇率的交叉汇率表，同一个同步批次内只构造一次。
+
+    Args:
+        sync_generation (int): 后台同步的批次号，同步完成后批次号变化，表会重新构造。
+
+    Returns:
+        CrossRates: 所有货币两两之间的最新汇率。
+    """
+    return get_latest_cross_rates()
+
+
 def fetch_historical_exchange_rates() -> pd.DataFrame:
     """
     获取历史汇率变化数据。
@@ -0,0 +1,197 @@
+"""
+按日期对齐的汇率矩阵和向量化的货币换算。
+
+汇率表中每天每种货币保存一条 1 美元可以兑换的数额，周末、节假日或同步失败的
+日期可能缺失。get_exchange_rate_matrix 一次查询出 (日期 × 货币) 的矩阵并按
+as-of 规则补齐缺失的日期，convert 在矩阵上按下标批量取出汇率，整列金额一次
+完成换算，不再逐行查询汇率。只需要最新汇率时使用 CrossRates 交叉汇率表。
+"""
+
+import datetime
+from collections.abc import Iterable, Mapping
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session, aliased
+
+import db
+from db.entity import CurrencyType, ExchangedRate
+
+
+def get_exchange_rate_matrix(
+    start: datetime.date,
+    end: datetime.date,
+    session: Session | None = None,
+) -> pd.DataFrame:
+    """
+    获取 [start, end] 内每一天、每种货币兑美元的汇率矩阵。
+
+    只执行一次查询，取出每种货币在 start 当天或之前最近的一条汇率以及区间内的
+    所有汇率，缺失的日期使用之前最近一天的汇率。
+
+    Args:
+        start: 开始日期（包含）。
+        end: 结束日期（包含）。
+        session: 复用调用方的 Session，为 None 时新建一个。
+
+    Returns:
+        pd.DataFrame: 行是日期（索引名为 date），列是 CurrencyType，值为 1 美元可以
+            兑换的 Decimal 数额，美元一列恒为 1，还没有汇率的位置为 NaN。
+    """
+    dates = pd.date_range(start, end, name="date")
+    previous = aliased(ExchangedRate)
+    as_of_start = (
+        select(func.max(previous.date))
+        .where(
+            previous.currency_type == ExchangedRate.currency_type,
+            previous.date <= start,
+        )
+        .scalar_subquery()
+    )
+    sql = select(
+        ExchangedRate.date, ExchangedRate.currency_type, ExchangedRate.rate
+    ).where(
+        ExchangedRate.date <= end,
+        ExchangedRate.date >= func.coalesce(as_of_start, start),
+    )
+    if session is None:
+        with Session(db.engine) as session:
+            rows = session.execute(sql).all()
+    else:
+        rows = session.execute(sql).all()
+
+    rates = pd.DataFrame(rows, columns=["date", "currency_type", "rate"])
+    rates["date"] = pd.to_datetime(rates["date"])
+    wide = rates.drop_duplicates(["date", "currency_type"], keep="last").pivot(
+        index="date", columns="currency_type", values="rate"
+    )
+    matrix = (
+        wide.reindex(wide.index.union(dates))
+        .ffill()
+        .reindex(index=dates, columns=list(CurrencyType))
+    )
+    matrix.columns.name = "currency_type"
+    matrix[CurrencyType.USD] = Decimal(1)
+    return matrix
+
+
+def lookup_rates(
+    rates: pd.DataFrame,
+    dates: Iterable | np.ndarray,
+    currencies: CurrencyType | Iterable[CurrencyType] | np.ndarray,
+) -> np.ndarray:
+    """
+    从汇率矩阵中批量取出汇率。
+
+    dates 和 currencies 按 numpy 的规则广播，例如传入形状为 (n, 1) 的日期和长度为
+    m 的货币，得到 (n, m) 的汇率数组。矩阵中没有的日期或货币得到 NaN。
+    """
+    dates = np.asarray(dates)
+    currencies = np.asarray(currencies, dtype=object)
+    # 在矩阵末尾补一行一列 NaN，get_indexer 找不到时返回的 -1 正好指向它们
+    values = np.full((len(rates.index) + 1, len(rates.columns) + 1), np.nan)
+    values[:-1, :-1] = rates.to_numpy(dtype=float)
+    rows = rates.index.get_indexer(pd.DatetimeIndex(dates.ravel()))
+    columns = rates.columns.get_indexer(currencies.ravel())
+    return values[rows.reshape(dates.shape), columns.reshape(currencies.shape)]
+
+
+def convert(
+    values: Iterable | np.ndarray,
+    from_currency: CurrencyType | Iterable[CurrencyType] | np.ndarray,
+    to_currency: CurrencyType | Iterable[CurrencyType] | np.ndarray,
+    dates: Iterable | np.ndarray,
+    rates: pd.DataFrame | None = None,
+) -> np.ndarray:
+    """
+    按每个金额所在日期的汇率，把金额从 from_currency 换算成 to_currency。
+
+    values、from_currency、to_currency 和 dates 按 numpy 的规则广播，货币既可以是
+    单个 CurrencyType，也可以是与金额一一对应的数组。
+
+    Args:
+        values: 金额。
+        from_currency: 金额原来的货币。
+        to_currency: 换算后的货币。
+        dates: 金额所在的日期。
+        rates: get_exchange_rate_matrix 返回的汇率矩阵，为 None 时按 dates 的范围查询。
+
+    Returns:
+        np.ndarray: 换算后的 float 金额，找不到汇率的位置为 NaN。
+    """
+    values = np.asarray(values, dtype=float)
+    dates = pd.DatetimeIndex(np.ravel(dates)).to_numpy().reshape(np.shape(dates))
+    if rates is None:
+        if dates.size == 0:
+            return values.copy()
+        rates = get_exchange_rate_matrix(
+            pd.Timestamp(dates.min()).date(), pd.Timestamp(dates.max()).date()
+        )
+    from_rates = lookup_rates(rates, dates, from_currency)
+    to_rates = lookup_rates(rates, dates, to_currency)
+    return values / from_rates * to_rates
+
+
+class CrossRates:
+    """
+    最新汇率的交叉汇率表。
+
+    由每种货币最新的美元汇率一次算出 N × N 的矩阵，matrix[i, j] 为 1 单位第 i 种
+    货币可以兑换的第 j 种货币，之后每次换算只是一次下标查找。
+    """
+
+    def __init__(self, usd_rates: Mapping[CurrencyType, Decimal | float]):
+        """
+        Args:
+            usd_rates: 每种货币 1 美元可以兑换的数额，美元本身可以省略。
+        """
+        self.currencies = list(CurrencyType)
+        self._positions = {currency: i for i, currency in enumerate(self.currencies)}
+        rates = np.array(
+            [
+                1.0 if currency == CurrencyType.USD else usd_rates.get(currency, np.nan)
+                for currency in self.currencies
+            ],
+            dtype=float,
+        )
+        rates[rates == 0] = np.nan
+        self.matrix = rates[np.newaxis, :] / rates[:, np.newaxis]
+
+    def rate(self, from_currency: CurrencyType, to_currency: CurrencyType) -> float:
+        """返回 1 单位 from_currency 可以兑换的 to_currency，没有汇率时抛出 ValueError。"""
+        rate = self.matrix[self._positions[from_currency], self._positions[to_currency]]
+        if np.isnan(rate):
+            raise ValueError(
+                f"缺少 {from_currency.value} 到 {to_currency.value} 的汇率，无法换算。"
+            )
+        return float(rate)
+
+    def convert(
+        self, value: float, from_currency: CurrencyType, to_currency: CurrencyType
+    ) -> float:
+        """把金额从 from_currency 换算成 to_currency，没有汇率时抛出 ValueError。"""
+        if from_currency == to_currency:
+            return value
+        return value * self.rate(from_currency, to_currency)
+
+
+def get_latest_cross_rates(session: Session | None = None) -> CrossRates:
+    """用每种货币最近一天的汇率构造交叉汇率表，只执行一次查询。"""
+    latest = (
+        select(ExchangedRate.currency_type, func.max(ExchangedRate.date).label("date"))
+        .group_by(ExchangedRate.currency_type)
+        .subquery()
+    )
+    sql = select(ExchangedRate.currency_type, ExchangedRate.rate).join(
+        latest,
+        (ExchangedRate.currency_type == latest.c.currency_type)
+        & (ExchangedRate.date == latest.c.date),
+    )
+    if session is None:
+        with Session(db.engine) as session:
+            rows = session.execute(sql).all()
+    else:
+        rows = session.execute(sql).all()
+    return CrossRates(dict(rows))
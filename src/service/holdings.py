@@ -0,0 +1,130 @@
+"""
+持仓区间的查询和构造。
+
+资产表只在持仓发生变化的日期写入一条记录，记录在 [date, end_date) 内有效，
+持仓归零时结束当前区间而不写入新的记录。同一只股票（或同一种货币）的区间互不
+重叠，按 (股票代码, end_date) 建立索引后，结束日期大于查询日期的第一个区间就是
+唯一的候选，某一天的持仓只需要一次 O(log n) 的索引查找。
+"""
+
+from collections.abc import Iterable, Iterator
+from datetime import date
+from decimal import Decimal
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from db.entity import (
+    OPEN_END_DATE,
+    Asset,
+    CurrencyAsset,
+    CurrencyType,
+    StockAsset,
+)
+
+# 持仓区间的值，None 表示没有持仓
+HoldingValues = tuple[Decimal, ...] | None
+
+
+def get_stock_holding_as_of(
+    session: Session, ticker: str, day: date
+) -> StockAsset | None:
+    """返回某只股票在指定日期的持仓，没有持仓时返回 None。"""
+    holding = session.scalars(
+        select(StockAsset)
+        .where(StockAsset.ticker == ticker, StockAsset.end_date > day)
+        .order_by(StockAsset.end_date)
+        .limit(1)
+    ).first()
+    return holding if holding is not None and holding.date <= day else None
+
+
+def get_currency_holding_as_of(
+    session: Session, currency_type: CurrencyType, day: date
+) -> CurrencyAsset | None:
+    """返回某种货币在指定日期的现金持仓，没有持仓时返回 None。"""
+    holding = session.scalars(
+        select(CurrencyAsset)
+        .where(
+            CurrencyAsset.currency_type == currency_type,
+            CurrencyAsset.end_date > day,
+        )
+        .order_by(CurrencyAsset.end_date)
+        .limit(1)
+    ).first()
+    return holding if holding is not None and holding.date <= day else None
+
+
+def get_holdings_as_of(
+    session: Session, day: date, model: type[Asset] = Asset
+) -> list[Asset]:
+    """返回指定日期有效的所有持仓区间，model 可以是 StockAsset 或 CurrencyAsset。"""
+    return list(
+        session.scalars(
+            select(model).where(model.end_date > day, model.date <= day)
+        ).all()
+    )
+
+
+def get_holdings_between(session: Session, start: date, end: date) -> list[Asset]:
+    """返回与 [start, end] 有交集的所有持仓区间，按开始日期排序。"""
+    return list(
+        session.scalars(
+            select(Asset)
+            .where(Asset.end_date > start, Asset.date <= end)
+            .order_by(Asset.date, Asset.id)
+        ).all()
+    )
+
+
+def iter_daily_holdings(
+    holdings: Iterable[Asset], start: date, end: date
+) -> Iterator[tuple[date, list[Asset]]]:
+    """
+    把持仓区间展开为 [start, end] 内每一天的持仓列表。
+
+    Args:
+        holdings: 按开始日期排序的持仓区间，例如 get_holdings_between 的结果。
+    """
+    pending = iter(holdings)
+    upcoming = next(pending, None)
+    active: list[Asset] = []
+    day = start
+    while day <= end:
+        while upcoming is not None and upcoming.date <= day:
+            active.append(upcoming)
+            upcoming = next(pending, None)
+        active = [holding for holding in active if holding.end_date > day]
+        yield day, active
+        day = date.fromordinal(day.toordinal() + 1)
+
+
+def split_into_intervals(
+    seed: HoldingValues,
+    changes: Iterable[tuple[date, HoldingValues]],
+) -> tuple[date, list[tuple[date, date, tuple[Decimal, ...]]]]:
+    """
+    把按日期排序的持仓变化转换为持仓区间。
+
+    Args:
+        seed: 第一次变化之前的持仓，已经保存在数据库中。
+        changes: (日期, 当天结束时的持仓)，值与前一天相同的日期会被忽略。
+
+    Returns:
+        tuple: seed 所在区间新的结束日期，以及需要新增的 (开始日期, 结束日期, 持仓) 区间，
+            最后一个区间仍然有效时结束日期为 OPEN_END_DATE。
+    """
+    seed_end = OPEN_END_DATE
+    intervals: list[tuple[date, date, tuple[Decimal, ...]]] = []
+    current, current_start = seed, None
+    for day, values in changes:
+        if values == current:
+            continue
+        if current_start is not None:
+            intervals.append((current_start, day, current))
+        elif current is not None:
+            seed_end = day
+        current, current_start = values, (day if values is not None else None)
+    if current_start is not None:
+        intervals.append((current_start, OPEN_END_DATE, current))
+    return seed_end, intervals
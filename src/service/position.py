@@ -0,0 +1,80 @@
+"""
+持仓与平均成本计算引擎。
+
+只在稀疏的交易日上使用累计数组运算计算持股数量和加权平均成本，
+再由 holdings.split_into_intervals 合并为持仓区间，避免对每一个自然日逐行迭代。
+
+精度约定:
+- 所有数值都以 Decimal 对象数组参与运算，使用默认的 Decimal 上下文
+  （28 位有效数字），全程不经过 float 转换。
+- 持股数量和总成本只涉及加法和乘法，在 28 位有效数字以内是精确的。
+- 平均成本在每个交易日由 "总成本 / 持股数量" 计算一次，这是唯一发生舍入的地方。
+  原先逐日迭代的实现每次都用上一次舍入后的平均成本乘回总成本，
+  因此两者最多只在第 28 位有效数字上存在差异。
+- 平均成本写入数据库时保留 10 位小数（PRICE_SCALE），增量同步以舍入后的
+  平均成本作为初始持仓继续计算，与全量重算的结果最多在第 10 位小数上相差 1。
+- 持仓归零时总成本和平均成本同时归零；同一天买卖相抵（净变动为 0）时
+  持仓和成本保持不变，与原实现一致。
+"""
+
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+
+
+def compute_position_changes(
+    trades: pd.DataFrame,
+    seed_shares: Decimal = Decimal(0),
+    seed_price: Decimal = Decimal(0),
+) -> pd.DataFrame:
+    """
+    计算单只股票在每个交易日结束时的持股数量和平均成本。
+
+    Args:
+        trades: 单只股票的交易记录，包含 date、shares（买入为正，卖出为负）和 price 列，
+            shares 和 price 为 Decimal。
+        seed_shares: 第一笔交易之前的持股数量。
+        seed_price: 第一笔交易之前的平均成本。
+
+    Returns:
+        pd.DataFrame: 以交易日期为索引，包含 shares 和 price（平均成本）列。
+    """
+    if trades.empty:
+        return pd.DataFrame(
+            columns=["shares", "price"], index=pd.DatetimeIndex([], name="date")
+        )
+
+    trades = trades.sort_values("date", kind="stable")
+    dates, starts = np.unique(trades["date"].to_numpy(), return_index=True)
+    shares = trades["shares"].to_numpy(dtype=object)
+    notional = shares * trades["price"].to_numpy(dtype=object)
+
+    # 1. 聚合同一天的多次交易，当天净变动为 0 时不影响成本
+    net_shares = np.add.reduceat(shares, starts)
+    net_cost = np.where(
+        net_shares != 0, np.add.reduceat(notional, starts), Decimal(0)
+    ).astype(object)
+
+    # 2. 累计持股数量和总成本
+    total_shares = seed_shares + np.cumsum(net_shares)
+    cumulative_cost = seed_shares * seed_price + np.cumsum(net_cost)
+
+    # 3. 持仓归零时总成本清零: 减去最近一次归零时的累计成本
+    closed = total_shares == 0
+    reset_base = (
+        pd.Series(np.where(closed, cumulative_cost, None), dtype=object)
+        .ffill()
+        .fillna(Decimal(0))
+        .to_numpy()
+    )
+    total_cost = cumulative_cost - reset_base
+
+    # 4. 平均成本 = 总成本 / 持股数量，持仓归零时成本归零
+    divisor = np.where(closed, Decimal(1), total_shares).astype(object)
+    avg_price = np.where(closed, Decimal(0), total_cost / divisor).astype(object)
+
+    return pd.DataFrame(
+        {"shares": total_shares, "price": avg_price},
+        index=pd.DatetimeIndex(dates, name="date"),
+    )
@@ -0,0 +1,95 @@
+"""
+内存中的股票代码解析器。
+
+akshare 返回的美股代码带有交易所前缀（例如 105.AAPL），港股代码带有前导零
+（例如 00700），用户输入和交易记录中保存的通常是去掉前缀的代码。原先每次查询
+都执行一次 LIKE '%x' 的全表扫描，这里把 TickerSymbol 表一次性加载到内存，
+建立三个索引：
+
+1. 完整代码的哈希索引，O(1)；
+2. 去掉交易所前缀后的代码的哈希索引，O(1)；
+3. 按反转后的代码排序的列表，后缀匹配可以用二分查找定位，O(log n)。
+
+匹配规则与 LIKE '%x' 相同（不区分大小写的后缀匹配），多个候选时优先完整匹配，
+其次是前缀之后的代码匹配，最后才是任意后缀匹配，同一优先级取 id 最小的一条。
+股票代码重新同步后需要调用 invalidate_symbol_resolver 使缓存失效。
+"""
+
+import bisect
+import threading
+from collections.abc import Iterable
+
+from sqlalchemy.orm import Session
+
+import db
+from db.entity import TickerSymbol
+
+
+class SymbolResolver:
+    """基于内存索引的 TickerSymbol 查询。"""
+
+    def __init__(self, symbols: Iterable[TickerSymbol]) -> None:
+        self._by_symbol: dict[str, TickerSymbol] = {}
+        self._by_code: dict[str, TickerSymbol] = {}
+        reversed_symbols: list[tuple[str, int, TickerSymbol]] = []
+
+        for symbol in sorted(symbols, key=lambda s: s.id or 0):
+            key = symbol.symbol.upper()
+            # 按 id 从小到大遍历，setdefault 保证同一个键保留 id 最小的一条
+            self._by_symbol.setdefault(key, symbol)
+            _, dot, code = key.rpartition(".")
+            if dot:
+                self._by_code.setdefault(code, symbol)
+            reversed_symbols.append((key[::-1], symbol.id or 0, symbol))
+
+        reversed_symbols.sort(key=lambda item: item[0])
+        self._reversed_keys = [item[0] for item in reversed_symbols]
+        self._reversed_entries = [(item[1], item[2]) for item in reversed_symbols]
+
+    def __len__(self) -> int:
+        return len(self._reversed_keys)
+
+    def resolve(self, query: str) -> TickerSymbol | None:
+        """根据用户输入的股票代码查询对应的 TickerSymbol。"""
+        key = query.strip().upper()
+        if not key:
+            return None
+
+        symbol = self._by_symbol.get(key) or self._by_code.get(key)
+        if symbol is not None:
+            return symbol
+
+        # 以 key 结尾的代码反转后以 key[::-1] 开头，在排序列表中是连续的一段
+        prefix = key[::-1]
+        start = bisect.bisect_left(self._reversed_keys, prefix)
+        end = bisect.bisect_right(self._reversed_keys, prefix + "\uffff", lo=start)
+        if start == end:
+            return None
+        return min(self._reversed_entries[start:end], key=lambda entry: entry[0])[1]
+
+
+_lock = threading.Lock()
+_resolver: SymbolResolver | None = None
+
+
+def get_symbol_resolver() -> SymbolResolver:
+    """返回缓存的解析器，第一次调用时从数据库加载所有股票代码。
+
+    股票代码还没有同步时不缓存空的解析器，避免其他进程完成同步后仍然查不到。
+    """
+    global _resolver
+    with _lock:
+        if _resolver is not None:
+            return _resolver
+        with Session(db.engine) as session:
+            resolver = SymbolResolver(session.query(TickerSymbol).all())
+        if len(resolver):
+            _resolver = resolver
+        return resolver
+
+
+def invalidate_symbol_resolver() -> None:
+    """股票代码重新同步后调用，下一次查询时重新加载。"""
+    global _resolver
+    with _lock:
+        _resolver = None
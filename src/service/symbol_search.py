@@ -0,0 +1,145 @@
+"""
+股票代码和名称的输入联想。
+
+把 TickerSymbol 表加载到内存，建立两类索引：
+
+1. 前缀索引：代码、去掉交易所前缀的代码和名称按字典序排序，前缀匹配的结果
+   在排序列表中是连续的一段，二分查找定位后直接取前 k 个；
+2. 二元组（bigram）倒排索引：代码和名称中每两个相邻字符对应一个股票 id 列表，
+   查询时求所有二元组列表的交集，再校验子串，用于匹配名称中间的字符，
+   例如用“控股”找到“腾讯控股”。
+
+结果按 完全匹配 > 前缀匹配 > 子串匹配 的顺序排列，每次查询只需要对数级的
+查找加上 k 个结果的构造。股票代码重新同步后需要调用 invalidate_symbol_search_index。
+"""
+
+import bisect
+import threading
+from collections import defaultdict
+from collections.abc import Iterable
+
+from sqlalchemy.orm import Session
+
+import db
+from db.entity import TickerSymbol
+
+# 每次联想返回的最大结果数
+DEFAULT_SUGGESTION_LIMIT = 10
+
+_NGRAM = 2
+
+
+class SymbolSearchIndex:
+    """基于前缀索引和二元组倒排索引的股票联想。"""
+
+    def __init__(self, symbols: Iterable[TickerSymbol]) -> None:
+        self._symbols = sorted(symbols, key=lambda s: s.id or 0)
+        self._exact: dict[str, list[int]] = defaultdict(list)
+        prefix_entries: list[tuple[str, int]] = []
+        postings: dict[str, list[int]] = defaultdict(list)
+        self._texts: list[str] = []
+
+        for doc, symbol in enumerate(self._symbols):
+            code = symbol.symbol.upper()
+            short_code = code.rpartition(".")[2]
+            name = (symbol.name or "").upper()
+
+            for key in {code, short_code}:
+                self._exact[key].append(doc)
+            for key in {code, short_code, name}:
+                if key:
+                    prefix_entries.append((key, doc))
+
+            # 代码和名称之间用不会出现在查询中的字符分隔，避免跨字段的子串匹配
+            text = f"{code}\n{name}"
+            self._texts.append(text)
+            for gram in {text[i : i + _NGRAM] for i in range(len(text) - _NGRAM + 1)}:
+                postings[gram].append(doc)
+
+        prefix_entries.sort()
+        self._prefix_keys = [key for key, _ in prefix_entries]
+        self._prefix_docs = [doc for _, doc in prefix_entries]
+        self._postings = {gram: set(docs) for gram, docs in postings.items()}
+
+    def __len__(self) -> int:
+        return len(self._symbols)
+
+    def search(
+        self, query: str, limit: int = DEFAULT_SUGGESTION_LIMIT
+    ) -> list[TickerSymbol]:
+        """返回与输入最匹配的前 limit 个股票。"""
+        key = query.strip().upper()
+        if not key or limit <= 0:
+            return []
+
+        results: dict[int, None] = {}
+
+        # 1. 代码完全匹配
+        for doc in self._exact.get(key, ()):
+            results.setdefault(doc)
+
+        # 2. 代码或名称前缀匹配
+        if len(results) < limit:
+            start = bisect.bisect_left(self._prefix_keys, key)
+            for i in range(start, len(self._prefix_keys)):
+                if not self._prefix_keys[i].startswith(key):
+                    break
+                results.setdefault(self._prefix_docs[i])
+                if len(results) >= limit:
+                    break
+
+        # 3. 代码或名称中间的子串匹配
+        if len(results) < limit and len(key) >= _NGRAM:
+            for doc in self._substring_candidates(key):
+                if doc not in results and key in self._texts[doc]:
+                    results[doc] = None
+                    if len(results) >= limit:
+                        break
+
+        return [self._symbols[doc] for doc in list(results)[:limit]]
+
+    def _substring_candidates(self, key: str) -> list[int]:
+        grams = {key[i : i + _NGRAM] for i in range(len(key) - _NGRAM + 1)}
+        lists = []
+        for gram in grams:
+            docs = self._postings.get(gram)
+            if not docs:
+                return []
+            lists.append(docs)
+        lists.sort(key=len)
+        candidates = lists[0].intersection(*lists[1:])
+        return sorted(candidates)
+
+
+_lock = threading.Lock()
+_index: SymbolSearchIndex | None = None
+
+
+def get_symbol_search_index() -> SymbolSearchIndex:
+    """返回缓存的联想索引，第一次调用时从数据库加载所有股票代码。
+
+    股票代码还没有同步时不缓存空的索引，避免其他进程完成同步后仍然查不到。
+    """
+    global _index
+    with _lock:
+        if _index is not None:
+            return _index
+        with Session(db.engine) as session:
+            index = SymbolSearchIndex(session.query(TickerSymbol).all())
+        if len(index):
+            _index = index
+        return index
+
+
+def invalidate_symbol_search_index() -> None:
+    """股票代码重新同步后调用，下一次查询时重新构建。"""
+    global _index
+    with _lock:
+        _index = None
+
+
+def suggest_ticker_symbols(
+    query: str, limit: int = DEFAULT_SUGGESTION_LIMIT
+) -> list[TickerSymbol]:
+    """根据输入的代码或名称片段，返回最匹配的股票。"""
+    return get_symbol_search_index().search(query, limit)
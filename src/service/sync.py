@@ -2,31 +2,54 @@
 
 
 import datetime
+import enum
+import hashlib
+import json
 import logging
-from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+from collections.abc import Callable, Iterator, Sequence
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Executor,
+    Future,
+    ThreadPoolExecutor,
+    wait,
+)
 from datetime import date, timedelta
 from decimal import Decimal
+from functools import partial
+from typing import NamedTuple, TypeVar
 
 import pandas as pd
-from sqlalchemy import asc, func, select
+from sqlalchemy import asc, bindparam, delete, func, select, update
 from sqlalchemy.orm import Session
 
 import db
 from adaptor.outbound import currency
 from adaptor.outbound.ticker import (
+    find_hk_symbol,
+    find_us_symbol,
     get_all_hk_symbols,
     get_all_us_symbols,
     get_hk_ticker_history,
     get_us_ticker_history,
 )
 from db import engine
+from db.bulk import bulk_insert
+from db.common import Base, quantize_fixed_point
 from db.entity import (
+    AMOUNT_SCALE,
+    PRICE_SCALE,
+    SHARES_SCALE,
     Account,
     Asset,
+    AssetType,
     Config,
     CurrencyAsset,
     CurrencyTransaction,
     CurrencyType,
+    DirtyDate,
     ExchangedRate,
     StockAsset,
     StockTransaction,
@@ -36,23 +59,91 @@ from db.entity import (
     Transaction,
     TransactionType,
 )
+from service.fx import get_exchange_rate_matrix
+from service.holdings import (
+    HoldingValues,
+    get_holdings_as_of,
+    get_holdings_between,
+    iter_daily_holdings,
+    split_into_intervals,
+)
+from service.position import compute_position_changes
+from service.symbol_resolver import get_symbol_resolver, invalidate_symbol_resolver
+from service.symbol_search import invalidate_symbol_search_index
+from service.sync_lease import SyncLease, wait_for_sync_lease
 from utils.timing import timing_decorator
 
 LAST_SYNC_DATE = "last_sync_date"
 
+# 记录每只股票上一次全量回填价格时使用的起始日期
+TICKER_BACKFILL_STARTS = "ticker_backfill_starts"
+
+# 股票代码列表上次刷新的哈希和时间，按股票类型分别记录，例如 ticker_symbol_refresh_state_usd
+TICKER_SYMBOL_REFRESH_STATE = "ticker_symbol_refresh_state"
+# 股票代码列表的刷新间隔（天），可以在 Config 表中修改
+TICKER_SYMBOL_REFRESH_DAYS = "ticker_symbol_refresh_days"
+DEFAULT_TICKER_SYMBOL_REFRESH_DAYS = 7
+# 设置为 off 时不在后台刷新完整的股票列表，只按需定向查询持仓和输入的代码
+TICKER_SYMBOL_UNIVERSE_REFRESH = "ticker_symbol_universe_refresh"
+# 获取到的列表少于已有代码数量的这个比例时，认为接口返回不完整，不处理退市
+MIN_TICKER_SYMBOL_LIST_RATIO = 0.5
+
+# 记录资产快照和账户价值上一次重建的开始时间，用于计算增量重建的水位线
+ASSET_SNAPSHOT_MARK = "asset_snapshot_mark"
+ACCOUNT_SNAPSHOT_MARK = "account_snapshot_mark"
+
+# 源数据表的 dirty_date 记录由哪些重建的水位线使用，全部处理过之后才能删除
+_DIRTY_DATE_CONSUMERS = {
+    Transaction: (ASSET_SNAPSHOT_MARK, ACCOUNT_SNAPSHOT_MARK),
+    TickerInfo: (ACCOUNT_SNAPSHOT_MARK,),
+    ExchangedRate: (ACCOUNT_SNAPSHOT_MARK,),
+}
+
+# 账户价值按自然日还是按交易日计算，取值为 ValuationCalendar 的值，可以在 Config 表中修改
+ACCOUNT_VALUATION_CALENDAR = "account_valuation_calendar"
+# 上一次重建账户价值时使用的日历，日历改变后需要全量重建
+ACCOUNT_VALUATION_CALENDAR_APPLIED = "account_valuation_calendar_applied"
+
 DATE_FORMAT = "%Y-%m-%d"
 
+# 等待其他进程完成同步时，进度中展示的阶段名称
+WAITING_FOR_LEASE = "waiting_for_other_sync"
+
+# 同步阶段共享线程池的大小
+SYNC_MAX_WORKERS = 16
+
+# SQLite 同一时间只允许一个写事务，并行执行的同步阶段通过这把锁串行化写入，
+# 避免写事务之间互相等待超时
+_SQLITE_WRITE_LOCK = threading.Lock()
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# 同步进度回调，参数为 (正在执行的阶段名称, 已完成的阶段数, 阶段总数)
+ProgressCallback = Callable[[list[str], int, int], None]
 
-def sync() -> None:
+
+class ValuationCalendar(enum.Enum):
+    # 每个自然日都计算账户价值，非交易日沿用最近一个交易日的收盘价
+    CALENDAR = "calendar"
+    # 只在至少有一只股票产生收盘价的交易日计算账户价值
+    TRADING = "trading"
+
+
+def sync(on_progress: ProgressCallback | None = None) -> None:
     """
     执行所有数据同步任务的主函数。
 
-    同步顺序:
-    1. 汇率 (sync_exchange_rate): 必须先同步，因为后续资产计算需要用到。
-    2. 股票代码 (sync_ticker_symbol): 同步股票的基本信息。
-    3. 股票历史价格 (sync_ticker_info): 依赖股票代码，为后续计算提供每日价格。
-    4. 每日资产快照 (sync_asset): 依赖交易记录，计算每日持仓。
-    5. 每日账户总价值 (sync_account): 依赖资产快照、股票价格和汇率，计算最终的每日总价值。
+    同步阶段及其依赖关系 (见 SYNC_STAGES):
+    1. 汇率 (sync_exchange_rate): 无依赖。
+    2. 股票历史价格 (sync_ticker_info): 无依赖，内部会先同步股票代码。
+    3. 每日资产快照 (sync_asset): 只依赖交易记录，计算每日持仓。
+    4. 每日账户总价值 (sync_account): 依赖资产快照、股票价格和汇率，计算最终的每日总价值。
+
+    前三个阶段互不依赖，会被并行调度，总耗时取决于关键路径而不是各阶段耗时之和。
+
+    Args:
+        on_progress: 阶段开始或结束时的回调，见 run_sync_stages。
     """
     with Session(db.engine) as session:
         # 检查上次同步日期，如果今天已经同步过，则跳过
@@ -60,18 +151,143 @@ def sync() -> None:
             logging.info("检测到今日已同步，跳过任务。")
             return
 
+    # 同一时间只允许一个进程执行同步，其他进程等待它完成
+    lease = SyncLease()
+    wait_for_sync_lease(
+        lease,
+        on_wait=partial(on_progress, [WAITING_FOR_LEASE], 0, len(SYNC_STAGES))
+        if on_progress is not None
+        else None,
+    )
+    with lease, Session(db.engine) as session:
+        # 等待租约期间，其他进程可能已经完成了今天的同步
+        if _is_already_synced(session):
+            logging.info("其他进程已完成今日的同步，跳过任务。")
+            return
+
         logging.info("开始执行数据同步任务...")
-        # 按照正确的依赖顺序执行同步
-        sync_exchange_rate()
-        sync_ticker_info()  # sync_ticker_symbol 包含在其中
-        sync_asset()
-        sync_account()
+        # 按照依赖关系调度各个同步阶段
+        run_sync_stages(SYNC_STAGES, on_progress=on_progress)
 
         # 更新同步状态
         _update_sync_status(session)
         logging.info("所有数据均同步成功!")
 
 
+class SyncStage(NamedTuple):
+    """同步阶段的声明。"""
+
+    # 阶段名称，用于声明依赖和记录耗时
+    name: str
+    # 阶段的执行函数，参数为共享的线程池
+    run: Callable[[Executor], None]
+    # 需要在本阶段之前完成的阶段名称
+    depends_on: tuple[str, ...] = ()
+
+
+def run_sync_stages(
+    stages: Sequence[SyncStage],
+    max_workers: int = SYNC_MAX_WORKERS,
+    on_progress: ProgressCallback | None = None,
+) -> dict[str, float]:
+    """
+    按照依赖关系调度同步阶段。
+
+    所有依赖都已完成的阶段会被提交到同一个有界线程池中并行执行，
+    阶段内部的并发请求也共用这个线程池。任一阶段失败后不再调度新的阶段，
+    等待正在执行的阶段结束后抛出第一个异常。
+
+    Args:
+        stages: 需要执行的同步阶段。
+        max_workers: 共享线程池的大小，至少会比阶段数量多一个，
+            保证阶段在等待内部任务时线程池仍有空闲线程。
+        on_progress: 每次有阶段开始或结束时调用，用于展示同步进度。
+
+    Returns:
+        dict[str, float]: 每个阶段的执行耗时（秒）。
+    """
+    names = {stage.name for stage in stages}
+    for stage in stages:
+        missing = set(stage.depends_on) - names
+        if missing:
+            raise ValueError(f"同步阶段 {stage.name} 依赖了不存在的阶段: {missing}")
+
+    pending = {stage.name: stage for stage in stages}
+    finished: set[str] = set()
+    durations: dict[str, float] = {}
+    errors: list[Exception] = []
+    start_time = time.perf_counter()
+
+    with ThreadPoolExecutor(
+        max_workers=max(max_workers, len(stages) + 1), thread_name_prefix="sync"
+    ) as executor:
+        running: dict[Future, str] = {}
+        while pending or running:
+            # 1. 提交所有依赖都已完成的阶段
+            if not errors:
+                for name, stage in list(pending.items()):
+                    if finished.issuperset(stage.depends_on):
+                        future = executor.submit(_run_sync_stage, stage, executor)
+                        running[future] = name
+                        del pending[name]
+            if on_progress is not None:
+                on_progress(sorted(running.values()), len(finished), len(stages))
+
+            if not running:
+                if not errors:
+                    raise ValueError(f"同步阶段存在循环依赖: {sorted(pending)}")
+                break
+
+            # 2. 等待任意一个阶段结束
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    durations[name] = future.result()
+                    finished.add(name)
+                except Exception as e:
+                    logging.error(f"错误: 同步阶段 {name} 执行失败: {e}")
+                    errors.append(e)
+
+    if on_progress is not None:
+        on_progress([], len(finished), len(stages))
+    elapsed_time = time.perf_counter() - start_time
+    logging.info(
+        f"同步阶段耗时: {', '.join(f'{k}={v:.2f}s' for k, v in durations.items())}；"
+        f"总耗时 {elapsed_time:.2f} 秒，各阶段之和 {sum(durations.values()):.2f} 秒。"
+    )
+    if errors:
+        raise errors[0]
+    return durations
+
+
+def _run_sync_stage(stage: SyncStage, executor: Executor) -> float:
+    """执行单个同步阶段，返回其耗时（秒）。"""
+    logging.info(f"同步阶段 {stage.name} 开始执行...")
+    start_time = time.perf_counter()
+    stage.run(executor)
+    elapsed_time = time.perf_counter() - start_time
+    logging.info(f"同步阶段 {stage.name} 执行完毕，耗时: {elapsed_time:.4f} 秒")
+    return elapsed_time
+
+
+def _map_concurrently(
+    func: Callable[[T], R], items: Sequence[T], executor: Executor | None
+) -> list[R]:
+    """使用给定的线程池并发执行 func，未提供线程池时创建一个临时线程池。"""
+    if executor is not None:
+        # map 会保持原始的提交顺序
+        return list(executor.map(func, items))
+    with ThreadPoolExecutor(max_workers=10) as own_executor:
+        return list(own_executor.map(func, items))
+
+
+def is_synced_today() -> bool:
+    """检查今天是否已经执行过同步。"""
+    with Session(db.engine) as session:
+        return _is_already_synced(session)
+
+
 def _is_already_synced(session: Session) -> bool:
     """检查今天是否已经执行过同步。"""
     sync_config = session.query(Config).filter(Config.key == LAST_SYNC_DATE).first()
@@ -89,79 +305,212 @@ def _is_already_synced(session: Session) -> bool:
 
 def _update_sync_status(session: Session) -> None:
     """更新同步状态到今天的日期。"""
-    sync_config = session.query(Config).filter(Config.key == LAST_SYNC_DATE).first()
-    if sync_config is None:
+    _set_config_value(session, LAST_SYNC_DATE, date.today().strftime(DATE_FORMAT))
+    session.commit()
+
+
+def _get_config_value(session: Session, key: str) -> str | None:
+    """读取配置项的值，不存在时返回 None。"""
+    config = session.query(Config).filter(Config.key == key).first()
+    return config.value if config else None
+
+
+def _set_config_value(session: Session, key: str, value: str) -> None:
+    """写入配置项的值，由调用方负责提交事务。"""
+    config = session.query(Config).filter(Config.key == key).first()
+    if config is None:
         # 如果配置项不存在，则创建一个新的
-        sync_config = Config(key=LAST_SYNC_DATE)
-        session.add(sync_config)
+        config = Config(key=key)
+        session.add(config)
 
-    sync_config.value = date.today().strftime(DATE_FORMAT)
-    session.commit()
+    config.value = value
 
 
 @timing_decorator
-def sync_account() -> None:
+def sync_account(full: bool = False, calendar: ValuationCalendar | None = None) -> None:
     """
-    基于每日资产快照（Asset）和股票价格（TickerInfo），计算每日的总账户价值（Account）。
+    基于持仓区间（Asset）和股票价格（TickerInfo），计算每日的总账户价值（Account）。
     所有资产都会被换算成美元（USD）进行汇总。
+
+    股票价格只保存真实交易日的收盘价，非交易日使用最近一个交易日的收盘价。
+    默认只重建水位线之后的账户记录：水位线是上次运行后新增或修改过的
+    交易记录、股票价格和汇率所涉及的最早日期。
+
+    Args:
+        full: 为 True 时清空账户数据，并从首次资产记录开始全量重建。
+        calendar: 按自然日还是交易日输出账户价值，为 None 时读取 Config 中的设置。
     """
-    with Session(db.engine) as session:
-        # 清空旧的账户数据
-        session.query(Account).delete()
+    with _SQLITE_WRITE_LOCK, Session(db.engine) as session:
+        run_started = datetime.datetime.now()
+        calendar = calendar or _get_valuation_calendar(session)
+        applied = _get_config_value(session, ACCOUNT_VALUATION_CALENDAR_APPLIED)
+        if (applied or ValuationCalendar.CALENDAR.value) != calendar.value:
+            full = True
 
         # 获取首次资产记录的日期，作为计算的起始点
         first_asset = session.query(Asset).order_by(asc(Asset.date)).first()
         if not first_asset:
+            # 交易记录全部删除后，旧的账户数据也不再有效
+            session.query(Account).delete()
+            session.commit()
             logging.warning("警告: 资产数据为空，无法计算账户价值。")
             return
 
-        start_date = first_asset.date
+        start_date = _get_rebuild_start_date(
+            session,
+            ACCOUNT_SNAPSHOT_MARK,
+            Account,
+            # 重建持仓时会修改已有区间的结束日期，资产表的 update_time 不能反映持仓
+            # 变化的日期，这里直接以交易记录作为持仓变化的来源
+            [Transaction, TickerInfo, ExchangedRate],
+            first_asset.date,
+            full,
+        )
         end_date = date.today() - timedelta(1)
 
+        # 清空水位线之后的旧账户数据，以及首次资产记录之前遗留的数据
+        session.query(Account).filter(
+            (Account.date >= start_date) | (Account.date < first_asset.date)
+        ).delete()
+        _set_config_value(session, ACCOUNT_SNAPSHOT_MARK, run_started.isoformat())
+        _set_config_value(session, ACCOUNT_VALUATION_CALENDAR_APPLIED, calendar.value)
+        _prune_dirty_dates(session)
+        if start_date > end_date:
+            session.commit()
+            logging.info("账户数据没有变化，无需重建。")
+            return
+
         # 1. 预加载所有需要的数据到内存中，避免循环查询
-        all_assets = session.query(Asset).filter(Asset.date >= start_date).all()
+        all_assets = get_holdings_between(session, start_date, end_date)
         all_ticker_infos = (
             session.query(TickerInfo).filter(TickerInfo.date >= start_date).all()
         )
-        all_exchange_rates = (
-            session.query(ExchangedRate).filter(ExchangedRate.date >= start_date).all()
-        )
+        latest_ticker_prices = _get_latest_ticker_prices_before(session, start_date)
+        # 汇率缺失的日期沿用之前最近一天的汇率
+        rate_matrix = get_exchange_rate_matrix(start_date, end_date, session)
 
         # 2. 将数据转换为更易于查询的结构（字典）
-        assets_by_date = _group_by_date(all_assets)
         ticker_prices_by_date_ticker = _group_ticker_prices(all_ticker_infos)
-        rates_by_date_currency = _group_exchange_rates(all_exchange_rates)
+        rates_by_date_currency = {
+            day.date(): rates.dropna().to_dict()
+            for day, rates in rate_matrix.iterrows()
+        }
 
         # 3. 迭代每一天，计算当天的总账户价值
-        new_accounts = []
-        for each_date in pd.date_range(start=start_date, end=end_date):
-            d = each_date.date()
-            daily_assets = assets_by_date.get(d, [])
-            if not daily_assets:
-                continue  # 如果当天没有资产记录，则跳过
-
-            # 获取当天的汇率和股票价格
-            daily_rates = rates_by_date_currency.get(d, {})
-            daily_ticker_prices = ticker_prices_by_date_ticker.get(d, {})
-
-            # 计算当天的总价值
-            total_value_usd = _calculate_daily_total_value(
-                daily_assets, daily_ticker_prices, daily_rates
-            )
-
-            new_accounts.append(
-                Account(
-                    date=d,
-                    currency=total_value_usd,
-                    currency_type=CurrencyType.USD,
+        def iter_account_rows() -> Iterator[tuple[date, Decimal, CurrencyType]]:
+            for d, daily_assets in iter_daily_holdings(
+                all_assets, start_date, end_date
+            ):
+                # 非交易日没有收盘价，沿用每只股票最近一次的收盘价
+                daily_ticker_prices = ticker_prices_by_date_ticker.get(d)
+                if daily_ticker_prices:
+                    latest_ticker_prices.update(daily_ticker_prices)
+                elif calendar == ValuationCalendar.TRADING:
+                    continue
+
+                # 获取当天的汇率
+                daily_rates = rates_by_date_currency.get(d, {})
+
+                # 计算当天的总价值
+                total_value_usd = _calculate_daily_total_value(
+                    daily_assets, latest_ticker_prices, daily_rates
                 )
-            )
+                yield d, total_value_usd, CurrencyType.USD
 
         # 4. 批量存入数据库
-        if new_accounts:
-            session.add_all(new_accounts)
-            session.commit()
-            logging.info(f"成功同步 {len(new_accounts)} 条账户价值记录。")
+        count = bulk_insert(
+            session,
+            Account.__table__,
+            ["date", "currency", "currency_type"],
+            iter_account_rows(),
+        )
+        session.commit()
+        logging.info(f"从 {start_date} 起成功同步 {count} 条账户价值记录。")
+
+
+def _get_valuation_calendar(session: Session) -> ValuationCalendar:
+    """读取账户价值使用的日历，未设置或设置无效时按自然日计算。"""
+    value = _get_config_value(session, ACCOUNT_VALUATION_CALENDAR)
+    try:
+        return ValuationCalendar(value)
+    except ValueError:
+        return ValuationCalendar.CALENDAR
+
+
+def _get_latest_ticker_prices_before(
+    session: Session, day: date
+) -> dict[str, TickerInfo]:
+    """查询每只股票在指定日期之前最近一个交易日的收盘价。"""
+    latest = (
+        select(TickerInfo.ticker, func.max(TickerInfo.date).label("date"))
+        .where(TickerInfo.date < day)
+        .group_by(TickerInfo.ticker)
+        .subquery()
+    )
+    infos = session.scalars(
+        select(TickerInfo).join(
+            latest,
+            (TickerInfo.ticker == latest.c.ticker) & (TickerInfo.date == latest.c.date),
+        )
+    )
+    return {info.ticker: info for info in infos}
+
+
+def _get_rebuild_start_date(
+    session: Session,
+    mark_key: str,
+    snapshot_model: type[Base],
+    source_models: list[type[Base]],
+    first_date: date,
+    full: bool,
+) -> date:
+    """
+    计算快照表需要重建的起始日期（水位线）。
+
+    水位线取以下日期中最早的一个:
+    - 上次运行之后新增、修改或删除的源数据所涉及的最早日期，删除的行和修改前的
+      日期由触发器记录在 dirty_date 表中;
+    - 快照表中最后一天的下一天，用于追加新的日期。
+    全量模式、从未运行过或快照表为空时，从 first_date 开始全量重建。
+
+    水位线不会早于 first_date。最早的源数据被删除或改到更晚的日期时，
+    first_date 之前的快照已经失效，由调用方一并删除。
+    """
+    mark = _get_config_value(session, mark_key)
+    last_snapshot_date = session.execute(select(func.max(snapshot_model.date))).scalar()
+    if full or mark is None or last_snapshot_date is None:
+        return first_date
+
+    since = datetime.datetime.fromisoformat(mark)
+    candidates = [last_snapshot_date + timedelta(1)]
+    for model in source_models:
+        # 新增或修改的行，以及被删除或改到其他日期的行原来的日期
+        for sql in [
+            select(func.min(model.date)).where(model.update_time > since),
+            select(func.min(DirtyDate.date)).where(
+                DirtyDate.table_name == model.__tablename__,
+                DirtyDate.update_time > since,
+            ),
+        ]:
+            dirty_date = session.execute(sql).scalar()
+            if dirty_date is not None:
+                candidates.append(dirty_date)
+    return max(min(candidates), first_date)
+
+
+def _prune_dirty_dates(session: Session) -> None:
+    """删除使用它的重建都已经处理过的 dirty_date 记录。"""
+    for model, mark_keys in _DIRTY_DATE_CONSUMERS.items():
+        marks = [_get_config_value(session, key) for key in mark_keys]
+        if None in marks:
+            continue
+        since = min(datetime.datetime.fromisoformat(mark) for mark in marks)
+        session.execute(
+            delete(DirtyDate).where(
+                DirtyDate.table_name == model.__tablename__,
+                DirtyDate.update_time <= since,
+            )
+        )
 
 
 def _calculate_daily_total_value(
@@ -204,14 +553,6 @@ def _convert_to_usd(
     return value / rate
 
 
-def _group_by_date(items: list) -> dict[date, list]:
-    """将列表按日期分组。"""
-    grouped = {}
-    for item in items:
-        grouped.setdefault(item.date, []).append(item)
-    return grouped
-
-
 def _group_ticker_prices(
     ticker_infos: list[TickerInfo],
 ) -> dict[date, dict[str, TickerInfo]]:
@@ -224,57 +565,106 @@ def _group_ticker_prices(
     return grouped
 
 
-def _group_exchange_rates(
-    exchange_rates: list[ExchangedRate],
-) -> dict[date, dict[CurrencyType, Decimal]]:
-    """将汇率信息按日期和货币类型两级分组。"""
-    grouped = {}
-    for rate in exchange_rates:
-        if rate.date not in grouped:
-            grouped[rate.date] = {}
-        grouped[rate.date][rate.currency_type] = rate.rate
-    return grouped
-
-
 @timing_decorator
-def sync_asset() -> None:
+def sync_asset(full: bool = False) -> None:
     """
-    根据交易记录同步每日的资产快照。
-    该函数会清空现有的资产数据，然后根据所有的股票和现金交易记录，
-    重新计算从第一笔交易开始到昨天为止的每一天的资产状况。
+    根据交易记录同步持仓区间。
+
+    默认只重建水位线（上次运行后新增或修改过的交易所涉及的最早日期）之后的区间，
+    并以水位线前一天有效的区间作为初始持仓，计算到昨天为止的持仓变化。
+
+    Args:
+        full: 为 True 时清空资产数据，并从第一笔交易开始全量重建。
     """
-    with Session(engine) as session:
-        # 清空旧的资产数据
-        session.query(Asset).delete()
+    with _SQLITE_WRITE_LOCK, Session(engine) as session:
+        run_started = datetime.datetime.now()
 
         # 检查是否有交易记录，没有则无法继续
-        if session.query(Transaction).count() == 0:
+        first_transaction_date = session.execute(
+            select(func.min(Transaction.date))
+        ).scalar()
+        if first_transaction_date is None:
+            # 交易记录全部删除后，旧的持仓区间也不再有效
+            session.query(Asset).delete()
+            session.commit()
             logging.warning("警告: 交易记录为空，无法生成资产数据。")
             return
 
-        # 分别同步股票和现金资产
-        all_assets = []
-        all_assets.extend(_sync_stock_asset(session))
-        all_assets.extend(_sync_currency_asset(session))
+        start_date = _get_rebuild_start_date(
+            session,
+            ASSET_SNAPSHOT_MARK,
+            Asset,
+            [Transaction],
+            first_transaction_date,
+            full,
+        )
+        end_date = date.today() - timedelta(1)
 
-        # 批量添加到数据库
-        if all_assets:
-            session.add_all(all_assets)
-            session.commit()
-            logging.info(f"成功同步 {len(all_assets)} 条资产记录。")
+        # 清空水位线之后开始的区间，以及第一笔交易之前遗留的区间，
+        # 剩下的区间中水位线前一天有效的作为初始持仓
+        session.query(Asset).filter(
+            (Asset.date >= start_date) | (Asset.date < first_transaction_date)
+        ).delete()
+        seeds = get_holdings_as_of(session, start_date - timedelta(1))
+        _set_config_value(session, ASSET_SNAPSHOT_MARK, run_started.isoformat())
+
+        # 分别计算股票和现金的持仓区间，并批量写入数据库
+        count = bulk_insert(
+            session,
+            Asset.__table__,
+            ["date", "end_date", "type", "ticker", "shares", "price"],
+            _sync_stock_asset(
+                session,
+                start_date,
+                end_date,
+                {a.ticker: a for a in seeds if isinstance(a, StockAsset)},
+            ),
+        )
+        count += bulk_insert(
+            session,
+            Asset.__table__,
+            ["date", "end_date", "type", "currency", "currency_type"],
+            _sync_currency_asset(
+                session,
+                start_date,
+                end_date,
+                {a.currency_type: a for a in seeds if isinstance(a, CurrencyAsset)},
+            ),
+        )
+        session.commit()
+        if count:
+            logging.info(f"从 {start_date} 起成功同步 {count} 条持仓区间。")
         else:
-            logging.info("没有生成任何资产记录。")
+            logging.info("没有新的持仓区间。")
 
 
-def _sync_currency_asset(session: Session) -> list[CurrencyAsset]:
+def _sync_currency_asset(
+    session: Session,
+    start_date: date,
+    end_date: date,
+    seeds: dict[CurrencyType, CurrencyAsset],
+) -> Iterator[tuple[date, date, AssetType, Decimal, CurrencyType]]:
     """
-    根据现金交易记录，计算每日的现金资产。
-    使用 pandas 来高效处理时间序列数据。
+    根据现金交易记录，计算从 start_date 到 end_date 的现金持仓区间。
+    seeds 是 start_date 前一天有效的区间，它们的结束日期会被更新为第一次变化的日期。
+
+    Returns:
+        Iterator: (开始日期, 结束日期, 资产类型, 货币金额, 货币单位) 形式的行数据。
     """
-    # 1. 从数据库获取所有现金交易记录
-    currency_transactions = session.query(CurrencyTransaction).all()
-    if not currency_transactions:
-        return []
+    if start_date > end_date:
+        return
+
+    # 1. 获取起始日期之后的现金交易记录
+    currency_transactions = (
+        session.query(CurrencyTransaction)
+        .filter(
+            CurrencyTransaction.date >= start_date,
+            CurrencyTransaction.date <= end_date,
+        )
+        .all()
+    )
+    if not currency_transactions and not seeds:
+        return
 
     # 2. 将交易记录转换为 DataFrame
     df = pd.DataFrame(
@@ -286,48 +676,72 @@ def _sync_currency_asset(session: Session) -> list[CurrencyAsset]:
                 "amount": t.currency if t.type == TransactionType.BUY else -t.currency,
             }
             for t in currency_transactions
-        ]
+        ],
+        columns=["date", "currency_type", "amount"],
     )
-    df["date"] = pd.to_datetime(df["date"])
 
-    # 3. 创建一个从首次交易到昨天的完整日期范围
-    start_date = df["date"].min()
-    end_date = date.today() - timedelta(1)
-    if pd.isna(start_date) or start_date.date() > end_date:
-        return []
-    full_date_range = pd.date_range(start=start_date, end=end_date)
-
-    # 4. 按货币类型分别处理，并计算每日累计资产
-    all_assets = []
-    for currency_type, group in df.groupby("currency_type", sort=False):
-        # 按日期聚合，计算每日净变动
+    # 3. 按货币类型分别计算每个交易日结束时的金额，只在金额变化时开始新的区间
+    currency_types = list(seeds) + [
+        c for c in df["currency_type"].unique() if c not in seeds
+    ]
+    for currency_type in currency_types:
+        seed = seeds.get(currency_type)
+        seed_amount = seed.currency if seed is not None else Decimal(0)
         daily_changes = (
-            group.groupby("date")["amount"].sum().reindex(full_date_range, fill_value=0)
+            df[df["currency_type"] == currency_type].groupby("date")["amount"].sum()
         )
-        # 计算每日累计资产
-        daily_assets = daily_changes.cumsum()
-
-        # 5. 转换为 CurrencyAsset 对象
-        for d, amount in daily_assets.items():
-            all_assets.append(
-                CurrencyAsset(
-                    date=d.date(),
-                    currency=Decimal(str(amount)),
-                    currency_type=currency_type,
-                )
+        daily_amounts = daily_changes.cumsum() + seed_amount
+
+        seed_end, intervals = split_into_intervals(
+            _currency_values(seed_amount),
+            ((d, _currency_values(amount)) for d, amount in daily_amounts.items()),
+        )
+        if seed is not None:
+            seed.end_date = seed_end
+        for interval_start, interval_end, (amount,) in intervals:
+            yield (
+                interval_start,
+                interval_end,
+                AssetType.CURRENCY,
+                amount,
+                currency_type,
             )
-    return all_assets
 
 
-def _sync_stock_asset(session: Session) -> list[StockAsset]:
+def _currency_values(amount: Decimal) -> HoldingValues:
+    """现金持仓区间的值，按存储精度舍入后比较，金额为 0 时没有持仓。"""
+    amount = quantize_fixed_point(amount, AMOUNT_SCALE)
+    return (amount,) if amount != 0 else None
+
+
+def _sync_stock_asset(
+    session: Session,
+    start_date: date,
+    end_date: date,
+    seeds: dict[str, StockAsset],
+) -> Iterator[tuple[date, date, AssetType, str, Decimal, Decimal]]:
     """
-    根据股票交易记录，计算每日的股票资产（持股数量和成本价）。
-    使用 pandas 进行复杂的聚合和状态计算。
+    根据股票交易记录，计算从 start_date 到 end_date 的股票持仓区间（持股数量和成本价）。
+    seeds 是 start_date 前一天有效的区间，它们的结束日期会被更新为第一次变化的日期。
+    使用持仓引擎在交易日上做累计计算，只在持仓变化时开始新的区间。
+
+    Returns:
+        Iterator: (开始日期, 结束日期, 资产类型, 股票代码, 持股数量, 平均成本) 形式的行数据。
     """
-    # 1. 获取所有股票交易记录
-    stock_transactions = session.query(StockTransaction).all()
-    if not stock_transactions:
-        return []
+    if start_date > end_date:
+        return
+
+    # 1. 获取起始日期之后的股票交易记录
+    stock_transactions = (
+        session.query(StockTransaction)
+        .filter(
+            StockTransaction.date >= start_date,
+            StockTransaction.date <= end_date,
+        )
+        .all()
+    )
+    if not stock_transactions and not seeds:
+        return
 
     # 2. 将交易记录转换为 DataFrame
     df = pd.DataFrame(
@@ -339,77 +753,59 @@ def _sync_stock_asset(session: Session) -> list[StockAsset]:
                 "price": t.price,
             }
             for t in stock_transactions
-        ]
+        ],
+        columns=["date", "ticker", "shares", "price"],
     )
     df["date"] = pd.to_datetime(df["date"])
-    df["shares"] = df["shares"].astype(str).apply(Decimal)
-    df["price"] = df["price"].astype(str).apply(Decimal)
 
-    # 3. 创建完整的日期范围
-    start_date = df["date"].min()
-    end_date = date.today() - timedelta(1)
-    if pd.isna(start_date) or start_date.date() > end_date:
-        return []
-    full_date_range = pd.date_range(start=start_date, end=end_date)
-
-    # 4. 按股票代码分别处理，计算每日持仓
-    all_assets = []
-    for ticker, group in df.groupby("ticker"):
-        # 聚合同一天的多次交易，计算加权平均价
-        daily_summary = group.groupby("date").apply(
-            lambda x: pd.Series(
-                {
-                    "shares_change": x["shares"].sum(),
-                    "weighted_price": (
-                        (x["shares"] * x["price"]).sum() / x["shares"].sum()
-                        if x["shares"].sum() != 0
-                        else 0
-                    ),
-                }
-            ),
-            include_groups=False,
+    # 3. 计算每只股票每个交易日结束时的持股数量和平均成本
+    for ticker in sorted(set(seeds) | set(df["ticker"])):
+        seed = seeds.get(ticker)
+        seed_shares, seed_price = (
+            (seed.shares, seed.price) if seed is not None else (Decimal(0), Decimal(0))
+        )
+        changes = compute_position_changes(
+            df[df["ticker"] == ticker], seed_shares, seed_price
         )
 
-        # 重新索引到完整日期范围，填充缺失值为 0
-        daily_summary = daily_summary.reindex(full_date_range, fill_value=0)
-
-        # 5. 迭代计算每日的持股数量和平均成本
-        current_shares = Decimal(0)
-        current_cost = Decimal(0)
+        seed_end, intervals = split_into_intervals(
+            _stock_values(seed_shares, seed_price),
+            (
+                (d.date(), _stock_values(shares, price))
+                for d, shares, price in changes.itertuples()
+            ),
+        )
+        if seed is not None:
+            seed.end_date = seed_end
+        for interval_start, interval_end, (shares, price) in intervals:
+            yield (
+                interval_start,
+                interval_end,
+                AssetType.TICKER,
+                ticker,
+                shares,
+                price,
+            )
 
-        for d, row in daily_summary.iterrows():
-            shares_change = Decimal(str(row["shares_change"]))
-            price = Decimal(str(row["weighted_price"]))
 
-            if shares_change != 0:
-                # 计算新的总成本和总股数
-                new_total_cost = (current_cost * current_shares) + (
-                    price * shares_change
-                )
-                new_total_shares = current_shares + shares_change
-
-                # 更新持仓和成本价
-                current_shares = new_total_shares
-                if current_shares != 0:
-                    current_cost = new_total_cost / new_total_shares
-                else:
-                    current_cost = Decimal(0)  # 如果全部卖出，成本归零
-
-            all_assets.append(
-                StockAsset(
-                    ticker=ticker,
-                    shares=current_shares,
-                    date=d.date(),
-                    price=current_cost,
-                )
-            )
-    return all_assets
+def _stock_values(shares: Decimal, price: Decimal) -> HoldingValues:
+    """股票持仓区间的值，按存储精度舍入后比较，持股数量为 0 时没有持仓。"""
+    shares = quantize_fixed_point(shares, SHARES_SCALE)
+    if shares == 0:
+        return None
+    return shares, quantize_fixed_point(price, PRICE_SCALE)
 
 
 @timing_decorator
-def sync_exchange_rate() -> None:
+def sync_exchange_rate(full: bool = False) -> None:
     """
     同步从首次交易日期到昨天为止的每日汇率数据。
+
+    默认以增量模式运行：只请求数据库中仍缺少 (日期, 货币) 组合的日期，
+    并把新数据直接追加到汇率表中。
+
+    Args:
+        full: 为 True 时清空汇率表，并重新获取整个日期范围的数据。
     """
     with Session(engine) as session:
         # 1. 确定需要同步汇率的日期范围
@@ -422,74 +818,147 @@ def sync_exchange_rate() -> None:
 
         start_date = first_transaction.date
         end_date = date.today() - timedelta(1)
-        date_range = list(pd.date_range(start=start_date, end=end_date))
+        date_range = [d.date() for d in pd.date_range(start=start_date, end=end_date)]
 
         if not date_range:
             return
 
-        # 2. 使用线程池并发获取汇率数据
-        logging.info(f"正在同步从 {start_date} 到 {end_date} 的汇率数据...")
-        with ThreadPoolExecutor(max_workers=10) as executor:
-            # map 会保持原始的提交顺序
-            results = executor.map(currency.get_exchange_rate, date_range)
+        # 2. 找出数据库中已存在的 (日期, 货币) 组合，只获取缺失的日期
+        existing_pairs = (
+            set() if full else _get_existing_rate_pairs(session, start_date)
+        )
+        expected_currencies = set(CurrencyType)
+        dates_to_fetch = [
+            d
+            for d in date_range
+            if any((d, c) not in existing_pairs for c in expected_currencies)
+        ]
+        if not dates_to_fetch:
+            logging.info("汇率数据已是最新，无需同步。")
+            return
 
-        # 3. 处理获取到的数据并准备入库
+        # 3. 通过异步连接池并发获取汇率数据
+        logging.info(
+            f"正在同步从 {dates_to_fetch[0]} 到 {dates_to_fetch[-1]} "
+            f"的 {len(dates_to_fetch)} 天汇率数据..."
+        )
+        results = currency.get_exchange_rates(dates_to_fetch)
+
+        # 4. 处理获取到的数据，跳过数据库中已有的组合
         exchanged_rates = []
         for result in results:
             if result and result[1]:  # 确保结果不为空
                 rate_date, rates_map = result
-                for currency_type, rate in rates_map.items():
-                    exchanged_rates.append(
-                        ExchangedRate(
-                            currency_type=currency_type, rate=rate, date=rate_date
-                        )
-                    )
+                for currency_name, rate in rates_map.items():
+                    currency_type = CurrencyType(currency_name)
+                    if (rate_date, currency_type) not in existing_pairs:
+                        exchanged_rates.append((currency_type, rate, rate_date))
 
-        # 4. 批量存入数据库
+        # 5. 批量存入数据库
         if exchanged_rates:
-            session.query(ExchangedRate).delete()  # 先清空旧数据
-            session.add_all(exchanged_rates)
-            session.commit()
+            with _SQLITE_WRITE_LOCK:
+                if full:
+                    session.query(ExchangedRate).delete()  # 全量模式先清空旧数据
+                bulk_insert(
+                    session,
+                    ExchangedRate.__table__,
+                    ["currency_type", "rate", "date"],
+                    exchanged_rates,
+                )
+                session.commit()
             logging.info(f"成功同步 {len(exchanged_rates)} 条汇率记录。")
         else:
             logging.info("未能获取到任何汇率数据。")
 
 
+def _get_existing_rate_pairs(
+    session: Session, start_date: date
+) -> set[tuple[date, CurrencyType]]:
+    """查询数据库中从 start_date 起已存在的 (日期, 货币) 组合。"""
+    sql = select(ExchangedRate.date, ExchangedRate.currency_type).where(
+        ExchangedRate.date >= start_date
+    )
+    return {
+        (rate_date, currency_type) for rate_date, currency_type in session.execute(sql)
+    }
+
+
 @timing_decorator
-def sync_ticker_info() -> None:
+def sync_ticker_info(full: bool = False, executor: Executor | None = None) -> None:
     """
     同步所有持仓股票的历史价格信息。
-    1. 从数据库中获取需要同步的股票列表及其首次购买日期。
+    1. 从数据库中获取需要同步的股票列表，并根据每只股票已存储的最后日期（高水位）
+       确定本次需要获取的日期范围。TickerSymbol 表中还没有的股票会被定向查询。
     2. 并发地从外部 API 获取这些股票的历史价格。
-    3. 对获取到的价格数据进行处理，填充缺失的日期（如周末、节假日）。
-    4. 将处理后的数据存入数据库。
-    """
-    # 同步最新的港股和美股的 symbol 列表
-    sync_hk_ticker_symbol()
-    sync_us_ticker_symbol()
+    3. 只把真实交易日的收盘价存入数据库，周末和节假日不写入，读取时再使用
+       最近一个交易日的收盘价。
+
+    新股票、或首次交易日期早于上次回填起始日期的股票会进行全量回填，
+    其余股票只获取 (最后日期, 昨天] 区间。
 
+    Args:
+        full: 为 True 时忽略高水位，对所有股票进行全量回填。
+        executor: 用于并发获取数据的线程池，为 None 时使用临时线程池。
+    """
+    # 持仓股票的代码在 _get_ticker_data_to_fetch 中按需定向查询，
+    # 完整的股票列表由 refresh_ticker_symbol_universe 在后台刷新
     with Session(db.engine) as session:
         # 1. 获取需要同步的股票列表
-        ticker_data_to_fetch = _get_ticker_data_to_fetch(session)
+        ticker_data_to_fetch = _get_ticker_data_to_fetch(session, full)
         if not ticker_data_to_fetch:
             logging.info("没有需要同步的股票信息。")
             return
 
         # 2. 并发获取所有股票的历史价格
-        all_ticker_infos = _fetch_and_process_ticker_histories(ticker_data_to_fetch)
+        all_ticker_infos = _fetch_and_process_ticker_histories(
+            ticker_data_to_fetch, executor
+        )
 
-        # 3. 批量存入数据库
-        if all_ticker_infos:
-            session.query(TickerInfo).delete()
-            session.add_all(all_ticker_infos)
-            session.commit()
-            logging.info(f"成功同步 {len(all_ticker_infos)} 条股票价格信息。")
-        else:
+        if not all_ticker_infos:
             logging.info("没有获取到任何股票价格信息。")
+            return
+
+        # 3. 成功获取数据的全量回填股票先删除旧数据，并记录其回填起始日期
+        fetched_tickers = {ticker_name for _, ticker_name, _, _ in all_ticker_infos}
+        backfill_starts = _get_ticker_backfill_starts(session)
+        backfilled_tickers = []
+        for ticker_name, start_date, _, backfill in ticker_data_to_fetch:
+            if backfill and ticker_name in fetched_tickers:
+                backfilled_tickers.append(ticker_name)
+                backfill_starts[ticker_name] = start_date.strftime(DATE_FORMAT)
+        with _SQLITE_WRITE_LOCK:
+            if backfilled_tickers:
+                session.query(TickerInfo).filter(
+                    TickerInfo.ticker.in_(backfilled_tickers)
+                ).delete()
+                _set_config_value(
+                    session, TICKER_BACKFILL_STARTS, json.dumps(backfill_starts)
+                )
+
+            # 4. 批量存入数据库
+            bulk_insert(
+                session,
+                TickerInfo.__table__,
+                ["date", "ticker", "currency", "currency_type"],
+                all_ticker_infos,
+            )
+            session.commit()
+        logging.info(f"成功同步 {len(all_ticker_infos)} 条股票价格信息。")
+
 
+def _get_ticker_data_to_fetch(
+    session: Session, full: bool = False
+) -> list[tuple[str, date, TickerSymbol, bool]]:
+    """
+    从数据库中查询需要获取历史价格的股票列表。
+
+    Returns:
+        list: (股票代码, 获取起始日期, TickerSymbol, 是否全量回填)。
+    """
+    end_date = date.today() - timedelta(1)
+    price_marks = {} if full else _get_ticker_price_marks(session)
+    backfill_starts = _get_ticker_backfill_starts(session)
 
-def _get_ticker_data_to_fetch(session: Session) -> list[tuple[str, date, TickerSymbol]]:
-    """从数据库中查询需要获取历史价格的股票列表。"""
     # 查询每只股票的首次交易日期
     sql = select(StockTransaction.ticker, func.min(StockTransaction.date)).group_by(
         StockTransaction.ticker
@@ -497,40 +966,70 @@ def _get_ticker_data_to_fetch(session: Session) -> list[tuple[str, date, TickerS
     results = []
     for ticker_name, buy_date in session.execute(sql).all():
         symbol = search_ticker_symbol(ticker_name)
-        if symbol:
-            results.append((ticker_name, buy_date, symbol))
-        else:
+        if not symbol:
             logging.warning(
                 f"警告: 在 TickerSymbol 表中找不到 {ticker_name} 的信息，跳过同步。"
             )
+            continue
+
+        last_date = price_marks.get(ticker_name)
+        backfill_start = backfill_starts.get(ticker_name)
+        if (
+            last_date is None
+            or backfill_start is None
+            or buy_date < datetime.datetime.strptime(backfill_start, DATE_FORMAT).date()
+        ):
+            # 新股票，或首次交易日期提前，需要全量回填
+            results.append((ticker_name, buy_date, symbol, True))
+        elif last_date < end_date:
+            # 只获取高水位之后的新数据
+            results.append((ticker_name, last_date + timedelta(1), symbol, False))
     return results
 
 
+def _get_ticker_price_marks(session: Session) -> dict[str, date]:
+    """查询每只股票已存储价格的最后日期（高水位）。"""
+    sql = select(TickerInfo.ticker, func.max(TickerInfo.date)).group_by(
+        TickerInfo.ticker
+    )
+    return {ticker_name: last_date for ticker_name, last_date in session.execute(sql)}
+
+
+def _get_ticker_backfill_starts(session: Session) -> dict[str, str]:
+    """读取每只股票上一次全量回填时使用的起始日期。"""
+    value = _get_config_value(session, TICKER_BACKFILL_STARTS)
+    return json.loads(value) if value else {}
+
+
 def _fetch_and_process_ticker_histories(
-    ticker_data_to_fetch: list[tuple[str, date, TickerSymbol]],
-) -> list[TickerInfo]:
-    """并发获取并处理所有股票的历史价格。"""
-    all_ticker_infos = []
-    with ThreadPoolExecutor(max_workers=10) as executor:
-        # 为每个 ticker 创建一个 future
-        future_to_ticker = {
-            executor.submit(
-                _fetch_single_ticker_history, ticker_name, buy_date, symbol
-            ): (ticker_name, buy_date, symbol)
-            for ticker_name, buy_date, symbol in ticker_data_to_fetch
-        }
+    ticker_data_to_fetch: list[tuple[str, date, TickerSymbol, bool]],
+    executor: Executor | None = None,
+) -> list[tuple[date, str, Decimal, CurrencyType]]:
+    """
+    并发获取并处理所有股票的历史价格。
 
-        for future in future_to_ticker:
-            processed_infos = future.result()
-            if processed_infos:
-                all_ticker_infos.extend(processed_infos)
+    Returns:
+        list: (日期, 股票代码, 价格, 货币单位) 形式的行数据。
+    """
+    results = _map_concurrently(
+        lambda ticker_data: _fetch_single_ticker_history(*ticker_data),
+        ticker_data_to_fetch,
+        executor,
+    )
 
+    all_ticker_infos = []
+    for processed_infos in results:
+        if processed_infos:
+            all_ticker_infos.extend(processed_infos)
     return all_ticker_infos
 
 
 def _fetch_single_ticker_history(
-    ticker_name: str, buy_date: date, symbol: TickerSymbol
-) -> list[TickerInfo] | None:
+    ticker_name: str,
+    start_date: date,
+    symbol: TickerSymbol,
+    backfill: bool = True,
+) -> list[tuple[date, str, Decimal, CurrencyType]] | None:
     """获取单只股票的历史数据并进行处理。"""
     history_fetcher = (
         get_us_ticker_history
@@ -545,111 +1044,242 @@ def _fetch_single_ticker_history(
         # 从 API 获取原始历史数据
         raw_history = history_fetcher(
             symbol.symbol,
-            start_date=buy_date,
+            start_date=start_date,
             end_date=date.today() - timedelta(1),
         )
-        if not raw_history:
+        if not raw_history and backfill:
             logging.warning(f"警告: 未找到 {ticker_name} 的历史数据。")
             return None
 
-        logging.info(f"正在处理 {symbol} 的历史数据...")
-
-        # 填充缺失的价格数据
-        return _fill_missing_ticker_prices(
-            raw_history, buy_date, ticker_name, currency_type
-        )
+        return [
+            (day, ticker_name, Decimal(str(price)), currency_type)
+            for day, price in raw_history
+            if start_date <= day and not pd.isna(price)
+        ]
     except Exception as e:
         logging.error(f"错误: 获取 {ticker_name} 历史数据时出错: {e}")
         return None
 
 
-def _fill_missing_ticker_prices(
-    raw_history: list[tuple[date, float]],
-    start_date: date,
-    ticker_name: str,
-    currency_type: CurrencyType,
-) -> list[TickerInfo]:
-    """使用 pandas 填充股票价格中的缺失日期（周末、节假日）。"""
-    # 创建 DataFrame
-    df = pd.DataFrame(raw_history, columns=["date", "price"])
-    df["date"] = pd.to_datetime(df["date"])
-    df = df.set_index("date")
+def search_ticker_symbol(symbol: str, lookup: bool = True) -> TickerSymbol | None:
+    """
+    根据股票代码查询对应的 TickerSymbol 对象，支持省略交易所前缀。
 
-    # 创建从首次购买日到昨天的完整日期范围
-    full_range = pd.date_range(
-        start=start_date, end=date.today() - timedelta(1), freq="D"
-    )
+    Args:
+        symbol: 股票代码。
+        lookup: TickerSymbol 表中找不到时，是否向外部 API 定向查询该代码并保存。
+    """
+    resolved = get_symbol_resolver().resolve(symbol)
+    if resolved is None and lookup:
+        resolved = _lookup_ticker_symbol(symbol)
+    return resolved
 
-    # 重新索引以包含所有日期，并向前填充缺失的价格
-    df = df.reindex(full_range)
-    df["price"] = df["price"].ffill()
-
-    # 将填充后的数据转换为 TickerInfo 对象列表
-    filled_infos = []
-    for idx, row in df.iterrows():
-        if pd.notna(row["price"]):
-            filled_infos.append(
-                TickerInfo(
-                    date=idx.date(),
-                    ticker=ticker_name,
-                    currency=Decimal(str(row["price"])),
-                    currency_type=currency_type,
-                )
-            )
-    return filled_infos
 
+def _lookup_ticker_symbol(code: str) -> TickerSymbol | None:
+    """
+    定向查询一个不在 TickerSymbol 表中的代码，找到后保存到表中。
 
-def search_ticker_symbol(symbol: str) -> TickerSymbol | None:
-    """根据股票代码模糊查询对应的 TickerSymbol 对象。"""
-    with Session(db.engine) as session:
-        return (
-            session.query(TickerSymbol)
-            .filter(TickerSymbol.symbol.like(f"%{symbol}"))
-            .first()
-        )
+    纯数字的代码按港股查询，其余按美股查询。名称在完整列表刷新时补齐。
+    """
+    if code.strip().isdigit():
+        ticker_type, found = TickerType.HKD, find_hk_symbol(code)
+    else:
+        ticker_type, found = TickerType.USD, find_us_symbol(code)
+    if found is None:
+        return None
 
+    logging.info(f"定向查询到股票代码 {found}，保存到 TickerSymbol 表中。")
+    symbol = TickerSymbol(symbol=found, ticker_type=ticker_type)
+    with _SQLITE_WRITE_LOCK, Session(db.engine, expire_on_commit=False) as session:
+        session.add(symbol)
+        session.commit()
+    invalidate_symbol_resolver()
+    invalidate_symbol_search_index()
+    return symbol
 
-def sync_us_ticker_symbol() -> None:
-    """同步所有美国的股票代码和名称。"""
-    _sync_ticker_symbols(TickerType.USD, get_all_us_symbols)
 
+def refresh_ticker_symbol_universe(force: bool = False) -> None:
+    """
+    刷新完整的港股和美股股票列表，供输入联想使用。
 
-def sync_hk_ticker_symbol() -> None:
-    """同步所有香港的股票代码和名称。"""
-    _sync_ticker_symbols(TickerType.HKD, get_all_hk_symbols)
+    下载完整列表需要分页请求全部行情，耗时较长，因此不在同步的关键路径上执行，
+    而是由后台任务在同步完成后调用。Config 中的 ticker_symbol_universe_refresh
+    设置为 off 时不刷新。
+
+    Args:
+        force: 为 True 时忽略刷新间隔。
+    """
+    with Session(db.engine) as session:
+        if _get_config_value(session, TICKER_SYMBOL_UNIVERSE_REFRESH) == "off":
+            return
+    _sync_ticker_symbols(TickerType.HKD, get_all_hk_symbols, force)
+    _sync_ticker_symbols(TickerType.USD, get_all_us_symbols, force)
 
 
-def _sync_ticker_symbols(ticker_type: TickerType, fetch_symbols_func: callable) -> None:
+def _sync_ticker_symbols(
+    ticker_type: TickerType,
+    fetch_symbols_func: Callable[[], list[tuple[str, str]]],
+    force: bool = False,
+) -> None:
     """
-    同步指定类型的股票代码和名称的通用函数。
+    差量刷新指定类型的股票代码和名称的通用函数。
+
+    距离上次刷新超过刷新间隔（见 TICKER_SYMBOL_REFRESH_DAYS）时重新获取完整列表，
+    列表的哈希与上次相同且表中没有缺少名称的代码时直接跳过；否则与数据库中已有的代码比较，
+    批量写入新上市的代码、更新改名的代码、删除已经退市的代码。
 
     Args:
         ticker_type: 要同步的股票类型 (USD or HKD)。
-        fetch_symbols_func: 用于获取股票代码列表的函数。
+        fetch_symbols_func: 用于获取 (名称, 代码) 列表的函数。
+        force: 为 True 时忽略刷新间隔。
     """
+    state_key = f"{TICKER_SYMBOL_REFRESH_STATE}_{ticker_type.name.lower()}"
+    now = datetime.datetime.now()
     with Session(db.engine) as session:
-        # 检查数据库中是否已存在该类型的股票代码
-        count = (
-            session.query(TickerSymbol)
-            .filter(TickerSymbol.ticker_type == ticker_type)
-            .count()
+        state = json.loads(_get_config_value(session, state_key) or "{}")
+        refresh_days = int(
+            _get_config_value(session, TICKER_SYMBOL_REFRESH_DAYS)
+            or DEFAULT_TICKER_SYMBOL_REFRESH_DAYS
         )
-        if count > 0:
-            logging.info(f"已找到 {ticker_type.value} 类型的股票代码，跳过同步。")
+        stored = {
+            symbol: (id, name)
+            for id, symbol, name in session.execute(
+                select(TickerSymbol.id, TickerSymbol.symbol, TickerSymbol.name)
+                .where(TickerSymbol.ticker_type == ticker_type)
+                .order_by(TickerSymbol.id.desc())
+            )
+        }
+
+        refreshed_at = state.get("refreshed_at")
+        if (
+            not force
+            and stored
+            and refreshed_at
+            and now - datetime.datetime.fromisoformat(refreshed_at)
+            < timedelta(days=refresh_days)
+        ):
+            logging.info(f"{ticker_type.value} 股票代码在刷新间隔内，跳过同步。")
             return
 
-        # 如果不存在，则从外部 API 获取并存入数据库
-        logging.info(f"正在从外部 API 同步 {ticker_type.value} 类型的股票代码...")
-        symbols_to_add = [
-            TickerSymbol(symbol=symbol, name=name, ticker_type=ticker_type)
-            for (name, symbol) in fetch_symbols_func()
-        ]
+        logging.info(f"正在从外部 API 刷新 {ticker_type.value} 类型的股票代码...")
+        fetched = {symbol: name for name, symbol in fetch_symbols_func()}
+        if not fetched:
+            logging.info(f"未能从 API 获取到 {ticker_type.value} 股票代码。")
+            return
 
-        if symbols_to_add:
-            session.add_all(symbols_to_add)
+        digest = _hash_ticker_symbols(fetched)
+        # 定向查询保存的代码没有名称，表已经与上次的列表不一致，需要比较后补齐名称
+        lookup_only = any(name is None for _, name in stored.values())
+        if digest == state.get("hash") and stored and not lookup_only:
+            logging.info(f"{ticker_type.value} 股票代码列表没有变化。")
+            changed = False
+        else:
+            inserts, updates, delisted_ids = _diff_ticker_symbols(
+                session, ticker_type, stored, fetched
+            )
+            changed = bool(inserts or updates or delisted_ids)
+
+        with _SQLITE_WRITE_LOCK:
+            if changed:
+                if inserts:
+                    bulk_insert(
+                        session,
+                        TickerSymbol.__table__,
+                        ["symbol", "name", "ticker_type"],
+                        inserts,
+                    )
+                if updates:
+                    session.execute(
+                        update(TickerSymbol.__table__).where(
+                            TickerSymbol.__table__.c.id == bindparam("symbol_id")
+                        ),
+                        [
+                            {"symbol_id": id, "name": name, "update_time": now}
+                            for id, name in updates
+                        ],
+                    )
+                if delisted_ids:
+                    session.execute(
+                        delete(TickerSymbol.__table__).where(
+                            TickerSymbol.__table__.c.id.in_(delisted_ids)
+                        )
+                    )
+            _set_config_value(
+                session,
+                state_key,
+                json.dumps({"hash": digest, "refreshed_at": now.isoformat()}),
+            )
             session.commit()
+
+        if changed:
+            invalidate_symbol_resolver()
+            invalidate_symbol_search_index()
             logging.info(
-                f"成功同步 {len(symbols_to_add)} 个 {ticker_type.value} 股票代码。"
+                f"{ticker_type.value} 股票代码刷新完成: 新增 {len(inserts)} 个，"
+                f"更新 {len(updates)} 个，退市 {len(delisted_ids)} 个。"
             )
-        else:
-            logging.info(f"未能从 API 获取到 {ticker_type.value} 股票代码。")
+
+
+def _hash_ticker_symbols(symbols: dict[str, str]) -> str:
+    """计算股票代码列表的哈希，与返回顺序无关。"""
+    digest = hashlib.sha256()
+    for symbol in sorted(symbols):
+        digest.update(f"{symbol}\t{symbols[symbol] or ''}\n".encode())
+    return digest.hexdigest()
+
+
+def _diff_ticker_symbols(
+    session: Session,
+    ticker_type: TickerType,
+    stored: dict[str, tuple[int, str | None]],
+    fetched: dict[str, str],
+) -> tuple[list[tuple[str, str, TickerType]], list[tuple[int, str]], list[int]]:
+    """
+    比较数据库中已有的股票代码和最新获取的列表。
+
+    Returns:
+        tuple: (需要新增的 (代码, 名称, 类型), 需要改名的 (id, 新名称), 需要删除的 id)。
+    """
+    inserts = [
+        (symbol, name, ticker_type)
+        for symbol, name in fetched.items()
+        if symbol not in stored
+    ]
+    updates = [
+        (id, fetched[symbol])
+        for symbol, (id, name) in stored.items()
+        if symbol in fetched and fetched[symbol] != name
+    ]
+
+    delisted = set(stored) - set(fetched)
+    if delisted and len(fetched) < len(stored) * MIN_TICKER_SYMBOL_LIST_RATIO:
+        # 获取到的列表明显不完整时，很可能是接口异常而不是大量退市
+        logging.warning(
+            f"警告: 获取到的 {ticker_type.value} 股票代码只有 {len(fetched)} 个，"
+            f"少于已有的 {len(stored)} 个，跳过退市处理。"
+        )
+        delisted = set()
+    if delisted:
+        # 仍有交易记录引用的股票保留代码，价格同步还需要用到
+        traded = set(
+            session.scalars(
+                select(StockTransaction.ticker)
+                .distinct()
+                .where(StockTransaction.ticker.in_(delisted))
+            )
+        )
+        delisted -= traded
+    return inserts, updates, [stored[symbol][0] for symbol in delisted]
+
+
+# 同步阶段的依赖关系图，sync() 会按照该图并行调度各个阶段
+SYNC_STAGES = (
+    SyncStage("exchange_rate", lambda executor: sync_exchange_rate()),
+    SyncStage("ticker_info", lambda executor: sync_ticker_info(executor=executor)),
+    SyncStage("asset", lambda executor: sync_asset()),
+    SyncStage(
+        "account",
+        lambda executor: sync_account(),
+        depends_on=("exchange_rate", "ticker_info", "asset"),
+    ),
+)
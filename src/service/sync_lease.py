@@ -0,0 +1,158 @@
+"""
+跨进程的同步租约。
+
+多个浏览器标签页或多个 Streamlit 进程可能同时触发同步，它们会在同一个 SQLite
+文件上并发地删除和写入。这里在 Config 表中维护一行租约，只有持有租约的进程
+可以执行同步，持有者通过心跳定期延长租约；进程崩溃后心跳停止，租约过期后
+可以被其他进程接管。
+
+租约的值为 "<过期时间>|<持有者>"，过期时间是 ISO 格式的字符串，
+可以直接在 SQL 中按字典序与当前时间比较，获取租约只需要一条条件 UPDATE。
+释放后的租约值为空字符串。
+"""
+
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from collections.abc import Callable
+from datetime import datetime, timedelta
+
+from sqlalchemy import exists, insert, literal, or_, select, update
+
+import db
+from db.entity import Config
+
+SYNC_LEASE_KEY = "sync_lease"
+
+# 租约的有效期，持有者崩溃后最多经过这么久才能被接管
+LEASE_TTL = timedelta(seconds=120)
+# 持有者延长租约的间隔
+HEARTBEAT_INTERVAL = timedelta(seconds=20)
+# 等待其他进程释放租约时的轮询间隔（秒）
+WAIT_POLL_SECONDS = 2.0
+
+_config = Config.__table__
+
+
+class SyncLease:
+    """同步租约，获取成功后会在后台线程中持续发送心跳，直到 release。"""
+
+    def __init__(
+        self, ttl: timedelta = LEASE_TTL, heartbeat: timedelta = HEARTBEAT_INTERVAL
+    ) -> None:
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.ttl = ttl
+        self.heartbeat = heartbeat
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def try_acquire(self) -> bool:
+        """尝试获取租约，租约空闲或已经过期时获取成功。"""
+        now = datetime.now()
+        with db.engine.begin() as conn:
+            # 租约行不存在时先插入一行空闲的租约，INSERT ... WHERE NOT EXISTS 是原子的
+            conn.execute(
+                insert(_config).from_select(
+                    ["key", "value", "update_time"],
+                    select(literal(SYNC_LEASE_KEY), literal(""), literal(now)).where(
+                        ~exists().where(_config.c.key == SYNC_LEASE_KEY)
+                    ),
+                )
+            )
+            result = conn.execute(
+                update(_config)
+                .where(
+                    _config.c.key == SYNC_LEASE_KEY,
+                    or_(_config.c.value.is_(None), _config.c.value < _format_time(now)),
+                )
+                .values(value=self._lease_value(now), update_time=now)
+            )
+        if result.rowcount != 1:
+            return False
+
+        logging.info(f"已获取同步租约: {self.owner}")
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._heartbeat_loop, name="sync-lease-heartbeat", daemon=True
+        )
+        self._thread.start()
+        return True
+
+    def release(self) -> None:
+        """停止心跳并释放租约。"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        with db.engine.begin() as conn:
+            conn.execute(
+                update(_config)
+                .where(self._held_by_me())
+                .values(value="", update_time=datetime.now())
+            )
+        logging.info(f"已释放同步租约: {self.owner}")
+
+    def _heartbeat_loop(self) -> None:
+        while not self._stop.wait(self.heartbeat.total_seconds()):
+            try:
+                now = datetime.now()
+                with db.engine.begin() as conn:
+                    result = conn.execute(
+                        update(_config)
+                        .where(self._held_by_me())
+                        .values(value=self._lease_value(now), update_time=now)
+                    )
+                if result.rowcount != 1:
+                    logging.error(f"错误: 同步租约已丢失: {self.owner}")
+                    return
+            except Exception as e:
+                # 数据库暂时被占用时等待下一次心跳，租约有效期内仍然安全
+                logging.warning(f"警告: 同步租约心跳失败: {e}")
+
+    def _lease_value(self, now: datetime) -> str:
+        return f"{_format_time(now + self.ttl)}|{self.owner}"
+
+    def _held_by_me(self):
+        return (_config.c.key == SYNC_LEASE_KEY) & _config.c.value.endswith(
+            f"|{self.owner}", autoescape=True
+        )
+
+    def __enter__(self) -> "SyncLease":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.release()
+
+
+def wait_for_sync_lease(
+    lease: SyncLease,
+    on_wait: Callable[[], None] | None = None,
+    poll_seconds: float = WAIT_POLL_SECONDS,
+) -> bool:
+    """
+    阻塞直到获取租约。其他进程正在同步时，等待它完成或者租约过期。
+
+    Args:
+        lease: 需要获取的租约。
+        on_wait: 第一次需要等待时调用。
+        poll_seconds: 轮询间隔（秒）。
+
+    Returns:
+        bool: 是否等待过其他进程。
+    """
+    waited = False
+    while not lease.try_acquire():
+        if not waited:
+            logging.info("其他进程正在同步数据，等待其完成...")
+            if on_wait is not None:
+                on_wait()
+            waited = True
+        time.sleep(poll_seconds)
+    return waited
+
+
+def _format_time(value: datetime) -> str:
+    return value.isoformat(timespec="microseconds")
@@ -0,0 +1,56 @@
+import threading
+
+from service import background_sync
+from service.background_sync import SyncStatus, get_sync_progress, start_background_sync
+
+
+def test_start_background_sync_runs_once_and_reports_progress(monkeypatch):
+    release = threading.Event()
+    calls = []
+
+    def fake_sync(on_progress):
+        calls.append(1)
+        on_progress(["exchange_rate", "ticker_info"], 1, 4)
+        release.wait(5)
+        on_progress([], 4, 4)
+
+    monkeypatch.setattr(background_sync, "sync", fake_sync)
+    monkeypatch.setattr(background_sync, "is_synced_today", lambda: False)
+    monkeypatch.setattr(
+        background_sync, "refresh_ticker_symbol_universe", lambda: calls.append(2)
+    )
+    generation = get_sync_progress().generation
+
+    assert start_background_sync()
+    # 同步正在执行时不会重复启动
+    assert not start_background_sync()
+    progress = get_sync_progress()
+    assert progress.status == SyncStatus.RUNNING
+
+    release.set()
+    background_sync._thread.join(5)
+
+    progress = get_sync_progress()
+    # 同步完成后在同一个线程中刷新完整的股票列表
+    assert calls == [1, 2]
+    assert progress.status == SyncStatus.SUCCEEDED
+    assert progress.percent == 100
+    assert progress.generation == generation + 1
+
+
+def test_start_background_sync_backs_off_after_failure(monkeypatch):
+    def failing_sync(on_progress):
+        raise RuntimeError("network down")
+
+    monkeypatch.setattr(background_sync, "sync", failing_sync)
+    monkeypatch.setattr(background_sync, "is_synced_today", lambda: False)
+    monkeypatch.setattr(background_sync, "refresh_ticker_symbol_universe", lambda: None)
+
+    assert start_background_sync()
+    background_sync._thread.join(5)
+
+    progress = get_sync_progress()
+    assert progress.status == SyncStatus.FAILED
+    assert progress.error == "network down"
+    # 刚刚失败过，不会立即重试
+    assert not start_background_sync()
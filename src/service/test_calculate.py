@@ -0,0 +1,115 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
+import pandas as pd
+import pytest
+from sqlalchemy.orm import Session
+
+from db.entity import (
+    OPEN_END_DATE,
+    CurrencyType,
+    ExchangedRate,
+    StockAsset,
+    TickerInfo,
+)
+from service.calculate import (
+    PORTFOLIO_COLUMNS,
+    calculate_portfolio_timeseries,
+    portfolio_series,
+)
+
+TODAY = date.today()
+
+
+def _day(offset: int) -> date:
+    return TODAY - timedelta(offset)
+
+
+@pytest.fixture
+def engine(engine):
+    calculate_portfolio_timeseries.clear()
+    yield engine
+    calculate_portfolio_timeseries.clear()
+
+
+def test_calculate_portfolio_timeseries(engine):
+    with Session(engine) as session:
+        session.add_all(
+            [
+                # AAPL 持有 2 股，第 3 天起增加到 4 股
+                StockAsset(
+                    date=_day(5),
+                    end_date=_day(3),
+                    ticker="AAPL",
+                    shares=Decimal(2),
+                    price=Decimal(10),
+                ),
+                StockAsset(
+                    date=_day(3),
+                    end_date=OPEN_END_DATE,
+                    ticker="AAPL",
+                    shares=Decimal(4),
+                    price=Decimal(11),
+                ),
+                # 00700 只持有两天
+                StockAsset(
+                    date=_day(4),
+                    end_date=_day(2),
+                    ticker="00700",
+                    shares=Decimal(1),
+                    price=Decimal(100),
+                ),
+                TickerInfo(
+                    date=_day(5),
+                    ticker="AAPL",
+                    currency=Decimal(12),
+                    currency_type=CurrencyType.USD,
+                ),
+                TickerInfo(
+                    date=_day(2),
+                    ticker="AAPL",
+                    currency=Decimal(15),
+                    currency_type=CurrencyType.USD,
+                ),
+                TickerInfo(
+                    date=_day(4),
+                    ticker="00700",
+                    currency=Decimal(120),
+                    currency_type=CurrencyType.HKD,
+                ),
+                ExchangedRate(
+                    date=_day(5), currency_type=CurrencyType.HKD, rate=Decimal(8)
+                ),
+            ]
+        )
+        session.commit()
+
+    portfolio = calculate_portfolio_timeseries()
+
+    assert list(portfolio.columns) == PORTFOLIO_COLUMNS
+    aapl = portfolio[portfolio["Ticker"] == "AAPL"]
+    assert list(aapl["Date"]) == list(pd.date_range(_day(5), _day(1)))
+    assert aapl["Shares"].tolist() == [2, 2, 4, 4, 4]
+    assert aapl["Price"].tolist() == [24, 24, 48, 60, 60]
+    # 第一天没有前一天的价格
+    assert aapl["Earn"].isna().tolist() == [True] + [False] * 4
+    assert aapl["Earn"].tolist()[1:] == [0, 0, 12, 0]
+    assert aapl["TotalEarnRate"].tolist()[-1] == pytest.approx(400 / 11)
+
+    # 港股按汇率换算为美元，收益率按股票计价货币计算
+    hk = portfolio[portfolio["Ticker"] == "00700"]
+    assert list(hk["Date"]) == list(pd.date_range(_day(4), _day(3)))
+    assert hk["Price"].tolist() == [15, 15]
+    assert hk["CostBasis"].tolist() == [12.5, 12.5]
+    assert hk["TotalEarnRate"].tolist() == [20, 20]
+
+    earn = portfolio_series(portfolio, "Earn")
+    assert list(earn.columns) == ["Date", "Earn", "Ticker"]
+    assert len(earn) == len(portfolio) - 2
+
+
+def test_calculate_portfolio_timeseries_without_stocks(engine):
+    portfolio = calculate_portfolio_timeseries()
+
+    assert portfolio.empty
+    assert list(portfolio.columns) == PORTFOLIO_COLUMNS
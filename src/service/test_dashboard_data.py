@@ -0,0 +1,74 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
+import pandas as pd
+import pytest
+from sqlalchemy.orm import Session
+
+from db.entity import CurrencyType, ExchangedRate
+
+# dashboard_data 通过展示层的模块间接依赖 numerize 和 pyecharts
+pytest.importorskip("numerize")
+pytest.importorskip("pyecharts")
+
+from service.dashboard_data import (  # noqa: E402
+    _get_history_exchange_rates,
+    convert_current_currencies,
+    convert_history,
+)
+
+
+@pytest.fixture
+def engine(engine):
+    _get_history_exchange_rates.clear()
+    with Session(engine) as session:
+        session.add_all(
+            ExchangedRate(date=day, currency_type=CurrencyType.CNY, rate=Decimal(rate))
+            for day, rate in [
+                # 2024-01-06、07 是周末，没有汇率
+                (date(2024, 1, 5), "7"),
+                (date(2024, 1, 8), "7.2"),
+                (date.today() - timedelta(3), "7.1"),
+            ]
+        )
+        session.commit()
+    yield engine
+    _get_history_exchange_rates.clear()
+
+
+def _history() -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "Date": pd.to_datetime(["2024-01-05", "2024-01-06", "2024-01-08"]),
+            "Value": [10.0, 10.0, 1.234],
+        }
+    )
+
+
+def test_convert_history_uses_rate_of_each_date(engine):
+    history = _history()
+
+    converted = convert_history(history, "Value", CurrencyType.CNY)
+
+    # 周末沿用周五的汇率，结果保留两位小数
+    assert converted["Value"].tolist() == [70, 70, 8.88]
+    assert converted["Date"].tolist() == history["Date"].tolist()
+    pd.testing.assert_frame_equal(history, _history())
+
+
+def test_convert_history_keeps_usd(engine):
+    history = _history()
+
+    assert convert_history(history, "Value", CurrencyType.USD) is history
+    pd.testing.assert_frame_equal(history, _history())
+
+
+def test_convert_current_currencies(engine):
+    currencies = [("USD", 10.0), ("CNY", 2.5)]
+
+    # 使用昨天之前最近一天的汇率
+    assert convert_current_currencies(currencies, CurrencyType.CNY) == [
+        ("USD", 71.0),
+        ("CNY", 17.75),
+    ]
+    assert convert_current_currencies(currencies, CurrencyType.USD) is currencies
@@ -0,0 +1,104 @@
+from datetime import date
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from db.entity import CurrencyType, ExchangedRate
+from service.fx import (
+    CrossRates,
+    convert,
+    get_exchange_rate_matrix,
+    get_latest_cross_rates,
+)
+
+
+@pytest.fixture
+def engine(engine):
+    with Session(engine) as session:
+        session.add_all(
+            ExchangedRate(
+                date=date(2024, 1, day),
+                currency_type=currency_type,
+                rate=Decimal(rate),
+            )
+            for currency_type, rates in [
+                (CurrencyType.CNY, [(1, "7"), (5, "7.2")]),
+                (CurrencyType.HKD, [(4, "8")]),
+            ]
+            for day, rate in rates
+        )
+        session.commit()
+    return engine
+
+
+def test_get_exchange_rate_matrix_fills_as_of(engine):
+    statements = []
+    event.listen(
+        engine, "before_cursor_execute", lambda *args: statements.append(args[2])
+    )
+
+    rates = get_exchange_rate_matrix(date(2024, 1, 3), date(2024, 1, 6))
+
+    assert len(statements) == 1
+    assert list(rates.index) == list(pd.date_range("2024-01-03", "2024-01-06"))
+    assert list(rates.columns) == list(CurrencyType)
+    assert rates[CurrencyType.USD].tolist() == [1, 1, 1, 1]
+    # 区间开始前最近一天的汇率向后填充
+    assert rates[CurrencyType.CNY].tolist() == [7, 7, Decimal("7.2"), Decimal("7.2")]
+    assert rates[CurrencyType.HKD].isna().tolist() == [True, False, False, False]
+
+
+def test_convert(engine):
+    rates = get_exchange_rate_matrix(date(2024, 1, 3), date(2024, 1, 6))
+    dates = [date(2024, 1, 3), date(2024, 1, 5), date(2024, 1, 6)]
+
+    usd = convert([70, 72, 80], CurrencyType.CNY, CurrencyType.USD, dates, rates)
+    assert usd.tolist() == pytest.approx([10, 10, 80 / 7.2])
+
+    # 每个金额可以有自己的货币，找不到汇率时为 NaN
+    mixed = convert(
+        [70, 16, 5],
+        [CurrencyType.CNY, CurrencyType.HKD, CurrencyType.USD],
+        CurrencyType.HKD,
+        [date(2024, 1, 3), date(2024, 1, 4), date(2024, 1, 6)],
+        rates,
+    )
+    assert np.isnan(mixed[0])
+    assert mixed[1:].tolist() == [16, 40]
+
+    # 日期和货币可以广播成矩阵
+    matrix = convert(
+        np.ones((2, 2)),
+        [CurrencyType.USD, CurrencyType.CNY],
+        CurrencyType.USD,
+        np.array(dates[:2], dtype="datetime64[D]")[:, np.newaxis],
+        rates,
+    )
+    assert matrix == pytest.approx(np.array([[1, 1 / 7], [1, 1 / 7.2]]))
+
+
+def test_convert_queries_rates_for_dates(engine):
+    assert convert(
+        [7], CurrencyType.CNY, CurrencyType.USD, [date(2024, 1, 2)]
+    ).tolist() == [1]
+
+
+def test_get_latest_cross_rates(engine):
+    cross_rates = get_latest_cross_rates()
+
+    assert cross_rates.rate(CurrencyType.USD, CurrencyType.CNY) == 7.2
+    assert cross_rates.rate(CurrencyType.HKD, CurrencyType.CNY) == pytest.approx(0.9)
+    assert cross_rates.convert(16, CurrencyType.HKD, CurrencyType.USD) == 2
+    assert cross_rates.convert(3, CurrencyType.CNY, CurrencyType.CNY) == 3
+
+
+def test_cross_rates_raises_on_missing_rate():
+    cross_rates = CrossRates({CurrencyType.CNY: Decimal("7.2")})
+
+    assert cross_rates.convert(1, CurrencyType.USD, CurrencyType.CNY) == 7.2
+    with pytest.raises(ValueError):
+        cross_rates.convert(1, CurrencyType.CNY, CurrencyType.HKD)
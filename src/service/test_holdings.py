@@ -0,0 +1,120 @@
+from datetime import date
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from db.common import Base
+from db.entity import OPEN_END_DATE, AssetType, CurrencyAsset, CurrencyType, StockAsset
+from service.holdings import (
+    get_currency_holding_as_of,
+    get_holdings_as_of,
+    get_stock_holding_as_of,
+    iter_daily_holdings,
+    split_into_intervals,
+)
+
+
+def test_split_into_intervals():
+    one, two = (Decimal(1),), (Decimal(2),)
+    changes = [
+        (date(2024, 1, 3), one),
+        (date(2024, 1, 5), two),
+        (date(2024, 1, 6), two),
+        (date(2024, 1, 8), None),
+        (date(2024, 1, 10), one),
+    ]
+
+    # 值不变的日期被忽略，持仓归零的期间没有区间
+    assert split_into_intervals(None, changes) == (
+        OPEN_END_DATE,
+        [
+            (date(2024, 1, 3), date(2024, 1, 5), one),
+            (date(2024, 1, 5), date(2024, 1, 8), two),
+            (date(2024, 1, 10), OPEN_END_DATE, one),
+        ],
+    )
+    # 第一次变化时结束初始持仓所在的区间
+    assert split_into_intervals(one, changes[1:]) == (
+        date(2024, 1, 5),
+        [
+            (date(2024, 1, 5), date(2024, 1, 8), two),
+            (date(2024, 1, 10), OPEN_END_DATE, one),
+        ],
+    )
+    assert split_into_intervals(one, []) == (OPEN_END_DATE, [])
+
+
+@pytest.fixture
+def session():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add_all(
+            [
+                StockAsset(
+                    date=date(2024, 1, 2),
+                    end_date=date(2024, 1, 5),
+                    type=AssetType.TICKER,
+                    ticker="AAPL",
+                    shares=Decimal(10),
+                    price=Decimal(100),
+                ),
+                StockAsset(
+                    date=date(2024, 1, 5),
+                    end_date=date(2024, 1, 9),
+                    type=AssetType.TICKER,
+                    ticker="AAPL",
+                    shares=Decimal(5),
+                    price=Decimal(100),
+                ),
+                CurrencyAsset(
+                    date=date(2024, 1, 1),
+                    type=AssetType.CURRENCY,
+                    currency=Decimal(1000),
+                    currency_type=CurrencyType.CNY,
+                ),
+            ]
+        )
+        session.commit()
+        yield session
+    engine.dispose()
+
+
+def test_holdings_as_of(session):
+    assert get_stock_holding_as_of(session, "AAPL", date(2024, 1, 1)) is None
+    assert get_stock_holding_as_of(session, "AAPL", date(2024, 1, 4)).shares == 10
+    assert get_stock_holding_as_of(session, "AAPL", date(2024, 1, 5)).shares == 5
+    # 区间结束日期不包含在内，之后已经清仓
+    assert get_stock_holding_as_of(session, "AAPL", date(2024, 1, 9)) is None
+
+    cny = get_currency_holding_as_of(session, CurrencyType.CNY, date(2030, 1, 1))
+    assert cny.currency == 1000
+    assert (
+        get_currency_holding_as_of(session, CurrencyType.HKD, date(2030, 1, 1)) is None
+    )
+
+    assert {
+        type(holding) for holding in get_holdings_as_of(session, date(2024, 1, 6))
+    } == {StockAsset, CurrencyAsset}
+    assert get_holdings_as_of(session, date(2024, 1, 6), StockAsset)[0].shares == 5
+
+
+def test_iter_daily_holdings(session):
+    holdings = get_holdings_as_of(session, date(2024, 1, 2)) + get_holdings_as_of(
+        session, date(2024, 1, 5), StockAsset
+    )
+    holdings.sort(key=lambda holding: holding.date)
+
+    daily = {
+        day: sorted(str(getattr(h, "shares", None) or h.currency) for h in active)
+        for day, active in iter_daily_holdings(
+            holdings, date(2024, 1, 4), date(2024, 1, 9)
+        )
+    }
+
+    assert daily[date(2024, 1, 4)] == ["10", "1000"]
+    assert daily[date(2024, 1, 5)] == ["1000", "5"]
+    assert daily[date(2024, 1, 8)] == ["1000", "5"]
+    assert daily[date(2024, 1, 9)] == ["1000"]
@@ -0,0 +1,164 @@
+import random
+from decimal import Decimal
+
+import pandas as pd
+
+from db.entity import OPEN_END_DATE
+from service.holdings import split_into_intervals
+from service.position import compute_position_changes
+
+
+def _legacy_daily_positions(
+    trades: pd.DataFrame,
+    date_range: pd.DatetimeIndex,
+    seed: tuple[Decimal, Decimal] = (Decimal(0), Decimal(0)),
+) -> list[tuple[Decimal, Decimal]]:
+    """原先逐日迭代的 Decimal 实现，作为对照。"""
+    summary = {}
+    for d, x in trades.groupby("date"):
+        shares_change = x["shares"].sum()
+        summary[d] = (
+            shares_change,
+            (x["shares"] * x["price"]).sum() / shares_change
+            if shares_change != 0
+            else Decimal(0),
+        )
+
+    current_shares, current_cost = seed
+    res = []
+    for d in date_range:
+        shares_change, price = summary.get(d, (Decimal(0), Decimal(0)))
+        if shares_change != 0:
+            new_total_cost = current_cost * current_shares + price * shares_change
+            current_shares = current_shares + shares_change
+            if current_shares != 0:
+                current_cost = new_total_cost / current_shares
+            else:
+                current_cost = Decimal(0)
+        res.append((current_shares, current_cost))
+    return res
+
+
+def _random_trades(rng: random.Random, date_range: pd.DatetimeIndex) -> pd.DataFrame:
+    rows = []
+    holding = 0
+    for _ in range(40):
+        d = rng.choice(date_range[:-1])
+        shares = rng.randint(1, 30)
+        if holding and rng.random() < 0.4:
+            # 卖出，偶尔全部清仓
+            shares = -holding if rng.random() < 0.3 else -min(shares, holding)
+        holding += shares
+        rows.append(
+            {
+                "date": d,
+                "ticker": "AAPL",
+                "shares": Decimal(shares),
+                "price": Decimal(str(round(rng.uniform(10, 500), 2))),
+            }
+        )
+    return pd.DataFrame(rows)
+
+
+def _assert_close(expected: Decimal, actual: Decimal) -> None:
+    assert abs(expected - actual) <= Decimal("1e-20") * max(1, abs(expected))
+
+
+def _daily_from_intervals(
+    seed_end,
+    intervals,
+    date_range: pd.DatetimeIndex,
+    seed: tuple[Decimal, Decimal] = (Decimal(0), Decimal(0)),
+) -> list[tuple[Decimal, Decimal]]:
+    """把持仓区间展开成每一天的 (持股数量, 平均成本)，没有区间的日期为 0。"""
+    res = []
+    for d in date_range.date:
+        values = seed if d < seed_end else (Decimal(0), Decimal(0))
+        for interval_start, interval_end, interval_values in intervals:
+            if interval_start <= d < interval_end:
+                values = interval_values
+        res.append(values)
+    return res
+
+
+def _intervals(
+    changes: pd.DataFrame, seed: tuple[Decimal, Decimal] | None = None
+) -> tuple:
+    return split_into_intervals(
+        seed,
+        (
+            (d.date(), (row.shares, row.price) if row.shares != 0 else None)
+            for d, row in zip(changes.index, changes.itertuples())
+        ),
+    )
+
+
+def test_compute_position_changes_matches_legacy():
+    rng = random.Random(42)
+    date_range = pd.date_range("2023-01-01", "2023-12-31")
+    for _ in range(20):
+        trades = _random_trades(rng, date_range)
+
+        expected = _legacy_daily_positions(trades, date_range)
+        seed_end, intervals = _intervals(compute_position_changes(trades))
+        actual = _daily_from_intervals(seed_end, intervals, date_range)
+
+        assert seed_end == OPEN_END_DATE
+        assert len(actual) == len(date_range)
+        for (shares, price), (actual_shares, actual_price) in zip(expected, actual):
+            assert actual_shares == shares
+            _assert_close(price, actual_price)
+
+
+def test_compute_position_changes_with_seed():
+    date_range = pd.date_range("2023-01-01", "2023-01-10")
+    trades = pd.DataFrame(
+        [
+            # 同一天买卖相抵，不影响持仓和成本
+            {
+                "date": pd.Timestamp("2023-01-03"),
+                "ticker": "AAPL",
+                "shares": Decimal("5"),
+                "price": Decimal("10"),
+            },
+            {
+                "date": pd.Timestamp("2023-01-03"),
+                "ticker": "AAPL",
+                "shares": Decimal("-5"),
+                "price": Decimal("12"),
+            },
+            {
+                "date": pd.Timestamp("2023-01-05"),
+                "ticker": "AAPL",
+                "shares": Decimal("10"),
+                "price": Decimal("130"),
+            },
+        ]
+    )
+    seed = (Decimal("10"), Decimal("100"))
+
+    changes = compute_position_changes(trades, *seed)
+    seed_end, intervals = _intervals(changes, seed)
+
+    # 买卖相抵的那天与初始持仓相同，初始持仓的区间到第二笔交易才结束
+    assert seed_end == pd.Timestamp("2023-01-05").date()
+    assert intervals == [
+        (seed_end, OPEN_END_DATE, (Decimal("20"), Decimal("115"))),
+    ]
+    expected = _legacy_daily_positions(trades, date_range, seed)
+    assert _daily_from_intervals(seed_end, intervals, date_range, seed) == expected
+
+
+def test_compute_position_changes_resets_cost_when_closed():
+    trades = pd.DataFrame(
+        {
+            "date": pd.to_datetime(["2023-01-01", "2023-01-02", "2023-01-03"]),
+            "shares": [Decimal("10"), Decimal("-10"), Decimal("4")],
+            "price": [Decimal("100"), Decimal("150"), Decimal("20")],
+        }
+    )
+
+    changes = compute_position_changes(trades)
+
+    assert changes["shares"].tolist() == [Decimal("10"), Decimal("0"), Decimal("4")]
+    assert changes["price"].tolist() == [Decimal("100"), Decimal("0"), Decimal("20")]
@@ -0,0 +1,95 @@
+import pytest
+from sqlalchemy.orm import Session
+
+from db.entity import TickerSymbol, TickerType
+from service import symbol_resolver
+from service.symbol_resolver import (
+    SymbolResolver,
+    get_symbol_resolver,
+    invalidate_symbol_resolver,
+)
+
+SYMBOLS = [
+    ("106.BABA", "阿里巴巴", TickerType.USD),
+    ("105.AAPL", "苹果", TickerType.USD),
+    ("106.AAPLX", "不存在的股票", TickerType.USD),
+    ("107.AAPL", "重复的苹果", TickerType.USD),
+    ("105.PL", "Planet Labs", TickerType.USD),
+    ("01700", "某港股", TickerType.HKD),
+    ("00700", "腾讯控股", TickerType.HKD),
+    ("09988", "阿里巴巴-W", TickerType.HKD),
+]
+
+
+@pytest.fixture
+def engine(engine):
+    with Session(engine) as session:
+        session.add_all(
+            TickerSymbol(symbol=s, name=n, ticker_type=t) for s, n, t in SYMBOLS
+        )
+        session.commit()
+    invalidate_symbol_resolver()
+    yield engine
+    invalidate_symbol_resolver()
+
+
+def _like_first(engine, query: str) -> str | None:
+    with Session(engine) as session:
+        symbol = (
+            session.query(TickerSymbol)
+            .filter(TickerSymbol.symbol.like(f"%{query}"))
+            .first()
+        )
+        return symbol.symbol if symbol else None
+
+
+@pytest.mark.parametrize(
+    "query", ["BABA", "baba", "AAPLX", "09988", "9988", "ZZZZ", "00700"]
+)
+def test_resolve_matches_like_suffix_scan(engine, query):
+    resolved = get_symbol_resolver().resolve(query)
+
+    assert (resolved.symbol if resolved else None) == _like_first(engine, query)
+
+
+def test_resolve_prefers_exact_and_code_matches(engine):
+    resolver = get_symbol_resolver()
+
+    # 去掉交易所前缀后完全一致的代码，优先于只是后缀相同的代码
+    assert resolver.resolve("AAPL").symbol == "105.AAPL"
+    assert resolver.resolve("PL").symbol == "105.PL"
+    assert resolver.resolve("105.AAPL").name == "苹果"
+    # 港股代码可以省略前导零，同时匹配多个时取 id 最小的一条
+    assert resolver.resolve("700").symbol == "01700"
+    assert resolver.resolve(" ") is None
+
+
+def test_resolver_is_cached_until_invalidated(engine):
+    resolver = get_symbol_resolver()
+    assert get_symbol_resolver() is resolver
+
+    with Session(engine) as session:
+        session.add(TickerSymbol(symbol="105.NVDA", ticker_type=TickerType.USD))
+        session.commit()
+    assert get_symbol_resolver().resolve("NVDA") is None
+
+    invalidate_symbol_resolver()
+    assert get_symbol_resolver().resolve("NVDA").symbol == "105.NVDA"
+
+
+def test_empty_resolver_is_not_cached(engine):
+    with Session(engine) as session:
+        session.query(TickerSymbol).delete()
+        session.commit()
+    invalidate_symbol_resolver()
+
+    assert len(get_symbol_resolver()) == 0
+    assert symbol_resolver._resolver is None
+
+
+def test_resolver_handles_unsaved_symbols():
+    resolver = SymbolResolver(
+        [TickerSymbol(symbol="105.MSFT", ticker_type=TickerType.USD)]
+    )
+
+    assert resolver.resolve("msft").symbol == "105.MSFT"
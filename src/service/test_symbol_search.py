@@ -0,0 +1,96 @@
+import os
+import random
+import string
+import time
+
+import pytest
+
+from db.entity import TickerSymbol, TickerType
+from service.symbol_search import SymbolSearchIndex
+
+
+def _symbol(id: int, symbol: str, name: str, ticker_type=TickerType.USD):
+    return TickerSymbol(id=id, symbol=symbol, name=name, ticker_type=ticker_type)
+
+
+SYMBOLS = [
+    _symbol(1, "105.AAPL", "苹果"),
+    _symbol(2, "105.AAP", "Advance Auto Parts"),
+    _symbol(3, "106.BABA", "阿里巴巴"),
+    _symbol(4, "00700", "腾讯控股", TickerType.HKD),
+    _symbol(5, "09988", "阿里巴巴-W", TickerType.HKD),
+    _symbol(6, "105.TCEHY", "腾讯控股ADR"),
+]
+
+
+def _search(query: str, limit: int = 10) -> list[str]:
+    return [s.symbol for s in SymbolSearchIndex(SYMBOLS).search(query, limit)]
+
+
+def test_search_ranks_exact_then_prefix_then_substring():
+    # 完全匹配的代码排在前缀匹配之前
+    assert _search("aap") == ["105.AAP", "105.AAPL"]
+    assert _search("AAPL") == ["105.AAPL"]
+    # 港股代码前缀
+    assert _search("007") == ["00700"]
+
+
+def test_search_matches_chinese_names():
+    assert _search("腾讯") == ["00700", "105.TCEHY"]
+    # 名称中间的字符通过二元组索引匹配
+    assert _search("控股") == ["00700", "105.TCEHY"]
+    assert _search("巴巴") == ["106.BABA", "09988"]
+    assert _search("阿里巴巴", limit=1) == ["106.BABA"]
+
+
+def test_search_handles_empty_and_missing():
+    assert _search("  ") == []
+    assert _search("不存在") == []
+    assert _search("Z") == []
+
+
+def _full_universe() -> tuple[SymbolSearchIndex, list[str]]:
+    """构造与完整股票列表规模相当的索引，以及一组代码前缀和名称片段查询。"""
+    rng = random.Random(0)
+    chinese = "腾讯阿里巴巴控股科技银行集团中国香港能源地产汽车医药电子保险证券"
+    symbols = []
+    for i in range(12000):
+        code = "".join(rng.choices(string.ascii_uppercase, k=rng.randint(1, 5)))
+        name = " ".join(
+            "".join(rng.choices(string.ascii_letters, k=rng.randint(3, 8)))
+            for _ in range(rng.randint(1, 3))
+        )
+        symbols.append(_symbol(i, f"{rng.choice([105, 106, 107])}.{code}", name))
+    for i in range(12000, 16000):
+        name = "".join(rng.choices(chinese, k=rng.randint(2, 6)))
+        symbols.append(_symbol(i, f"{i - 12000:05d}", name, TickerType.HKD))
+
+    queries = [
+        s.symbol.rpartition(".")[2][:n]
+        for s in rng.sample(symbols, 200)
+        for n in (1, 2, 3)
+    ]
+    queries += [s.name[1:3] for s in rng.sample(symbols, 200)]
+    return SymbolSearchIndex(symbols), queries
+
+
+def test_search_full_universe():
+    index, queries = _full_universe()
+
+    for query in queries:
+        assert index.search(query)
+
+
+# 耗时与机器负载有关，只在设置了 FINANCE_RUN_BENCHMARKS 时执行
+@pytest.mark.skipif(
+    not os.environ.get("FINANCE_RUN_BENCHMARKS"), reason="性能基准测试默认不执行"
+)
+def test_search_is_fast_on_full_universe():
+    index, queries = _full_universe()
+
+    start_time = time.perf_counter()
+    for query in queries:
+        index.search(query)
+    elapsed_time = (time.perf_counter() - start_time) / len(queries)
+
+    assert elapsed_time < 0.001
@@ -0,0 +1,656 @@
+import json
+import threading
+from datetime import date, timedelta
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import delete, select, update
+from sqlalchemy.orm import Session
+
+from db.entity import (
+    OPEN_END_DATE,
+    Account,
+    CurrencyType,
+    DirtyDate,
+    ExchangedRate,
+    StockAsset,
+    StockTransaction,
+    TickerInfo,
+    TickerSymbol,
+    TickerType,
+    TransactionType,
+)
+from service import sync
+from service.symbol_resolver import invalidate_symbol_resolver
+from service.sync import SyncStage, run_sync_stages
+
+
+def test_run_sync_stages_runs_independent_stages_concurrently():
+    events = []
+    lock = threading.Lock()
+    # a、b、c 只有同时在运行才能全部通过屏障，串行执行时会超时抛出 BrokenBarrierError
+    barrier = threading.Barrier(3, timeout=10)
+
+    def stage(name: str, wait: bool):
+        def run(executor):
+            with lock:
+                events.append(("start", name))
+            if wait:
+                barrier.wait()
+            with lock:
+                events.append(("end", name))
+
+        return run
+
+    stages = [
+        SyncStage("a", stage("a", True)),
+        SyncStage("b", stage("b", True)),
+        SyncStage("c", stage("c", True)),
+        SyncStage("d", stage("d", False), depends_on=("a", "b", "c")),
+    ]
+
+    durations = run_sync_stages(stages)
+
+    assert set(durations) == {"a", "b", "c", "d"}
+    # d 必须在 a、b、c 全部结束之后才开始
+    assert events.index(("start", "d")) > max(
+        events.index(("end", name)) for name in "abc"
+    )
+
+
+def test_run_sync_stages_shares_executor_with_stages():
+    def fan_out(executor):
+        # 阶段内部使用共享线程池提交子任务，不应该死锁
+        assert list(executor.map(lambda x: x * 2, range(50))) == list(range(0, 100, 2))
+
+    run_sync_stages(
+        [SyncStage(str(i), fan_out) for i in range(4)],
+        max_workers=1,
+    )
+
+
+def test_run_sync_stages_stops_dependents_on_failure():
+    ran = []
+
+    def fail(executor):
+        raise RuntimeError("boom")
+
+    stages = [
+        SyncStage("a", fail),
+        SyncStage("b", lambda executor: ran.append("b"), depends_on=("a",)),
+    ]
+
+    with pytest.raises(RuntimeError, match="boom"):
+        run_sync_stages(stages)
+    assert ran == []
+
+
+def test_run_sync_stages_rejects_unknown_dependency():
+    with pytest.raises(ValueError):
+        run_sync_stages([SyncStage("a", lambda executor: None, depends_on=("x",))])
+
+
+def test_run_sync_stages_reports_progress():
+    reports = []
+    stages = [
+        SyncStage("a", lambda executor: None),
+        SyncStage("b", lambda executor: None, depends_on=("a",)),
+    ]
+
+    run_sync_stages(
+        stages,
+        on_progress=lambda running, done, total: reports.append((running, done, total)),
+    )
+
+    assert reports[0] == (["a"], 0, 2)
+    assert (["b"], 1, 2) in reports
+    assert reports[-1] == ([], 2, 2)
+
+
+def _add_transaction(engine, days_ago: int, ticker: str = "AAPL") -> None:
+    with Session(engine) as session:
+        session.add(
+            StockTransaction(
+                date=date.today() - timedelta(days_ago),
+                type=TransactionType.BUY,
+                ticker=ticker,
+                shares=Decimal(1),
+                price=Decimal(100),
+            )
+        )
+        session.commit()
+
+
+def _stub_exchange_rates(monkeypatch) -> list[list[date]]:
+    """替换汇率接口，返回每次调用请求的日期。"""
+    requests = []
+
+    def get_exchange_rates(dates):
+        requests.append(list(dates))
+        return [
+            (d, {"USD": Decimal(1), "CNY": Decimal(7), "HKD": Decimal(8)})
+            for d in dates
+        ]
+
+    monkeypatch.setattr(sync.currency, "get_exchange_rates", get_exchange_rates)
+    return requests
+
+
+def test_sync_exchange_rate_fetches_only_missing_dates(engine, monkeypatch):
+    monkeypatch.setattr(sync, "engine", engine)
+    requests = _stub_exchange_rates(monkeypatch)
+    today = date.today()
+    _add_transaction(engine, 5)
+    with Session(engine) as session:
+        # 第 5、4 天已经完整，第 3 天缺少港币
+        session.add_all(
+            ExchangedRate(
+                date=today - timedelta(days_ago),
+                currency_type=currency_type,
+                rate=Decimal(9),
+            )
+            for days_ago, currencies in [
+                (5, list(CurrencyType)),
+                (4, list(CurrencyType)),
+                (3, [CurrencyType.USD, CurrencyType.CNY]),
+            ]
+            for currency_type in currencies
+        )
+        session.commit()
+
+    sync.sync_exchange_rate()
+
+    assert requests == [[today - timedelta(days_ago) for days_ago in (3, 2, 1)]]
+    with Session(engine) as session:
+        rates = {
+            ((today - rate.date).days, rate.currency_type): rate.rate
+            for rate in session.scalars(select(ExchangedRate))
+        }
+    assert len(rates) == 15
+    # 已有的组合保留原来的值，只补上缺少的
+    assert rates[(3, CurrencyType.CNY)] == 9
+    assert rates[(3, CurrencyType.HKD)] == 8
+
+    # 已经完整时不会再请求
+    sync.sync_exchange_rate()
+    assert len(requests) == 1
+
+
+def test_sync_exchange_rate_full_refetches_everything(engine, monkeypatch):
+    monkeypatch.setattr(sync, "engine", engine)
+    requests = _stub_exchange_rates(monkeypatch)
+    today = date.today()
+    _add_transaction(engine, 3)
+    with Session(engine) as session:
+        session.add_all(
+            ExchangedRate(
+                date=today - timedelta(days_ago),
+                currency_type=currency_type,
+                rate=Decimal(9),
+            )
+            for days_ago in (3, 2, 1)
+            for currency_type in CurrencyType
+        )
+        session.commit()
+
+    sync.sync_exchange_rate(full=True)
+
+    assert requests == [[today - timedelta(days_ago) for days_ago in (3, 2, 1)]]
+    with Session(engine) as session:
+        assert {
+            (rate.currency_type, rate.rate)
+            for rate in session.scalars(select(ExchangedRate))
+        } == {
+            (CurrencyType.USD, 1),
+            (CurrencyType.CNY, 7),
+            (CurrencyType.HKD, 8),
+        }
+        assert session.query(ExchangedRate).count() == 9
+
+
+def test_get_ticker_data_to_fetch(engine, monkeypatch):
+    monkeypatch.setattr(
+        sync,
+        "search_ticker_symbol",
+        lambda ticker: TickerSymbol(
+            symbol=ticker, name=None, ticker_type=TickerType.USD
+        ),
+    )
+    today = date.today()
+    for ticker, days_ago in [
+        ("NEW", 10),
+        ("OLD", 10),
+        ("EARLY", 10),
+        ("EARLY", 20),
+        ("DONE", 10),
+    ]:
+        _add_transaction(engine, days_ago, ticker)
+    with Session(engine) as session:
+        session.add_all(
+            TickerInfo(
+                date=today - timedelta(days_ago),
+                ticker=ticker,
+                currency=Decimal(100),
+                currency_type=CurrencyType.USD,
+            )
+            for ticker, days_ago in [("OLD", 3), ("EARLY", 3), ("DONE", 1)]
+        )
+        # EARLY 上一次按第 10 天回填，之后补录了第 20 天的交易
+        sync._set_config_value(
+            session,
+            sync.TICKER_BACKFILL_STARTS,
+            json.dumps(
+                {
+                    ticker: (today - timedelta(10)).strftime(sync.DATE_FORMAT)
+                    for ticker in ("OLD", "EARLY", "DONE")
+                }
+            ),
+        )
+        session.commit()
+
+        plan = {
+            ticker: (start, backfill)
+            for ticker, start, _, backfill in sync._get_ticker_data_to_fetch(session)
+        }
+        full_plan = sync._get_ticker_data_to_fetch(session, full=True)
+
+    assert plan == {
+        # 新股票从首次交易日期全量回填
+        "NEW": (today - timedelta(10), True),
+        # 已有的股票从最后一个收盘价的下一天开始增量获取
+        "OLD": (today - timedelta(2), False),
+        # 首次交易日期提前，重新全量回填
+        "EARLY": (today - timedelta(20), True),
+    }
+    # 全量模式下每只股票都从首次交易日期回填
+    assert {ticker: (start, backfill) for ticker, start, _, backfill in full_plan} == {
+        "NEW": (today - timedelta(10), True),
+        "OLD": (today - timedelta(10), True),
+        "EARLY": (today - timedelta(20), True),
+        "DONE": (today - timedelta(10), True),
+    }
+
+
+def _stored_symbols(engine) -> dict[str, str]:
+    with Session(engine) as session:
+        rows = session.execute(select(TickerSymbol.symbol, TickerSymbol.name))
+        return {symbol: name for symbol, name in rows}
+
+
+def test_sync_ticker_symbols_applies_differences(engine):
+    universe = [("苹果", "105.AAPL"), ("微软", "105.MSFT"), ("老股票", "105.OLD")]
+    fetch_calls = []
+
+    def fetch():
+        fetch_calls.append(1)
+        return list(universe)
+
+    sync._sync_ticker_symbols(TickerType.USD, fetch)
+    assert _stored_symbols(engine) == {
+        "105.AAPL": "苹果",
+        "105.MSFT": "微软",
+        "105.OLD": "老股票",
+    }
+
+    # 刷新间隔内不会再次请求
+    sync._sync_ticker_symbols(TickerType.USD, fetch)
+    assert len(fetch_calls) == 1
+
+    with Session(engine) as session:
+        session.add(
+            StockTransaction(
+                date=date(2024, 1, 1),
+                type=TransactionType.BUY,
+                ticker="105.OLD",
+                shares=Decimal(1),
+                price=Decimal(1),
+            )
+        )
+        session.commit()
+        aapl_id = session.scalar(
+            select(TickerSymbol.id).where(TickerSymbol.symbol == "105.AAPL")
+        )
+
+    universe = [("苹果公司", "105.AAPL"), ("英伟达", "105.NVDA")]
+    sync._sync_ticker_symbols(TickerType.USD, fetch, force=True)
+
+    # 新增、改名和退市都被应用，仍有交易记录的股票保留
+    assert _stored_symbols(engine) == {
+        "105.AAPL": "苹果公司",
+        "105.NVDA": "英伟达",
+        "105.OLD": "老股票",
+    }
+    with Session(engine) as session:
+        assert session.get(TickerSymbol, aapl_id).name == "苹果公司"
+
+
+def test_sync_ticker_symbols_fills_names_of_looked_up_symbols(engine):
+    universe = [("苹果", "105.AAPL"), ("微软", "105.MSFT")]
+    sync._sync_ticker_symbols(TickerType.USD, lambda: universe)
+
+    # 定向查询在两次刷新之间保存了一个没有名称的代码
+    with Session(engine) as session:
+        session.add(TickerSymbol(symbol="105.MSFT", ticker_type=TickerType.USD))
+        session.execute(delete(TickerSymbol).where(TickerSymbol.name == "微软"))
+        session.commit()
+
+    # 列表的哈希没有变化，仍然补齐名称
+    sync._sync_ticker_symbols(TickerType.USD, lambda: universe, force=True)
+
+    assert _stored_symbols(engine) == {"105.AAPL": "苹果", "105.MSFT": "微软"}
+
+
+def test_sync_ticker_symbols_ignores_truncated_list(engine):
+    universe = [(f"股票{i}", f"105.T{i}") for i in range(10)]
+    sync._sync_ticker_symbols(TickerType.USD, lambda: universe)
+
+    sync._sync_ticker_symbols(TickerType.USD, lambda: universe[:2], force=True)
+
+    assert len(_stored_symbols(engine)) == 10
+
+
+def test_search_ticker_symbol_looks_up_missing_symbols(engine, monkeypatch):
+    lookups = []
+
+    def find_us_symbol(code):
+        lookups.append(code)
+        return "106.BABA" if code == "BABA" else None
+
+    monkeypatch.setattr(sync, "find_us_symbol", find_us_symbol)
+    monkeypatch.setattr(sync, "find_hk_symbol", lambda code: code.zfill(5))
+    invalidate_symbol_resolver()
+
+    baba = sync.search_ticker_symbol("BABA")
+    assert (baba.symbol, baba.ticker_type) == ("106.BABA", TickerType.USD)
+    tencent = sync.search_ticker_symbol("700")
+    assert (tencent.symbol, tencent.ticker_type) == ("00700", TickerType.HKD)
+    assert sync.search_ticker_symbol("ZZZZ") is None
+    assert sync.search_ticker_symbol("QQQQ", lookup=False) is None
+
+    # 查询到的代码已经保存，不会再次定向查询
+    assert sync.search_ticker_symbol("BABA").symbol == "106.BABA"
+    assert lookups == ["BABA", "ZZZZ"]
+    assert _stored_symbols(engine) == {"106.BABA": None, "00700": None}
+    invalidate_symbol_resolver()
+
+
+def _stock_intervals(engine) -> list[tuple]:
+    with Session(engine) as session:
+        return [
+            (asset.date, asset.end_date, asset.shares, asset.price)
+            for asset in session.scalars(select(StockAsset).order_by(StockAsset.date))
+        ]
+
+
+def test_sync_asset_stores_position_intervals(engine, monkeypatch):
+    monkeypatch.setattr(sync, "engine", engine)
+    today = date.today()
+
+    def trade(days_ago, kind, shares):
+        return StockTransaction(
+            date=today - timedelta(days_ago),
+            type=kind,
+            ticker="AAPL",
+            shares=Decimal(shares),
+            price=Decimal(100),
+        )
+
+    with Session(engine) as session:
+        session.add_all(
+            [
+                trade(30, TransactionType.BUY, 10),
+                trade(20, TransactionType.SELL, 10),
+                trade(10, TransactionType.BUY, 5),
+            ]
+        )
+        session.commit()
+
+    sync.sync_asset()
+
+    # 只在持仓变化的日期写入区间，清仓期间没有记录
+    assert _stock_intervals(engine) == [
+        (today - timedelta(30), today - timedelta(20), Decimal(10), Decimal(100)),
+        (today - timedelta(10), OPEN_END_DATE, Decimal(5), Decimal(100)),
+    ]
+
+    # 增量同步时延续前一天有效的区间
+    with Session(engine) as session:
+        session.add(trade(5, TransactionType.BUY, 5))
+        session.commit()
+    sync.sync_asset()
+
+    assert _stock_intervals(engine) == [
+        (today - timedelta(30), today - timedelta(20), Decimal(10), Decimal(100)),
+        (today - timedelta(10), today - timedelta(5), Decimal(5), Decimal(100)),
+        (today - timedelta(5), OPEN_END_DATE, Decimal(10), Decimal(100)),
+    ]
+    sync.sync_asset(full=True)
+    assert len(_stock_intervals(engine)) == 3
+
+
+def _stock_trades(engine, trades) -> list[int]:
+    today = date.today()
+    with Session(engine) as session:
+        rows = [
+            StockTransaction(
+                date=today - timedelta(days_ago),
+                type=TransactionType.BUY,
+                ticker="AAPL",
+                shares=Decimal(shares),
+                price=Decimal(100),
+            )
+            for days_ago, shares in trades
+        ]
+        session.add_all(rows)
+        session.commit()
+        return [row.id for row in rows]
+
+
+def _kept_stock_intervals(engine) -> list[int]:
+    """返回带有 _mark_stock_intervals 标记、没有被重建的区间的开始日期（距今天数）。"""
+    today = date.today()
+    with Session(engine) as session:
+        return sorted(
+            (today - asset.date).days
+            for asset in session.scalars(
+                select(StockAsset).where(StockAsset.comment == "kept")
+            )
+        )
+
+
+def _mark_stock_intervals(engine) -> None:
+    with engine.begin() as conn:
+        conn.execute(update(StockAsset.__table__).values(comment="kept"))
+
+
+def test_sync_asset_rebuilds_tail_after_editing_old_transaction(engine, monkeypatch):
+    monkeypatch.setattr(sync, "engine", engine)
+    today = date.today()
+    _, edited, _ = _stock_trades(engine, [(30, 10), (20, 5), (10, 5)])
+    sync.sync_asset()
+    _mark_stock_intervals(engine)
+
+    with Session(engine) as session:
+        session.get(StockTransaction, edited).shares = Decimal(7)
+        session.commit()
+    sync.sync_asset()
+
+    assert _stock_intervals(engine) == [
+        (today - timedelta(30), today - timedelta(20), Decimal(10), Decimal(100)),
+        (today - timedelta(20), today - timedelta(10), Decimal(17), Decimal(100)),
+        (today - timedelta(10), OPEN_END_DATE, Decimal(22), Decimal(100)),
+    ]
+    # 修改日期之前开始的区间保留，只重建之后的部分
+    assert _kept_stock_intervals(engine) == [30]
+
+
+def test_sync_asset_rebuilds_after_deleting_old_transaction(engine, monkeypatch):
+    monkeypatch.setattr(sync, "engine", engine)
+    today = date.today()
+    _, deleted, _ = _stock_trades(engine, [(30, 10), (20, 5), (10, 5)])
+    sync.sync_asset()
+
+    with Session(engine) as session:
+        session.delete(session.get(StockTransaction, deleted))
+        session.commit()
+    sync.sync_asset()
+
+    # 删除的行没有 update_time，由触发器记录的日期触发重建
+    assert _stock_intervals(engine) == [
+        (today - timedelta(30), today - timedelta(10), Decimal(10), Decimal(100)),
+        (today - timedelta(10), OPEN_END_DATE, Decimal(15), Decimal(100)),
+    ]
+
+
+def _account_dates(engine) -> list[int]:
+    today = date.today()
+    with Session(engine) as session:
+        return sorted(
+            (today - day).days for day in session.scalars(select(Account.date))
+        )
+
+
+def test_sync_asset_rebuilds_after_deleting_earliest_transaction(engine, monkeypatch):
+    monkeypatch.setattr(sync, "engine", engine)
+    today = date.today()
+    earliest, _ = _stock_trades(engine, [(20, 5), (10, 5)])
+    sync.sync_asset()
+    sync.sync_account()
+
+    with Session(engine) as session:
+        session.delete(session.get(StockTransaction, earliest))
+        session.commit()
+    sync.sync_asset()
+    sync.sync_account()
+
+    # 第一笔交易之前遗留的区间和账户记录被删除
+    assert _stock_intervals(engine) == [
+        (today - timedelta(10), OPEN_END_DATE, Decimal(5), Decimal(100)),
+    ]
+    assert _account_dates(engine)[-1] == 10
+
+    sync.sync_asset(full=True)
+    sync.sync_account(full=True)
+    assert _stock_intervals(engine) == [
+        (today - timedelta(10), OPEN_END_DATE, Decimal(5), Decimal(100)),
+    ]
+    assert _account_dates(engine)[-1] == 10
+
+
+def test_sync_asset_rebuilds_after_moving_earliest_transaction(engine, monkeypatch):
+    monkeypatch.setattr(sync, "engine", engine)
+    today = date.today()
+    (moved,) = _stock_trades(engine, [(20, 5)])
+    sync.sync_asset()
+    sync.sync_account()
+
+    with Session(engine) as session:
+        session.get(StockTransaction, moved).date = today - timedelta(5)
+        session.commit()
+    sync.sync_asset()
+    sync.sync_account()
+
+    # 原来日期上的持仓不会被重复计算
+    assert _stock_intervals(engine) == [
+        (today - timedelta(5), OPEN_END_DATE, Decimal(5), Decimal(100)),
+    ]
+    assert _account_dates(engine) == [1, 2, 3, 4, 5]
+
+
+def test_sync_clears_snapshots_after_deleting_all_transactions(engine, monkeypatch):
+    monkeypatch.setattr(sync, "engine", engine)
+    _stock_trades(engine, [(20, 5)])
+    sync.sync_asset()
+    sync.sync_account()
+
+    with Session(engine) as session:
+        session.execute(delete(StockTransaction))
+        session.commit()
+    sync.sync_asset()
+    sync.sync_account()
+
+    assert _stock_intervals(engine) == []
+    assert _account_dates(engine) == []
+
+
+def test_sync_account_rebuilds_after_deleting_old_price(engine, monkeypatch):
+    monkeypatch.setattr(sync, "engine", engine)
+    today = date.today()
+    _stock_trades(engine, [(4, 2)])
+    with Session(engine) as session:
+        prices = [
+            TickerInfo(
+                date=today - timedelta(days_ago),
+                ticker="AAPL",
+                currency=Decimal(price),
+                currency_type=CurrencyType.USD,
+            )
+            for days_ago, price in [(4, 100), (3, 110)]
+        ]
+        session.add_all(prices)
+        session.commit()
+        deleted = prices[1].id
+    sync.sync_asset()
+    sync.sync_account()
+
+    with Session(engine) as session:
+        session.delete(session.get(TickerInfo, deleted))
+        session.commit()
+    sync.sync_account()
+
+    with Session(engine) as session:
+        values = {
+            (today - account.date).days: account.currency
+            for account in session.scalars(select(Account))
+        }
+        assert values == {4: 200, 3: 200, 2: 200, 1: 200}
+        # 资产和账户都已经处理过的记录会被清理
+        assert session.scalars(select(DirtyDate)).all() == []
+
+
+def test_sync_account_fills_prices_as_of_trading_days(engine, monkeypatch):
+    monkeypatch.setattr(sync, "engine", engine)
+    today = date.today()
+    with Session(engine) as session:
+        session.add(
+            StockTransaction(
+                date=today - timedelta(6),
+                type=TransactionType.BUY,
+                ticker="AAPL",
+                shares=Decimal(2),
+                price=Decimal(100),
+            )
+        )
+        # 只保存交易日的收盘价，中间的日期没有记录
+        session.add_all(
+            TickerInfo(
+                date=today - timedelta(days_ago),
+                ticker="AAPL",
+                currency=Decimal(price),
+                currency_type=CurrencyType.USD,
+            )
+            for days_ago, price in [(7, 90), (5, 110), (2, 120)]
+        )
+        session.commit()
+    sync.sync_asset()
+
+    def account_values():
+        with Session(engine) as session:
+            return {
+                (today - account.date).days: account.currency
+                for account in session.scalars(select(Account))
+            }
+
+    sync.sync_account()
+    assert account_values() == {
+        6: Decimal(180),
+        5: Decimal(220),
+        4: Decimal(220),
+        3: Decimal(220),
+        2: Decimal(240),
+        1: Decimal(240),
+    }
+
+    # 切换为交易日后全量重建，只保留有收盘价的日期
+    sync.sync_account(calendar=sync.ValuationCalendar.TRADING)
+    assert account_values() == {5: Decimal(220), 2: Decimal(240)}
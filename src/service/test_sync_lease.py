@@ -0,0 +1,54 @@
+import time
+from datetime import timedelta
+
+
+from service.sync_lease import SyncLease, wait_for_sync_lease
+
+
+def test_only_one_lease_holder(engine):
+    first, second = SyncLease(), SyncLease()
+
+    assert first.try_acquire()
+    assert not second.try_acquire()
+
+    first.release()
+    assert second.try_acquire()
+    second.release()
+
+
+def test_expired_lease_is_taken_over(engine):
+    # 心跳间隔远大于有效期，模拟崩溃后不再发送心跳的持有者
+    crashed = SyncLease(ttl=timedelta(seconds=0.2), heartbeat=timedelta(hours=1))
+    assert crashed.try_acquire()
+
+    successor = SyncLease()
+    assert not successor.try_acquire()
+    time.sleep(0.3)
+    assert successor.try_acquire()
+
+    # 旧的持有者释放时不会影响新的持有者
+    crashed.release()
+    assert not SyncLease().try_acquire()
+    successor.release()
+
+
+def test_heartbeat_keeps_lease_alive(engine):
+    holder = SyncLease(ttl=timedelta(seconds=0.3), heartbeat=timedelta(seconds=0.05))
+    assert holder.try_acquire()
+
+    time.sleep(0.6)
+    assert not SyncLease().try_acquire()
+    holder.release()
+
+
+def test_wait_for_sync_lease_waits_until_released(engine):
+    holder = SyncLease(ttl=timedelta(seconds=0.3), heartbeat=timedelta(hours=1))
+    assert holder.try_acquire()
+    waits = []
+
+    waiter = SyncLease()
+    assert wait_for_sync_lease(
+        waiter, on_wait=lambda: waits.append(1), poll_seconds=0.05
+    )
+    assert waits == [1]
+    waiter.release()
@@ -0,0 +1,50 @@
+from datetime import date
+from decimal import Decimal
+
+import pandas as pd
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from db.entity import CurrencyType, TickerInfo
+from service.ticker import get_ticker_close_prices
+
+
+@pytest.fixture
+def engine(engine):
+    with Session(engine) as session:
+        session.add_all(
+            TickerInfo(
+                date=date(2024, 1, day),
+                ticker=ticker,
+                currency=Decimal(price),
+                currency_type=currency_type,
+            )
+            for ticker, currency_type, bars in [
+                ("AAPL", CurrencyType.USD, [(1, 10), (5, 11), (8, 12)]),
+                ("00700", CurrencyType.HKD, [(6, 300)]),
+            ]
+            for day, price in bars
+        )
+        session.commit()
+    return engine
+
+
+def test_get_ticker_close_prices_fills_as_of(engine):
+    statements = []
+    event.listen(
+        engine, "before_cursor_execute", lambda *args: statements.append(args[2])
+    )
+
+    prices, currency_types = get_ticker_close_prices(
+        ["AAPL", "00700", "MISSING"], date(2024, 1, 3), date(2024, 1, 9)
+    )
+
+    assert len(statements) == 1
+    assert list(prices.columns) == ["00700", "AAPL", "MISSING"]
+    assert list(prices.index) == list(pd.date_range("2024-01-03", "2024-01-09"))
+    # 区间开始前最近一个交易日的价格向后填充
+    assert prices["AAPL"].tolist() == [10, 10, 11, 11, 11, 12, 12]
+    assert prices["00700"].isna().tolist() == [True] * 3 + [False] * 4
+    assert prices["MISSING"].isna().all()
+    assert currency_types == {"AAPL": CurrencyType.USD, "00700": CurrencyType.HKD}
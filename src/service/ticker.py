@@ -1,19 +1,80 @@
 import datetime
+from collections.abc import Iterable
+from typing import NamedTuple
 
-from sqlalchemy import desc
-from sqlalchemy.orm import Session
+import pandas as pd
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session, aliased
 
 import db
-from db.entity import TickerInfo
-
-
-def get_ticker_close_price(date: datetime.date, symbol: str) -> TickerInfo:
-    with Session(db.engine) as session:
-        current_date = (
-            session.query(TickerInfo)
-            .filter(TickerInfo.ticker == symbol)
-            .filter(TickerInfo.date <= date)
-            .order_by(desc(TickerInfo.date))
-            .first()
-        )
-        return current_date
+from db.entity import CurrencyType, TickerInfo
+
+
+class TickerPrices(NamedTuple):
+    # 行是日期，列是股票代码，值为 Decimal 收盘价，还没有收盘价的位置为 NaN
+    prices: pd.DataFrame
+    # 股票代码对应的计价货币
+    currency_types: dict[str, CurrencyType]
+
+
+def get_ticker_close_prices(
+    tickers: Iterable[str],
+    start: datetime.date,
+    end: datetime.date,
+    session: Session | None = None,
+) -> TickerPrices:
+    """
+    批量获取 [start, end] 内每一天、每只股票的收盘价矩阵。
+
+    数据库中只保存交易日的收盘价。这里只执行一次查询，取出每只股票在 start 当天
+    或之前最近的一条收盘价以及区间内的所有收盘价，再按日期做 as-of 合并：
+    非交易日使用最近一个交易日的收盘价。
+
+    Args:
+        tickers: 股票代码。
+        start: 开始日期（包含）。
+        end: 结束日期（包含）。
+        session: 复用调用方的 Session，为 None 时新建一个。
+    """
+    tickers = sorted(set(tickers))
+    dates = pd.date_range(start, end, name="date")
+    if not tickers or dates.empty:
+        return TickerPrices(pd.DataFrame(index=dates, columns=tickers), {})
+
+    previous = aliased(TickerInfo)
+    as_of_start = (
+        select(func.max(previous.date))
+        .where(previous.ticker == TickerInfo.ticker, previous.date <= start)
+        .scalar_subquery()
+    )
+    sql = select(
+        TickerInfo.date,
+        TickerInfo.ticker,
+        TickerInfo.currency,
+        TickerInfo.currency_type,
+    ).where(
+        TickerInfo.ticker.in_(tickers),
+        TickerInfo.date <= end,
+        TickerInfo.date >= func.coalesce(as_of_start, start),
+    )
+    if session is None:
+        with Session(db.engine) as session:
+            rows = session.execute(sql).all()
+    else:
+        rows = session.execute(sql).all()
+
+    bars = pd.DataFrame(rows, columns=["date", "ticker", "price", "currency_type"])
+    bars["date"] = pd.to_datetime(bars["date"])
+    currency_types = dict(zip(bars["ticker"], bars["currency_type"]))
+
+    # as-of 合并：把交易日的收盘价向后填充到之后的每一天
+    wide = bars.drop_duplicates(["date", "ticker"], keep="last").pivot(
+        index="date", columns="ticker", values="price"
+    )
+    prices = (
+        wide.reindex(wide.index.union(dates))
+        .ffill()
+        .reindex(index=dates, columns=tickers)
+    )
+    prices.columns.name = "ticker"
+    return TickerPrices(prices, currency_types)